@@ -1,11 +1,20 @@
 from autogen import AssistantAgent, UserProxyAgent, ConversableAgent
-from autogen_migration.core.utils import get_monitoring_client, get_sql_admin_client, get_gcp_credentials, get_cloud_sql_metrics
+from autogen_migration.core.utils import GCPClientsMixin, get_cloud_sql_metric_frame, summarize_metric_frame, mysql_connection
+from autogen_migration.core.sizing import sample_source_workload, recommend_sizing
 from autogen_migration.config.settings import Config
 import logging
 
 logger = logging.getLogger(__name__)
 
-class PerformanceOptimizationAgent(ConversableAgent):
+PERFORMANCE_METRICS = {
+    "cpu": ("cloudsql.googleapis.com/database/cpu/utilization", ["ALIGN_MEAN"]),
+    "memory": ("cloudsql.googleapis.com/database/memory/utilization", ["ALIGN_MEAN"]),
+    "disk_read_ops": ("cloudsql.googleapis.com/database/disk/read_ops_count", ["ALIGN_RATE"]),
+    "disk_write_ops": ("cloudsql.googleapis.com/database/disk/write_ops_count", ["ALIGN_RATE"]),
+    "connections": ("cloudsql.googleapis.com/database/network/connections", ["ALIGN_MEAN"]),
+}
+
+class PerformanceOptimizationAgent(GCPClientsMixin, ConversableAgent):
     def __init__(self, name, llm_config, **kwargs):
         super().__init__(name, llm_config=llm_config, **kwargs)
         self.register_function(
@@ -13,32 +22,36 @@ class PerformanceOptimizationAgent(ConversableAgent):
                 "analyze_performance_metrics": self._analyze_performance_metrics,
                 "recommend_optimizations": self._recommend_optimizations,
                 "apply_instance_scaling": self._apply_instance_scaling,
+                "recommend_target_sizing": self._recommend_target_sizing,
                 # Add functions for query insights analysis, index suggestions etc.
             }
         )
-        self.gcp_credentials = get_gcp_credentials(Config.GCP_SERVICE_ACCOUNT_KEY_PATH)
-        self.monitoring_client = get_monitoring_client(self.gcp_credentials)
-        self.sql_client = get_sql_admin_client(self.gcp_credentials)
+        # Credentials and the Monitoring/SQL Admin clients are shared process-wide and built on first use.
+        self.gcp_key_path = Config.GCP_SERVICE_ACCOUNT_KEY_PATH
 
-    def _analyze_performance_metrics(self, project_id, instance_id):
+    def _analyze_performance_metrics(self, project_id, instance_id, days=1):
         logger.info(f"Analyzing performance metrics for Cloud SQL instance {instance_id}...")
-        cpu_util = get_cloud_sql_metrics(project_id, instance_id, "cloudsql.googleapis.com/database/cpu/utilization", days=1, credentials=self.gcp_credentials)
-        memory_util = get_cloud_sql_metrics(project_id, instance_id, "cloudsql.googleapis.com/database/memory/utilization", days=1, credentials=self.gcp_credentials)
-
-        avg_cpu = sum([m['value'] for m in cpu_util]) / len(cpu_util) if cpu_util else 0
-        avg_memory = sum([m['value'] for m in memory_util]) / len(memory_util) if memory_util else 0
+        # One concurrent batch of requests; Cloud Monitoring averages each minute server-side instead of
+        # returning every raw point.
+        frame = get_cloud_sql_metric_frame(project_id, instance_id, PERFORMANCE_METRICS, days=days, credentials=self.gcp_credentials)
+        summary = summarize_metric_frame(frame)
+        cpu, memory = summary["cpu"] or {}, summary["memory"] or {}
 
         report = {
-            "avg_cpu_utilization": f"{avg_cpu*100:.2f}%",
-            "avg_memory_utilization": f"{avg_memory*100:.2f}%",
-            # Add more metrics like IOPS, connections etc.
+            "avg_cpu_utilization": f"{cpu.get('mean', 0)*100:.2f}%",
+            "avg_memory_utilization": f"{memory.get('mean', 0)*100:.2f}%",
+            "p95_cpu_utilization": f"{cpu.get('p95', 0)*100:.2f}%",
+            "p99_cpu_utilization": f"{cpu.get('p99', 0)*100:.2f}%",
+            "p95_memory_utilization": f"{memory.get('p95', 0)*100:.2f}%",
+            "p99_memory_utilization": f"{memory.get('p99', 0)*100:.2f}%",
+            "per_minute_percentiles": summary,
         }
         logger.info(f"Performance metrics report for {instance_id}: {report}")
         return {"status": "success", "report": report}
 
     def _recommend_optimizations(self, performance_report):
         logger.info("Generating optimization recommendations based on performance report...")
-        recommendations =
+        recommendations = []
         # Use LLM for more sophisticated recommendations based on the report
         # Example: self.llm_client.generate(prompt=f"Given this performance report: {performance_report}, suggest Cloud SQL optimizations.")
 
@@ -53,14 +66,25 @@ class PerformanceOptimizationAgent(ConversableAgent):
         logger.info(f"Recommendations: {recommendations}")
         return {"status": "success", "recommendations": recommendations}
 
-    def _apply_instance_scaling(self, project_id, instance_id, new_cpu, new_memory_gb):
+    def _recommend_target_sizing(self, legacy_db_config, databases=None, sample_seconds=None):
+        logger.info(f"Sampling the workload of legacy MySQL {legacy_db_config['host']} to size the Cloud SQL instance...")
+        with mysql_connection(**legacy_db_config) as conn:
+            workload = sample_source_workload(conn, databases, sample_seconds or Config.SIZING_SAMPLE_SECONDS)
+        recommendation = recommend_sizing(workload)
+        logger.info(f"Recommended {recommendation['tier']} with a {recommendation['disk_size_gb']} GB {recommendation['disk_type']} disk: "
+                    + " ".join(recommendation["reasoning"]))
+        return {"status": "success", "recommendation": recommendation, "workload": workload}
+
+    def _apply_instance_scaling(self, project_id, instance_id, new_cpu, new_memory_gb, database_flags=None):
         logger.info(f"Scaling Cloud SQL instance {instance_id} to {new_cpu} vCPUs and {new_memory_gb} GB memory...")
+        # Custom machine types take any vCPU count (1 or even) with memory in multiples of 256 MiB.
         instance_body = {
             "settings": {
-                "tier": f"db-n1-standard-{new_cpu}", # Assuming n1-standard family
-                "memory_limit_gb": new_memory_gb
+                "tier": f"db-custom-{new_cpu}-{int(round(new_memory_gb * 4)) * 256}",
             }
         }
+        if database_flags:
+            instance_body["settings"]["database_flags"] = database_flags
         operation = self.sql_client.instances.patch(project=project_id, instance=instance_id, body=instance_body)
         operation.wait()
         logger.info(f"Cloud SQL instance {instance_id} scaled successfully.")
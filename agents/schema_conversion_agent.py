@@ -1,7 +1,10 @@
 from autogen import AssistantAgent, UserProxyAgent, ConversableAgent
-from autogen_migration.core.utils import export_mysql_schema, import_mysql_dump, get_mysql_connection
+from autogen_migration.core.utils import export_mysql_schema, import_mysql_dump, mysql_connection
+from autogen_migration.core.ddl import convert_schema_file, split_schema_file, split_create_table, alter_table_statements
+from autogen_migration.core.index_build import build_deferred_indexes, build_deferred_indexes_from_file
 from autogen_migration.config.settings import Config
 import logging
+import re
 
 logger = logging.getLogger(__name__)
 
@@ -13,6 +16,9 @@ class SchemaConversionAgent(ConversableAgent):
                 "export_legacy_schema": self._export_legacy_schema,
                 "analyze_and_convert_schema": self._analyze_and_convert_schema,
                 "apply_cloud_sql_schema": self._apply_cloud_sql_schema,
+                "copy_table_schema": self._copy_table_schema,
+                "build_deferred_indexes": self._build_deferred_indexes,
+                "build_table_indexes": self._build_table_indexes,
             }
         )
 
@@ -21,28 +27,91 @@ class SchemaConversionAgent(ConversableAgent):
         export_mysql_schema(host, port, user, password, db_name, output_file)
         return {"status": "success", "schema_file": output_file}
 
-    def _analyze_and_convert_schema(self, schema_file_path):
+    def _analyze_and_convert_schema(self, schema_file_path, output_file=None):
         logger.info(f"Analyzing and converting schema from {schema_file_path}...")
-        with open(schema_file_path, 'r') as f:
-            schema_content = f.read()
-
-        # This is where LLM interaction would happen for complex conversions.
-        # For this example, we'll assume direct compatibility or simple adjustments.
-        # In a real scenario, the LLM would be prompted with schema_content
-        # and asked to provide a Cloud SQL compatible DDL.
-        # Example: self.llm_client.generate(prompt=f"Convert this MySQL schema to Cloud SQL compatible DDL:\n{schema_content}")
-
-        converted_schema = schema_content.replace("DEFINER=`root`@`localhost`", "SQL SECURITY INVOKER") # Example conversion
-        output_converted_file = "data/employees_schema_cloudsql.sql"
-        with open(output_converted_file, 'w') as f:
-            f.write(converted_schema)
-        logger.info(f"Schema converted and saved to {output_converted_file}")
-        return {"status": "success", "converted_schema_file": output_converted_file}
-
-    def _apply_cloud_sql_schema(self, host, port, user, password, db_name, schema_file_path):
+        # Statements are streamed through the rule engine; only those no rule can make compatible reach the LLM.
+        output_converted_file = output_file or schema_file_path.rsplit(".sql", 1)[0] + "_cloudsql.sql"
+        report = convert_schema_file(schema_file_path, output_converted_file, resolver=self._resolve_with_llm,
+                                     workers=Config.SCHEMA_CONVERSION_WORKERS)
+        logger.info(f"Schema converted and saved to {output_converted_file}: {report['schema']}, rules applied {report['rule_counts']}, "
+                    f"{len(report['unresolved'])} statements sent to the LLM ({report['llm_resolved']} resolved)")
+        return {"status": "success", "converted_schema_file": output_converted_file, **report}
+
+    def _resolve_with_llm(self, unresolved, batch_size=20):
+        """Asks the LLM to convert the statements the rules could not, a batch at a time; None where it gives no answer."""
+        converted = []
+        for i in range(0, len(unresolved), batch_size):
+            batch = unresolved[i:i + batch_size]
+            prompt = ("Convert each of the following MySQL statements so it runs on Cloud SQL for MySQL 8.0. "
+                      f"Reply with exactly {len(batch)} converted statements in the same order, separated by lines "
+                      "containing only ---, with no explanations.\n\n"
+                      + "\n---\n".join(f"-- {r['unresolved']}\n{r['text']}" for r in batch))
+            try:
+                reply = self.generate_reply(messages=[{"role": "user", "content": prompt}])
+            except Exception as e:
+                logger.error(f"LLM schema conversion failed: {e}")
+                reply = None
+            if isinstance(reply, dict):
+                reply = reply.get("content")
+            answers = [a.strip() for a in re.split(r"^---\s*$", reply or "", flags=re.MULTILINE)]
+            if len(answers) != len(batch):
+                logger.warning(f"LLM returned {len(answers)} statements for {len(batch)}; leaving them unconverted")
+                answers = [None] * len(batch)
+            converted.extend(answer or None for answer in answers)
+        return converted
+
+    def _apply_cloud_sql_schema(self, host, port, user, password, db_name, schema_file_path, defer_indexes=False):
         logger.info(f"Applying schema to Cloud SQL {db_name} from {schema_file_path}...")
-        import_mysql_dump(host, port, user, password, db_name, schema_file_path)
-        return {"status": "success", "message": "Schema applied to Cloud SQL."}
+        if not defer_indexes:
+            import_mysql_dump(host, port, user, password, db_name, schema_file_path)
+            return {"status": "success", "message": "Schema applied to Cloud SQL."}
+        # Rows load faster into tables that only have their primary key; the rest is built once the data is in.
+        base = schema_file_path.rsplit(".sql", 1)[0]
+        tables_file, post_load_file = base + "_tables.sql", base + "_post_load.sql"
+        counts = split_schema_file(schema_file_path, tables_file, post_load_file)
+        import_mysql_dump(host, port, user, password, db_name, tables_file)
+        logger.info(f"Deferred {counts['indexes']} indexes, {counts['foreign_keys']} foreign keys and {counts['triggers']} triggers to {post_load_file}")
+        return {"status": "success", "message": "Tables applied to Cloud SQL; indexes and constraints deferred.",
+                "post_load_file": post_load_file, **counts}
+
+    def _build_deferred_indexes(self, host, port, user, password, db_name, post_load_file=None, max_workers=None):
+        if not post_load_file:
+            return {"status": "success", "message": "No deferred indexes or constraints."}
+        logger.info(f"Building deferred indexes and constraints on Cloud SQL {db_name} from {post_load_file}...")
+        return build_deferred_indexes_from_file(
+            {"host": host, "port": port, "user": user, "password": password, "db": db_name}, post_load_file,
+            max_workers=max_workers or Config.INDEX_BUILD_WORKERS, session_settings=Config.INDEX_BUILD_SESSION_SETTINGS,
+        )
+
+    def _show_create_table(self, legacy_db_config, table_name):
+        with mysql_connection(**legacy_db_config) as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(f"SHOW CREATE TABLE `{table_name}`")
+                return cursor.fetchone()[1]
+
+    def _copy_table_schema(self, legacy_db_config, cloud_sql_config, table_name, defer_indexes=False):
+        logger.info(f"Copying the definition of {table_name} to Cloud SQL {cloud_sql_config['db']}...")
+        ddl = self._show_create_table(legacy_db_config, table_name)
+        if defer_indexes:
+            ddl = split_create_table(ddl)[0]
+        ddl = ddl.replace("CREATE TABLE", "CREATE TABLE IF NOT EXISTS", 1)
+        with mysql_connection(**cloud_sql_config) as conn:
+            with conn.cursor() as cursor:
+                # Tables are created in parallel and in any order, so foreign keys may reference tables not created yet.
+                cursor.execute("SET SESSION foreign_key_checks = 0")
+                try:
+                    cursor.execute(ddl)
+                finally:
+                    cursor.execute("SET SESSION foreign_key_checks = 1")
+            conn.commit()
+        return {"status": "success", "table": table_name}
+
+    def _build_table_indexes(self, legacy_db_config, cloud_sql_config, table_name):
+        logger.info(f"Building the secondary indexes and foreign keys of {table_name} on Cloud SQL...")
+        _, indexes, foreign_keys = split_create_table(self._show_create_table(legacy_db_config, table_name))
+        statements = [(alter, ";") for alter in alter_table_statements(table_name, indexes) + alter_table_statements(table_name, foreign_keys)]
+        result = build_deferred_indexes(cloud_sql_config, statements, max_workers=1, session_settings=Config.INDEX_BUILD_SESSION_SETTINGS)
+        return {**result, "table": table_name}
 
 # Example usage in main.py or orchestrator.py
 # schema_agent = SchemaConversionAgent(name="SchemaConversionAgent", llm_config=Config.LLM_CONFIG)
@@ -1,12 +1,28 @@
 from autogen import AssistantAgent, UserProxyAgent, ConversableAgent
-from autogen_migration.core.utils import get_monitoring_client, get_logging_client, get_gcp_credentials, get_cloud_sql_metrics, get_cloud_sql_logs
+from autogen_migration.core.utils import GCPClientsMixin, get_cloud_sql_metrics, iter_cloud_sql_logs
+from autogen_migration.core.anomaly import MetricAnomalyDetector
+from autogen_migration.core.log_patterns import LogTemplateMiner
+from autogen_migration.core.metrics_cache import get_metrics_cache
 from autogen_migration.config.settings import Config
+import datetime
 import logging
 import json
 
 logger = logging.getLogger(__name__)
 
-class AnomalyDetectionAgent(ConversableAgent):
+HEALTH_METRICS = {
+    "cpu": "cloudsql.googleapis.com/database/cpu/utilization",
+    "memory": "cloudsql.googleapis.com/database/memory/utilization",
+    "disk_read_ops": "cloudsql.googleapis.com/database/disk/read_ops_count",
+    "disk_write_ops": "cloudsql.googleapis.com/database/disk/write_ops_count",
+    "connections": "cloudsql.googleapis.com/database/network/connections",
+}
+# Two daily seasons of history (plus slack for grid alignment), the least the seasonal baselines need.
+DEFAULT_HEALTH_DAYS = 2.1
+# Metrics reported as a 0..1 fraction, where anything above 90% is worth flagging regardless of history.
+SATURATION_METRICS = {"cpu", "memory"}
+
+class AnomalyDetectionAgent(GCPClientsMixin, ConversableAgent):
     def __init__(self, name, llm_config, **kwargs):
         super().__init__(name, llm_config=llm_config, **kwargs)
         self.register_function(
@@ -15,43 +31,57 @@ class AnomalyDetectionAgent(ConversableAgent):
                 "analyze_logs_for_errors": self._analyze_logs_for_errors,
             }
         )
-        self.gcp_credentials = get_gcp_credentials(Config.GCP_SERVICE_ACCOUNT_KEY_PATH)
-        self.monitoring_client = get_monitoring_client(self.gcp_credentials)
-        self.logging_client = get_logging_client(self.gcp_credentials)
+        # Credentials and the Monitoring/Logging clients are shared process-wide and built on first use.
+        self.gcp_key_path = Config.GCP_SERVICE_ACCOUNT_KEY_PATH
 
-    def _monitor_cloud_sql_health(self, project_id, instance_id):
+    def _monitor_cloud_sql_health(self, project_id, instance_id, days=DEFAULT_HEALTH_DAYS):
         logger.info(f"Monitoring Cloud SQL instance {instance_id} for anomalies...")
-        cpu_metrics = get_cloud_sql_metrics(project_id, instance_id, "cloudsql.googleapis.com/database/cpu/utilization", days=0.1, credentials=self.gcp_credentials)
-        memory_metrics = get_cloud_sql_metrics(project_id, instance_id, "cloudsql.googleapis.com/database/memory/utilization", days=0.1, credentials=self.gcp_credentials)
-
-        # Simple anomaly detection logic (can be enhanced with ML models or LLM)
-        high_cpu_spikes = [m for m in cpu_metrics if m['value'] > 0.9] # >90% CPU usage [span_47](start_span)[span_47](end_span)
-        high_memory_usage = [m for m in memory_metrics if m['value'] > 0.9] # >90% memory usage [span_48](start_span)[span_48](end_span)
+        series = {
+            name: get_cloud_sql_metrics(project_id, instance_id, metric_type, days=days, credentials=self.gcp_credentials, cache=get_metrics_cache(Config.METRICS_CACHE_DIR))
+            for name, metric_type in HEALTH_METRICS.items()
+        }
+        # Rolling z-scores, EWMA and seasonal baselines and change points for every metric in one vectorised pass;
+        # seasonal baselines need at least two days of history.
+        detector = MetricAnomalyDetector()
+        if days * 86400 / detector.step < 2 * detector.season_period:
+            logger.info(f"Seasonal anomaly detection skipped: {days} day(s) of metrics is less than two seasons of history.")
+        report = detector.detect(series)
 
-        anomalies =
-        if high_cpu_spikes:
-            anomalies.append(f"High CPU utilization detected: {len(high_cpu_spikes)} spikes above 90%.")
-        if high_memory_usage:
-            anomalies.append(f"High memory utilization detected: {len(high_memory_usage)} instances above 90%.")
+        anomalies = []
+        for name, findings in report.items():
+            if name in SATURATION_METRICS and findings.get("max") is not None and findings["max"] > 0.9:
+                anomalies.append(f"High {name} utilization detected: peak {findings['max'] * 100:.1f}%.")
+            if "spikes" in findings:
+                anomalies.append(f"{name}: {findings['spikes']['count']} spikes above the rolling baseline (max z-score {findings['spikes']['max_z']}).")
+            elif "ewma_deviations" in findings:
+                anomalies.append(f"{name}: {findings['ewma_deviations']['count']} points away from the EWMA baseline.")
+            if "seasonal_deviations" in findings:
+                anomalies.append(f"{name}: {findings['seasonal_deviations']['count']} points away from the usual level for that time of day.")
+            if "level_shift" in findings:
+                shift = findings["level_shift"]
+                anomalies.append(f"{name}: level shifted from {shift['before_mean']:.3g} to {shift['after_mean']:.3g} at {datetime.datetime.fromtimestamp(shift['timestamp'], datetime.timezone.utc).isoformat()}.")
 
         if anomalies:
             logger.warning(f"Anomalies detected for {instance_id}: {'; '.join(anomalies)}")
-            return {"status": "anomalies_detected", "details": anomalies}
+            return {"status": "anomalies_detected", "details": anomalies, "metrics": report}
         else:
             logger.info(f"No significant anomalies detected for {instance_id} based on health metrics.")
-            return {"status": "no_anomalies"}
+            return {"status": "no_anomalies", "metrics": report}
 
-    def _analyze_logs_for_errors(self, project_id, instance_id):
+    def _analyze_logs_for_errors(self, project_id, instance_id, hours=1, top=10):
         logger.info(f"Analyzing Cloud SQL logs for errors on {instance_id}...")
-        error_logs = get_cloud_sql_logs(project_id, instance_id, 'severity=ERROR OR severity=CRITICAL', hours=1, credentials=self.gcp_credentials)
+        entries = iter_cloud_sql_logs(project_id, instance_id, 'severity=ERROR OR severity=CRITICAL', hours=hours, credentials=self.gcp_credentials)
+        # Entries are clustered into message templates as pages arrive, so memory does not grow with the log volume.
+        summary = LogTemplateMiner().add_entries(entries).summary(top=top)
 
-        if error_logs:
-            logger.warning(f"Error logs found for {instance_id}. Sample: {json.dumps(error_logs)}")
-            # LLM can be prompted to analyze log patterns for deeper understanding
-            # response = self.llm_client.generate(prompt=f"Analyze these logs for root cause: {json.dumps(error_logs)}")
-            return {"status": "errors_found", "count": len(error_logs), "sample_log": error_logs}
+        if summary["total_messages"]:
+            templates = "; ".join(f"{t['count']}x {t['template']}" for t in summary["templates"])
+            logger.warning(f"Error logs found for {instance_id}: {summary['total_messages']} entries in {summary['template_count']} patterns. Top patterns: {templates}")
+            # The compact template summary, not the raw log, is what an LLM should be prompted with for root-cause analysis
+            # response = self.llm_client.generate(prompt=f"Analyze these log patterns for root cause: {json.dumps(summary)}")
+            return {"status": "errors_found", "count": summary["total_messages"], "patterns": summary}
         else:
-            logger.info(f"No error logs found for {instance_id} in the last hour.")
+            logger.info(f"No error logs found for {instance_id} in the last {hours} hour(s).")
             return {"status": "no_errors"}
 
 # Example usage in main.py or orchestrator.py
@@ -1,25 +1,40 @@
 from autogen import AssistantAgent, UserProxyAgent, ConversableAgent
-from autogen_migration.core.utils import get_gcp_credentials
+from autogen_migration.core.utils import GCPClientsMixin, mysql_connection
+from autogen_migration.core.dms_monitor import DMSJobMonitor
+from autogen_migration.core.cdc import BinlogReplicator, SchemaChangeError, get_binlog_position, CDC_POSITION_KEY, DEFAULT_SERVER_ID
+from autogen_migration.core.bulk_copy import BulkCopyEngine, DEFAULT_READERS, DEFAULT_WRITERS, DEFAULT_CHUNK_ROWS
+from autogen_migration.core.streaming import stream_dump_to_gcs, stream_gcs_to_mysql, COMPRESSION_SUFFIXES
+from autogen_migration.core.sharded_export import export_database, import_database
 from autogen_migration.config.settings import Config
 from google.cloud import datamigration_v1
+import asyncio
 import logging
-import time
+import os
 
 logger = logging.getLogger(__name__)
 
-class DataMigrationAgent(ConversableAgent):
-    def __init__(self, name, llm_config, **kwargs):
+class DataMigrationAgent(GCPClientsMixin, ConversableAgent):
+    def __init__(self, name, llm_config, journal=None, **kwargs):
         super().__init__(name, llm_config=llm_config, **kwargs)
+        self.journal = journal
         self.register_function(
             function_map={
                 "create_dms_connection_profile": self._create_dms_connection_profile,
                 "create_dms_migration_job": self._create_dms_migration_job,
                 "start_dms_migration_job": self._start_dms_migration_job,
                 "monitor_dms_job": self._monitor_dms_job,
+                "monitor_dms_jobs": self._monitor_dms_jobs,
+                "bulk_copy_tables": self._bulk_copy_tables,
+                "record_cdc_start_position": self._record_cdc_start_position,
+                "run_cdc_replication": self._run_cdc_replication,
+                "stream_dump_to_gcs": self._stream_dump_to_gcs,
+                "import_dump_from_gcs": self._import_dump_from_gcs,
+                "export_sharded_dump": self._export_sharded_dump,
+                "import_sharded_dump": self._import_sharded_dump,
             }
         )
-        self.gcp_credentials = get_gcp_credentials(Config.GCP_SERVICE_ACCOUNT_KEY_PATH)
-        self.dms_client = datamigration_v1.DataMigrationServiceClient(credentials=self.gcp_credentials)
+        # Credentials and the DMS client are shared process-wide and built on first use.
+        self.gcp_key_path = Config.GCP_SERVICE_ACCOUNT_KEY_PATH
 
     def _create_dms_connection_profile(self, project_id, region, profile_id, host, port, user, password):
         logger.info(f"Creating DMS connection profile {profile_id}...")
@@ -67,14 +82,93 @@ class DataMigrationAgent(ConversableAgent):
 
     def _monitor_dms_job(self, project_id, region, job_id):
         logger.info(f"Monitoring DMS migration job {job_id}...")
-        name = f"projects/{project_id}/locations/{region}/migrationJobs/{job_id}"
-        job = self.dms_client.get_migration_job(name=name)
-        while job.state not in:
-            logger.info(f"Job {job_id} current state: {job.state.name}. Waiting...")
-            time.sleep(30) # Wait for 30 seconds
-            job = self.dms_client.get_migration_job(name=name)
-        logger.info(f"Job {job_id} finished with state: {job.state.name}")
-        return {"status": job.state.name, "job_id": job_id}
+        result = self._monitor_dms_jobs(project_id, region, [job_id])["jobs"][0]
+        return {"status": result["status"], "job_id": job_id}
+
+    def _monitor_dms_jobs(self, project_id, region, job_ids, stop_phases=None):
+        logger.info(f"Monitoring {len(job_ids)} DMS migration job(s)...")
+        names = [f"projects/{project_id}/locations/{region}/migrationJobs/{job_id}" for job_id in job_ids]
+        monitor = DMSJobMonitor(self.dms_client)
+        results = asyncio.run(monitor.wait_all(names, stop_phases or ()))
+        jobs = [
+            {"job_id": job_id, "status": "error", "error": str(result)} if isinstance(result, Exception) else result
+            for job_id, result in zip(job_ids, results)
+        ]
+        unfinished = [job["job_id"] for job in jobs if job["status"] != "COMPLETED" and job.get("phase") not in (stop_phases or ())]
+        return {"status": "failure" if unfinished else "success", "jobs": jobs}
+
+    def _bulk_copy_tables(self, legacy_db_config, cloud_sql_config, tables=None, readers=DEFAULT_READERS, writers=DEFAULT_WRITERS, chunk_rows=DEFAULT_CHUNK_ROWS):
+        tables = tables or ["employees"]
+        logger.info(f"Bulk copying {len(tables)} table(s) with {readers} readers and {writers} writers...")
+        if self.journal is not None and self.journal.get_state(CDC_POSITION_KEY) is None:
+            # Changes made while the copy runs are picked up by CDC from this position.
+            self._record_cdc_start_position(legacy_db_config)
+        engine = BulkCopyEngine(legacy_db_config, cloud_sql_config, readers=readers, writers=writers, chunk_rows=chunk_rows, journal=self.journal)
+        results = [engine.copy_table(table_name) for table_name in tables]
+        failed = [r for r in results if r["failed_chunks"]]
+        for r in results:
+            logger.info(f"Copied {r['rows_copied']} rows of {r['table']} in {r['elapsed_seconds']}s ({r['rows_per_second']} rows/s)")
+        if failed:
+            logger.warning(f"Bulk copy left failed chunks in: {', '.join(r['table'] for r in failed)}")
+            return {"status": "failure", "tables": results}
+        return {"status": "success", "tables": results}
+
+    def _record_cdc_start_position(self, legacy_db_config):
+        with mysql_connection(**legacy_db_config) as conn:
+            position = get_binlog_position(conn)
+        if self.journal is not None:
+            self.journal.set_state(CDC_POSITION_KEY, position)
+        logger.info(f"CDC start position: {position['log_file']}:{position['log_pos']}")
+        return {"status": "success", "position": position}
+
+    def _run_cdc_replication(self, legacy_db_config, cloud_sql_config, tables=None, duration_seconds=60, until_caught_up=False, server_id=DEFAULT_SERVER_ID, start_position=None):
+        start_position = start_position or (self.journal.get_state(CDC_POSITION_KEY) if self.journal is not None else None)
+        if start_position is None:
+            return {"status": "error", "message": "No CDC start position recorded; call record_cdc_start_position before the bulk copy."}
+        logger.info(f"Replicating binlog changes from {start_position.get('log_file')}:{start_position.get('log_pos')}...")
+        replicator = BinlogReplicator(legacy_db_config, cloud_sql_config, server_id=server_id, tables=tables, journal=self.journal)
+        try:
+            metrics = replicator.run(start_position, duration_seconds=duration_seconds, until_caught_up=until_caught_up)
+        except SchemaChangeError as e:
+            logger.error(f"CDC stopped at schema change: {e}")
+            return {"status": "failure", "message": f"{e}. Apply the statement to Cloud SQL, then rerun with start_position.",
+                    "ddl": e.query, "resume_position": e.position, **replicator.metrics}
+        logger.info(f"CDC applied {metrics['rows_applied']} rows in {metrics['batches']} batches; lag {metrics['replication_lag_seconds']}s")
+        return {"status": "success", **metrics}
+
+    def _stream_dump_to_gcs(self, legacy_db_config, bucket_name, blob_name=None, cloud_sql_config=None, compression=None):
+        compression = compression or Config.DUMP_COMPRESSION
+        blob_name = blob_name or f"dumps/{legacy_db_config['db']}.sql{COMPRESSION_SUFFIXES[compression]}"
+        logger.info(f"Streaming a dump of {legacy_db_config['db']} to gs://{bucket_name}/{blob_name}"
+                    + (f" and into Cloud SQL {cloud_sql_config['db']}..." if cloud_sql_config else "..."))
+        # No local dump file: mysqldump output is compressed and uploaded in parts as it is produced.
+        result = stream_dump_to_gcs(legacy_db_config, bucket_name, blob_name, self.gcp_credentials, compression=compression,
+                                    part_size=Config.GCS_PART_SIZE_MB * 1024 * 1024, import_config=cloud_sql_config)
+        return {"status": "success", **result}
+
+    def _import_dump_from_gcs(self, cloud_sql_config, bucket_name, blob_name):
+        logger.info(f"Importing gs://{bucket_name}/{blob_name} into Cloud SQL {cloud_sql_config['db']}...")
+        result = stream_gcs_to_mysql(bucket_name, blob_name, cloud_sql_config, self.gcp_credentials,
+                                     part_size=Config.GCS_PART_SIZE_MB * 1024 * 1024)
+        return {"status": "success", **result}
+
+    def _export_sharded_dump(self, legacy_db_config, output_dir=None, tables=None, workers=None, chunk_rows=None, compression=None):
+        output_dir = output_dir or os.path.join(Config.SHARDED_EXPORT_DIR, legacy_db_config["db"])
+        workers = workers or Config.SHARDED_EXPORT_WORKERS
+        logger.info(f"Exporting {legacy_db_config['db']} to {output_dir} as per-table chunk files with {workers} workers...")
+        result = export_database(legacy_db_config, output_dir, tables=tables, workers=workers,
+                                 chunk_rows=chunk_rows or Config.SHARDED_EXPORT_CHUNK_ROWS,
+                                 compression=compression or Config.DUMP_COMPRESSION)
+        position = result["snapshot"]["position"]
+        if self.journal is not None and position is not None and self.journal.get_state(CDC_POSITION_KEY) is None:
+            # The snapshot's own binlog position: CDC from here misses nothing and replays nothing already exported.
+            self.journal.set_state(CDC_POSITION_KEY, position)
+        return result
+
+    def _import_sharded_dump(self, cloud_sql_config, output_dir, workers=None, chunks=None):
+        workers = workers or Config.SHARDED_EXPORT_WORKERS
+        logger.info(f"Importing the sharded export in {output_dir} into Cloud SQL {cloud_sql_config['db']}...")
+        return import_database(cloud_sql_config, output_dir, workers=workers, chunks=chunks)
 
 # Example usage in main.py or orchestrator.py
 # data_migration_agent = DataMigrationAgent(name="DataMigrationAgent", llm_config=Config.LLM_CONFIG)
@@ -1,12 +1,11 @@
 from autogen import AssistantAgent, UserProxyAgent, ConversableAgent
-from autogen_migration.core.utils import get_sql_admin_client, get_storage_client, get_gcp_credentials
+from autogen_migration.core.utils import GCPClientsMixin
 from autogen_migration.config.settings import Config
 import logging
 
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-class EnvironmentSetupAgent(ConversableAgent):
+class EnvironmentSetupAgent(GCPClientsMixin, ConversableAgent):
     def __init__(self, name, llm_config, **kwargs):
         super().__init__(name, llm_config=llm_config, **kwargs)
         self.register_function(
@@ -16,24 +15,26 @@ class EnvironmentSetupAgent(ConversableAgent):
                 # Add functions for VPC peering, IAM setup etc.
             }
         )
-        self.gcp_credentials = get_gcp_credentials(Config.GCP_SERVICE_ACCOUNT_KEY_PATH)
-        self.sql_client = get_sql_admin_client(self.gcp_credentials)
-        self.storage_client = get_storage_client(self.gcp_credentials)
+        # Credentials and the SQL Admin/Storage clients are shared process-wide and built on first use.
+        self.gcp_key_path = Config.GCP_SERVICE_ACCOUNT_KEY_PATH
 
-    def _create_cloud_sql_instance(self, project_id, instance_id, region, machine_type, storage_gb, root_password, db_version="MYSQL_8_0"):
+    def _create_cloud_sql_instance(self, project_id, instance_id, region, machine_type, storage_gb, root_password, db_version="MYSQL_8_0",
+                                   disk_type="PD_SSD", database_flags=None):
         logger.info(f"Creating Cloud SQL instance {instance_id} in {region}...")
         instance_body = {
             "database_version": db_version,
             "settings": {
                 "tier": machine_type,
                 "data_disk_size_gb": storage_gb,
+                "data_disk_type": disk_type,
                 "ip_configuration": {
                     "ipv4_enabled": False, # Prefer private IP
                     "private_network": f"projects/{project_id}/global/networks/{Config.VPC_NETWORK_NAME}"
                 },
                 "backup_configuration": {"enabled": True, "binary_log_enabled": True},
                 "location_preference": {"zone": f"{region}-a"}, # Example zone
-                "database_flags": [{"name": "innodb_buffer_pool_size", "value": "5368709120"}], # Example flag
+                # Sized from the source workload by recommend_target_sizing; without flags Cloud SQL sizes the buffer pool from memory.
+                "database_flags": database_flags or [],
             },
             "root_password": root_password,
         }
@@ -0,0 +1,407 @@
+from concurrent.futures import ProcessPoolExecutor
+import itertools
+import logging
+import re
+import os
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BATCH_SIZE = 2000
+PARALLEL_THRESHOLD = 500 # statements per batch below which worker processes cost more than they save
+
+# Storage engines that convert to InnoDB without changing behaviour, and ones whose semantics need a human or the LLM.
+INNODB_COMPATIBLE_ENGINES = {"myisam", "aria", "tokudb", "rocksdb", "archive"}
+UNSUPPORTED_ENGINES = {"federated", "connect", "blackhole", "mrg_myisam", "merge", "csv", "spider"}
+
+_CREATE = re.compile(
+    r"^\s*CREATE\s+(?:OR\s+REPLACE\s+)?(?:ALGORITHM\s*=\s*\w+\s+)?(?:DEFINER\s*=\s*\S+\s+)?(?:SQL\s+SECURITY\s+\w+\s+)?"
+    r"(?:AGGREGATE\s+)?(TABLE|VIEW|PROCEDURE|FUNCTION|TRIGGER|EVENT)\s+(?:IF\s+NOT\s+EXISTS\s+)?((?:`[^`]+`|\w+)(?:\.(?:`[^`]+`|\w+))?)",
+    re.IGNORECASE,
+)
+_CONDITIONAL_COMMENT = re.compile(r"/\*!\d*\s*|\s*\*/")
+_DEFINER = re.compile(r"\s*DEFINER\s*=\s*(?:`[^`]*`|'[^']*'|\"[^\"]*\"|[\w.$-]+)\s*@\s*(?:`[^`]*`|'[^']*'|\"[^\"]*\"|[\w.%$-]+)", re.IGNORECASE)
+_SQL_SECURITY_DEFINER = re.compile(r"SQL\s+SECURITY\s+DEFINER", re.IGNORECASE)
+_ENGINE = re.compile(r"\bENGINE\s*=\s*(\w+)", re.IGNORECASE)
+_MYISAM_OPTIONS = re.compile(r"\s+(?:DELAY_KEY_WRITE\s*=\s*\d|PACK_KEYS\s*=\s*\w+|ROW_FORMAT\s*=\s*FIXED|CHECKSUM\s*=\s*1)\b", re.IGNORECASE)
+_CHARSET = re.compile(r"\b(CHARSET|CHARACTER\s+SET)(\s*=\s*|\s+)utf8(?:mb3)?\b(?!mb4)", re.IGNORECASE)
+_COLLATION = re.compile(r"\b(COLLATE)(\s*=\s*|\s+)utf8(?:mb3)?_(\w+)", re.IGNORECASE)
+_ZERO_DATE_COLUMN = re.compile(
+    r"^(\s*`[^`]+`\s+(?:datetime|timestamp|date)(?:\(\d\))?)(.*?)\s+DEFAULT\s+'0000-00-00(?: 00:00:00(?:\.0+)?)?'",
+    re.IGNORECASE | re.MULTILINE,
+)
+_NOT_NULL = re.compile(r"\s+NOT\s+NULL\b", re.IGNORECASE)
+_PRIVILEGED_SET = re.compile(r"^\s*SET\s+@@(?:GLOBAL\.|SESSION\.SQL_LOG_BIN\b)", re.IGNORECASE)
+_COLUMN = re.compile(r"^\s*`([^`]+)`\s+(\w+)", re.MULTILINE)
+_UNRESOLVED_MARKER = re.compile(r"^-- @@unresolved (\d+)$")
+_SECONDARY_INDEX = re.compile(r"^(?:(?:UNIQUE|FULLTEXT|SPATIAL)\s+)?(?:KEY|INDEX)\b|^(?:CONSTRAINT\s+(?:`[^`]+`|\w+)\s+)?UNIQUE\b", re.IGNORECASE)
+_FOREIGN_KEY = re.compile(r"^(?:CONSTRAINT\s+(?:`[^`]+`|\w+)\s+)?FOREIGN\s+KEY\b", re.IGNORECASE)
+_PRIMARY_KEY = re.compile(r"^(?:CONSTRAINT\s+(?:`[^`]+`|\w+)\s+)?PRIMARY\s+KEY\s*\(\s*`?([^`,)\s(]+)", re.IGNORECASE)
+_INDEX_FIRST_COLUMN = re.compile(r"\(\s*`?([^`,)\s(]+)")
+
+class StatementSplitter:
+    """Splits a SQL dump into statements line by line, honouring quotes, comments and DELIMITER changes.
+
+    MySQL conditional comments (/*!50013 ... */) are kept, since mysqldump puts definers and view options in them.
+    """
+
+    def __init__(self):
+        self.delimiter = ";"
+        self._buffer = []
+        self._quote = None
+        self._in_comment = False
+        self._compile()
+
+    def _compile(self):
+        self._special = re.compile(r"['\"`]|/\*(?!!)|--(?=\s|$)|#|" + re.escape(self.delimiter))
+
+    def feed(self, line):
+        """Consumes one line and returns the statements it completed as (text, delimiter) pairs."""
+        statements = []
+        if self._quote is None and not self._in_comment and not any(part.strip() for part in self._buffer):
+            stripped = line.strip()
+            if stripped.upper().startswith("DELIMITER "):
+                self.delimiter = stripped.split(None, 1)[1]
+                self._buffer = []
+                self._compile()
+                return statements
+        pos = 0
+        while pos < len(line):
+            if self._in_comment:
+                end = line.find("*/", pos)
+                if end == -1:
+                    return statements
+                self._in_comment = False
+                pos = end + 2
+            elif self._quote is not None:
+                match = re.compile(r"\\.|" + re.escape(self._quote)).search(line, pos)
+                if match is None:
+                    self._buffer.append(line[pos:])
+                    return statements
+                self._buffer.append(line[pos:match.end()])
+                pos = match.end()
+                if match.group() == self._quote:
+                    self._quote = None
+            else:
+                match = self._special.search(line, pos)
+                if match is None:
+                    self._buffer.append(line[pos:])
+                    return statements
+                self._buffer.append(line[pos:match.start()])
+                token = match.group()
+                if token in ("'", '"', "`"):
+                    self._quote = token
+                    self._buffer.append(token)
+                    pos = match.end()
+                elif token == "/*":
+                    self._in_comment = True
+                    pos = match.end()
+                elif token in ("--", "#"):
+                    self._buffer.append("\n")
+                    return statements
+                else:
+                    text = "".join(self._buffer).strip()
+                    if text:
+                        statements.append((text, self.delimiter))
+                    self._buffer = []
+                    pos = match.end()
+        return statements
+
+def iter_statements(lines):
+    """Yields (text, delimiter) for every statement of an iterable of lines, e.g. an open dump file."""
+    splitter = StatementSplitter()
+    for line in lines:
+        yield from splitter.feed(line)
+    tail = "".join(splitter._buffer).strip()
+    if tail:
+        yield tail, splitter.delimiter
+
+def parse_statement(text, delimiter=";"):
+    """Classifies a statement and extracts the schema facts used by the rules and the schema model."""
+    plain = _CONDITIONAL_COMMENT.sub(" ", text).strip()
+    statement = {"text": text, "delimiter": delimiter, "kind": "other", "name": None, "attributes": {}}
+    create = _CREATE.match(plain)
+    if create:
+        statement["kind"] = create.group(1).lower()
+        statement["name"] = create.group(2).replace("`", "")
+        if statement["kind"] == "function" and re.search(r"\bSONAME\b", plain, re.IGNORECASE):
+            statement["kind"] = "udf"
+        elif statement["kind"] == "table":
+            engine = _ENGINE.search(plain)
+            charset = re.search(r"\bCHARSET\s*=\s*(\w+)", plain, re.IGNORECASE)
+            statement["attributes"] = {
+                "engine": engine.group(1) if engine else None,
+                "charset": charset.group(1) if charset else None,
+                "columns": [{"name": name, "type": type_.lower()} for name, type_ in _COLUMN.findall(plain)],
+            }
+    elif re.match(r"^\s*INSTALL\s+(PLUGIN|COMPONENT)\b", plain, re.IGNORECASE):
+        statement["kind"] = "install_plugin"
+    elif plain:
+        statement["kind"] = plain.split(None, 1)[0].lower()
+    return statement
+
+# Each rule takes the statement dict and returns (text or None to drop the statement, notes, unresolved reason or None).
+
+def rule_definer(statement):
+    if statement["kind"] not in ("view", "procedure", "function", "trigger", "event") or not _DEFINER.search(statement["text"]):
+        return statement["text"], [], None
+    text = _DEFINER.sub("", statement["text"])
+    text = _SQL_SECURITY_DEFINER.sub("SQL SECURITY INVOKER", text)
+    return text, [f"removed DEFINER from {statement['kind']} {statement['name']}"], None
+
+def rule_engine(statement):
+    if statement["kind"] != "table":
+        return statement["text"], [], None
+    engine = (statement["attributes"].get("engine") or "").lower()
+    if engine in UNSUPPORTED_ENGINES:
+        return statement["text"], [], f"storage engine {engine} is not available on Cloud SQL"
+    if engine not in INNODB_COMPATIBLE_ENGINES:
+        return statement["text"], [], None
+    text = _ENGINE.sub("ENGINE=InnoDB", statement["text"])
+    text = _MYISAM_OPTIONS.sub("", text)
+    return text, [f"converted {statement['name']} from {engine} to InnoDB"], None
+
+def rule_charset(statement):
+    text = _CHARSET.sub(lambda m: f"{m.group(1)}{m.group(2)}utf8mb4", statement["text"])
+    text = _COLLATION.sub(lambda m: f"{m.group(1)}{m.group(2)}utf8mb4_{m.group(3)}", text)
+    if text == statement["text"]:
+        return text, [], None
+    return text, [f"converted utf8mb3 to utf8mb4 in {statement['kind']} {statement['name'] or ''}".rstrip()], None
+
+def rule_zero_dates(statement):
+    if statement["kind"] != "table":
+        return statement["text"], [], None
+    notes = []
+
+    def nullable_default(match):
+        column = match.group(1).strip().split()[0]
+        notes.append(f"{statement['name']}.{column.strip('`')}: zero-date default replaced with NULL")
+        return f"{match.group(1)}{_NOT_NULL.sub('', match.group(2))} NULL DEFAULT NULL"
+
+    text = _ZERO_DATE_COLUMN.sub(nullable_default, statement["text"])
+    return text, notes, None
+
+def rule_unsupported_features(statement):
+    if statement["kind"] == "install_plugin":
+        return None, ["dropped INSTALL PLUGIN/COMPONENT: plugins are managed by Cloud SQL"], None
+    if statement["kind"] == "udf":
+        return None, [f"dropped loadable function {statement['name']}: shared-library UDFs are not supported on Cloud SQL"], None
+    if statement["kind"] == "set" and _PRIVILEGED_SET.match(_CONDITIONAL_COMMENT.sub(" ", statement["text"])):
+        return None, ["dropped SET @@GLOBAL/SQL_LOG_BIN: needs SUPER, which Cloud SQL does not grant"], None
+    return statement["text"], [], None
+
+RULES = [rule_unsupported_features, rule_definer, rule_engine, rule_charset, rule_zero_dates]
+
+def convert_statement(item):
+    """Runs every rule over one (text, delimiter) statement; module-level so worker processes can run it."""
+    text, delimiter = item
+    statement = parse_statement(text, delimiter)
+    result = {"kind": statement["kind"], "name": statement["name"], "attributes": statement["attributes"],
+              "delimiter": delimiter, "original": text, "notes": [], "unresolved": None, "rules": []}
+    for rule in RULES:
+        new_text, notes, unresolved = rule(statement)
+        if notes:
+            result["rules"].append(rule.__name__)
+            result["notes"].extend(notes)
+        if unresolved:
+            result["unresolved"] = unresolved
+        if new_text is None:
+            statement["text"] = None
+            break
+        statement["text"] = new_text
+    result["text"] = statement["text"]
+    return result
+
+def _split_definitions(body):
+    """Splits the body of a CREATE TABLE at top-level commas, ignoring commas in parentheses and quotes."""
+    parts, depth, quote, start = [], 0, None, 0
+    for i, ch in enumerate(body):
+        if quote:
+            if ch == quote:
+                quote = None
+        elif ch in "'\"`":
+            quote = ch
+        elif ch == "(":
+            depth += 1
+        elif ch == ")":
+            depth -= 1
+        elif ch == "," and depth == 0:
+            parts.append(body[start:i])
+            start = i + 1
+    parts.append(body[start:])
+    return [part.strip() for part in parts if part.strip()]
+
+def _body_bounds(text):
+    """Start and end offsets of the parenthesised definition list of a CREATE TABLE."""
+    start = text.index("(")
+    depth, quote = 0, None
+    for i in range(start, len(text)):
+        ch = text[i]
+        if quote:
+            if ch == quote:
+                quote = None
+        elif ch in "'\"`":
+            quote = ch
+        elif ch == "(":
+            depth += 1
+        elif ch == ")":
+            depth -= 1
+            if depth == 0:
+                return start + 1, i
+    raise ValueError("Unbalanced parentheses in CREATE TABLE")
+
+def quote_table_name(name):
+    return ".".join(f"`{part}`" for part in name.split("."))
+
+def split_create_table(text):
+    """Splits a CREATE TABLE into the bare table with its primary key and the definitions that can wait until after the load.
+
+    Returns (bare CREATE TABLE, secondary and unique index definitions, foreign key definitions). An index whose first
+    column is an AUTO_INCREMENT column outside the primary key stays, because InnoDB needs it to create the table.
+    """
+    start, end = _body_bounds(text)
+    definitions = _split_definitions(text[start:end])
+    auto_increment = {d.split()[0].strip("`") for d in definitions if d.startswith("`") and re.search(r"\bAUTO_INCREMENT\b", d, re.IGNORECASE)}
+    primary = [m.group(1) for m in map(_PRIMARY_KEY.match, definitions) if m]
+    needs_index = auto_increment - set(primary[:1])
+    kept, indexes, foreign_keys = [], [], []
+    for definition in definitions:
+        if _FOREIGN_KEY.match(definition):
+            foreign_keys.append(definition)
+        elif _SECONDARY_INDEX.match(definition):
+            first = _INDEX_FIRST_COLUMN.search(definition)
+            if first and first.group(1) in needs_index:
+                needs_index.discard(first.group(1))
+                kept.append(definition)
+            else:
+                indexes.append(definition)
+        else:
+            kept.append(definition)
+    bare = text[:start] + "\n  " + ",\n  ".join(kept) + "\n" + text[end:]
+    return bare, indexes, foreign_keys
+
+def alter_table_statements(table_name, definitions):
+    """ALTER TABLE statements adding the definitions: one for all plain indexes, so the table is rebuilt once, and one
+    per FULLTEXT or SPATIAL index, which InnoDB only builds one at a time."""
+    table = quote_table_name(table_name)
+    single = [d for d in definitions if re.match(r"^(?:FULLTEXT|SPATIAL)\b", d, re.IGNORECASE)]
+    combined = [d for d in definitions if d not in single]
+    groups = ([combined] if combined else []) + [[d] for d in single]
+    return [f"ALTER TABLE {table} " + ", ".join(f"ADD {d}" for d in group) for group in groups]
+
+def split_schema_file(input_path, tables_path, post_load_path):
+    """Streams a converted schema into a file to apply before the data load and one to apply after it.
+
+    The first holds tables with only their primary keys, plus views and routines; the second adds secondary and
+    unique indexes (see alter_table_statements), then foreign keys, then triggers, which
+    must not fire while rows are copied in.
+    """
+    counts = {"tables": 0, "indexes": 0, "foreign_keys": 0, "triggers": 0}
+    foreign_keys, triggers = [], []
+    with open(input_path, "r") as src, open(tables_path, "w") as tables, open(post_load_path, "w") as post_load:
+        for text, delimiter in iter_statements(src):
+            statement = parse_statement(text, delimiter)
+            if statement["kind"] == "trigger":
+                triggers.append(render_statement(text, delimiter))
+                counts["triggers"] += 1
+                continue
+            if statement["kind"] != "table":
+                tables.write(render_statement(text, delimiter))
+                continue
+            bare, indexes, fks = split_create_table(text)
+            tables.write(render_statement(bare, delimiter))
+            counts["tables"] += 1
+            counts["indexes"] += len(indexes)
+            counts["foreign_keys"] += len(fks)
+            post_load.writelines(render_statement(alter, ";") for alter in alter_table_statements(statement["name"], indexes))
+            foreign_keys.extend(render_statement(alter, ";") for alter in alter_table_statements(statement["name"], fks))
+        post_load.writelines(foreign_keys)
+        post_load.writelines(triggers)
+    return counts
+
+def render_statement(text, delimiter):
+    if delimiter == ";":
+        return f"{text};\n"
+    return f"DELIMITER {delimiter}\n{text}{delimiter}\nDELIMITER ;\n"
+
+class SchemaModel:
+    """Structured summary of a dump: tables with engine, charset and columns, plus views, routines, triggers and events."""
+
+    def __init__(self):
+        self.tables = {}
+        self.objects = {"view": [], "procedure": [], "function": [], "trigger": [], "event": []}
+        self.statements = 0
+
+    def add(self, result):
+        self.statements += 1
+        if result["kind"] == "table":
+            self.tables[result["name"]] = result["attributes"]
+        elif result["kind"] in self.objects:
+            self.objects[result["kind"]].append(result["name"])
+
+    def summary(self):
+        engines = {}
+        for table in self.tables.values():
+            engine = (table.get("engine") or "unknown").lower()
+            engines[engine] = engines.get(engine, 0) + 1
+        return {"statements": self.statements, "tables": len(self.tables), "engines": engines,
+                **{f"{kind}s": len(names) for kind, names in self.objects.items()}}
+
+def _convert_batches(statements, workers, batch_size):
+    executor = ProcessPoolExecutor(max_workers=workers) if workers and workers > 1 else None
+    try:
+        while True:
+            batch = list(itertools.islice(statements, batch_size))
+            if not batch:
+                return
+            if executor is not None and len(batch) >= PARALLEL_THRESHOLD:
+                yield from executor.map(convert_statement, batch, chunksize=max(1, len(batch) // workers))
+            else:
+                yield from map(convert_statement, batch)
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+def convert_schema_file(input_path, output_path, resolver=None, workers=None, batch_size=DEFAULT_BATCH_SIZE):
+    """Streams a schema dump through the rule engine into output_path; returns the schema model and a change report.
+
+    Statements no rule can make compatible are passed to resolver(list of results), which returns converted text
+    (or None) for each; without a resolver, or when it gives up, they are written unchanged under a warning comment.
+    """
+    workers = workers if workers is not None else os.cpu_count()
+    model = SchemaModel()
+    rule_counts, notes, unresolved = {}, [], []
+    tmp_path = output_path + ".tmp"
+    with open(input_path, "r") as src, open(tmp_path, "w") as out:
+        for result in _convert_batches(iter_statements(src), workers, batch_size):
+            model.add(result)
+            for rule in result["rules"]:
+                rule_counts[rule] = rule_counts.get(rule, 0) + 1
+            notes.extend(result["notes"])
+            if result["unresolved"]:
+                out.write(f"-- @@unresolved {len(unresolved)}\n")
+                unresolved.append(result)
+            elif result["text"] is not None:
+                out.write(render_statement(result["text"], result["delimiter"]))
+
+    resolved = resolver(unresolved) if resolver is not None and unresolved else [None] * len(unresolved)
+    with open(tmp_path, "r") as src, open(output_path, "w") as out:
+        for line in src:
+            marker = _UNRESOLVED_MARKER.match(line.rstrip("\n"))
+            if marker is None:
+                out.write(line)
+                continue
+            index = int(marker.group(1))
+            result = unresolved[index]
+            if resolved[index]:
+                out.write(render_statement(resolved[index].strip().rstrip(";"), result["delimiter"]))
+            else:
+                out.write(f"-- WARNING: not converted ({result['unresolved']})\n")
+                out.write(render_statement(result["text"], result["delimiter"]))
+    os.remove(tmp_path)
+    return {
+        "schema": model.summary(),
+        "rule_counts": rule_counts,
+        "notes": notes,
+        "unresolved": [{"kind": r["kind"], "name": r["name"], "reason": r["unresolved"]} for r in unresolved],
+        "llm_resolved": sum(1 for text in resolved if text),
+    }
@@ -0,0 +1,97 @@
+from autogen_migration.core.ddl import iter_statements, parse_statement
+from autogen_migration.core.utils import mysql_connection, get_mysql_pool
+from concurrent.futures import ThreadPoolExecutor
+import logging
+import time
+import re
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_INDEX_WORKERS = 4
+# Session settings for building deferred indexes; the data was already validated, so checks only cost time.
+DEFAULT_SESSION_SETTINGS = {"foreign_key_checks": 0, "unique_checks": 0}
+# Duplicate key name, duplicate foreign key constraint, trigger already exists: left over from an earlier attempt.
+ALREADY_APPLIED_ERRORS = {1061, 1826, 1359}
+
+_ALTER_TABLE = re.compile(r"^\s*ALTER\s+TABLE\s+((?:`[^`]+`|\w+)(?:\.(?:`[^`]+`|\w+))?)", re.IGNORECASE)
+_ADD_FOREIGN_KEY = re.compile(r"\bFOREIGN\s+KEY\b", re.IGNORECASE)
+
+def plan_post_load(statements):
+    """Groups post-load (text, delimiter) statements into waves of per-table work.
+
+    Indexes come first, then foreign keys (which may need the indexes of other tables), then triggers; within a wave
+    every table is independent of the others.
+    """
+    waves = [{}, {}, {}]
+    for text, delimiter in statements:
+        statement = parse_statement(text, delimiter)
+        alter = _ALTER_TABLE.match(text)
+        if statement["kind"] == "trigger":
+            wave, key = 2, statement["name"]
+        elif alter:
+            wave, key = (1 if _ADD_FOREIGN_KEY.search(text) else 0), alter.group(1).replace("`", "")
+        else:
+            wave, key = 0, None
+        waves[wave].setdefault(key, []).append(text)
+    return [wave for wave in waves if wave]
+
+def _apply_table(target_config, table, statements, session_settings):
+    started = time.monotonic()
+    applied, skipped = 0, 0
+    with mysql_connection(**target_config) as conn:
+        with conn.cursor() as cursor:
+            names = list(session_settings)
+            previous = {}
+            if names:
+                cursor.execute("SELECT " + ", ".join(f"@@SESSION.{name}" for name in names))
+                previous = dict(zip(names, cursor.fetchone()))
+                cursor.execute("SET SESSION " + ", ".join(f"{name} = %s" for name in names), list(session_settings.values()))
+            try:
+                for statement in statements:
+                    try:
+                        cursor.execute(statement)
+                        applied += 1
+                    except Exception as e:
+                        if getattr(e, "args", (None,))[0] not in ALREADY_APPLIED_ERRORS:
+                            raise
+                        logger.info(f"Skipping already applied DDL on {table}: {e}")
+                        skipped += 1
+            finally:
+                if previous:
+                    # Pooled connections are reused, so the session goes back to how it was borrowed.
+                    cursor.execute("SET SESSION " + ", ".join(f"{name} = %s" for name in previous), list(previous.values()))
+        conn.commit()
+    return {"table": table, "applied": applied, "skipped": skipped, "seconds": round(time.monotonic() - started, 3)}
+
+def build_deferred_indexes(target_config, statements, max_workers=DEFAULT_INDEX_WORKERS, session_settings=None):
+    """Applies deferred index, foreign key and trigger DDL with one worker per table, a wave at a time."""
+    session_settings = DEFAULT_SESSION_SETTINGS if session_settings is None else session_settings
+    started = time.monotonic()
+    get_mysql_pool(**target_config, max_size=max_workers)
+    tables, failed = [], []
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for wave in plan_post_load(statements):
+            # Biggest batches of DDL first, so the longest builds do not start last.
+            ordered = sorted(wave.items(), key=lambda item: len(item[1]), reverse=True)
+            futures = {table: executor.submit(_apply_table, target_config, table, ddl, session_settings) for table, ddl in ordered}
+            for table, future in futures.items():
+                try:
+                    tables.append(future.result())
+                except Exception as e:
+                    logger.error(f"Deferred DDL failed on {table}: {e}")
+                    failed.append({"table": table, "error": str(e)})
+    elapsed = round(time.monotonic() - started, 3)
+    logger.info(f"Built deferred indexes and constraints on {len(tables)} tables in {elapsed}s ({len(failed)} failed)")
+    return {
+        "status": "failure" if failed else "success",
+        "tables": len(tables),
+        "statements": sum(t["applied"] for t in tables),
+        "skipped": sum(t["skipped"] for t in tables),
+        "slowest": sorted(tables, key=lambda t: t["seconds"], reverse=True)[:5],
+        "failed": failed,
+        "elapsed_seconds": elapsed,
+    }
+
+def build_deferred_indexes_from_file(target_config, post_load_file, **options):
+    with open(post_load_file, "r") as f:
+        return build_deferred_indexes(target_config, list(iter_statements(f)), **options)
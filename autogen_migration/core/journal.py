@@ -0,0 +1,286 @@
+import threading
+import functools
+import datetime
+import hashlib
+import decimal
+import inspect
+import logging
+import sqlite3
+import base64
+import json
+import time
+import uuid
+import os
+
+logger = logging.getLogger(__name__)
+
+# Steps whose successful result stays valid for the rest of a run; re-running them on resume would redo real work.
+CHECKPOINTED_STEPS = {
+    "recommend_target_sizing",
+    "create_cloud_sql_instance",
+    "create_gcs_bucket",
+    "export_legacy_schema",
+    "analyze_and_convert_schema",
+    "apply_cloud_sql_schema",
+    "build_deferred_indexes",
+    "create_dms_connection_profile",
+    "create_dms_migration_job",
+    "start_dms_migration_job",
+    "bulk_copy_tables",
+    "compare_row_counts",
+    "compare_checksums",
+    "sample_data_comparison",
+    "keyset_diff_comparison",
+    "range_checksum_comparison",
+}
+VALIDATION_STEPS = {
+    "compare_row_counts",
+    "compare_checksums",
+    "sample_data_comparison",
+    "keyset_diff_comparison",
+    "range_checksum_comparison",
+}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    started_at REAL NOT NULL,
+    finished_at REAL
+);
+CREATE TABLE IF NOT EXISTS steps (
+    run_id TEXT NOT NULL,
+    step_key TEXT NOT NULL,
+    step_name TEXT NOT NULL,
+    status TEXT NOT NULL,
+    result TEXT,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (run_id, step_key)
+);
+CREATE TABLE IF NOT EXISTS chunks (
+    run_id TEXT NOT NULL,
+    table_name TEXT NOT NULL,
+    chunk_index INTEGER NOT NULL,
+    lower_key TEXT,
+    upper_key TEXT,
+    status TEXT NOT NULL,
+    row_count INTEGER,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (run_id, table_name, chunk_index)
+);
+CREATE TABLE IF NOT EXISTS state (
+    run_id TEXT NOT NULL,
+    key TEXT NOT NULL,
+    value TEXT,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (run_id, key)
+);
+CREATE TABLE IF NOT EXISTS validations (
+    run_id TEXT NOT NULL,
+    table_name TEXT NOT NULL,
+    check_name TEXT NOT NULL,
+    match INTEGER,
+    result TEXT,
+    recorded_at REAL NOT NULL
+);
+"""
+
+# Key values JSON cannot hold exactly are stored as {"type": ..., "value": ...} so a resumed plan gets the same types back.
+_KEY_ENCODERS = (
+    (bool, "bool", int),
+    (bytes, "bytes", lambda v: base64.b64encode(v).decode("ascii")),
+    (decimal.Decimal, "decimal", str),
+    (datetime.datetime, "datetime", lambda v: v.isoformat()),
+    (datetime.date, "date", lambda v: v.isoformat()),
+    (datetime.time, "time", lambda v: v.isoformat()),
+    (datetime.timedelta, "timedelta", lambda v: [v.days, v.seconds, v.microseconds]),
+    (uuid.UUID, "uuid", str),
+)
+_KEY_DECODERS = {
+    "bool": bool,
+    "bytes": base64.b64decode,
+    "decimal": decimal.Decimal,
+    "datetime": datetime.datetime.fromisoformat,
+    "date": datetime.date.fromisoformat,
+    "time": datetime.time.fromisoformat,
+    "timedelta": lambda v: datetime.timedelta(days=v[0], seconds=v[1], microseconds=v[2]),
+    "uuid": uuid.UUID,
+}
+
+def _encode_value(value):
+    if value is None or type(value) in (int, float, str):
+        return value
+    for value_type, name, encode in _KEY_ENCODERS:
+        if isinstance(value, value_type):
+            return {"type": name, "value": encode(value)}
+    raise TypeError(f"Cannot journal a primary key value of type {type(value).__name__}")
+
+def _decode_value(value):
+    return _KEY_DECODERS[value["type"]](value["value"]) if isinstance(value, dict) else value
+
+def _encode_key(key):
+    return json.dumps([_encode_value(v) for v in key]) if key is not None else None
+
+def _decode_key(value):
+    return tuple(_decode_value(v) for v in json.loads(value)) if value is not None else None
+
+def qualified_table(database, table_name):
+    """Journal name of a table: "db.table" so same-named tables of different databases keep separate plans."""
+    return f"{database}.{table_name}" if database else table_name
+
+def _bound_argument(func, args, kwargs, name):
+    """The value func received for parameter name, however it was passed (default included); None if it has none."""
+    try:
+        bound = inspect.signature(func).bind(*args, **kwargs)
+    except (TypeError, ValueError):
+        return kwargs.get(name)
+    bound.apply_defaults()
+    return bound.arguments.get(name)
+
+class MigrationJournal:
+    """SQLite progress journal recording completed steps, copy chunks and validation results of a migration run."""
+
+    def __init__(self, path="logs/migration_journal.sqlite"):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self.run_id = None
+        self._lock = threading.Lock()
+        # Bulk copy writer threads record chunks concurrently, so one connection is shared behind a lock.
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.executescript(_SCHEMA)
+        self._conn.commit()
+
+    def _execute(self, sql, params=()):
+        with self._lock:
+            cursor = self._conn.execute(sql, params)
+            rows = cursor.fetchall()
+            self._conn.commit()
+            return rows
+
+    def start_run(self, resume=False):
+        """Starts a new run, or with resume=True continues the most recent unfinished one."""
+        if resume:
+            rows = self._execute("SELECT run_id FROM runs WHERE status != 'completed' ORDER BY started_at DESC LIMIT 1")
+            if rows:
+                self.run_id = rows[0][0]
+                logger.info(f"Resuming migration run {self.run_id} from journal {self.path}")
+                return self.run_id
+            logger.info("No unfinished migration run to resume; starting a new one.")
+        self.run_id = uuid.uuid4().hex
+        self._execute("INSERT INTO runs (run_id, status, started_at) VALUES (?, 'running', ?)", (self.run_id, time.time()))
+        logger.info(f"Started migration run {self.run_id} (journal {self.path})")
+        return self.run_id
+
+    def finish_run(self, status="completed"):
+        """Marks the current run finished so a later --resume starts fresh."""
+        self._execute("UPDATE runs SET status = ?, finished_at = ? WHERE run_id = ?", (status, time.time(), self.run_id))
+
+    def step_key(self, step_name, args, kwargs):
+        """Identifies a step call by name and a hash of its arguments, so credentials never land in the journal."""
+        digest = hashlib.sha256(json.dumps([args, kwargs], sort_keys=True, default=str).encode("utf-8")).hexdigest()
+        return f"{step_name}:{digest[:16]}"
+
+    def completed_step(self, step_key):
+        """Returns the recorded result of a successfully completed step, or None."""
+        rows = self._execute(
+            "SELECT result FROM steps WHERE run_id = ? AND step_key = ? AND status = 'success'", (self.run_id, step_key)
+        )
+        return json.loads(rows[0][0]) if rows else None
+
+    def record_step(self, step_key, step_name, status, result):
+        self._execute(
+            "INSERT OR REPLACE INTO steps (run_id, step_key, step_name, status, result, updated_at) VALUES (?, ?, ?, ?, ?, ?)",
+            (self.run_id, step_key, step_name, status, json.dumps(result, default=str), time.time()),
+        )
+
+    def record_validation(self, table_name, check_name, result):
+        self._execute(
+            "INSERT INTO validations (run_id, table_name, check_name, match, result, recorded_at) VALUES (?, ?, ?, ?, ?, ?)",
+            (self.run_id, table_name, check_name, int(bool(result.get("match"))) if isinstance(result, dict) else None,
+             json.dumps(result, default=str), time.time()),
+        )
+
+    def checkpointed(self, step_name, func):
+        """Wraps an agent function so a successful result is journaled and replayed instead of re-run on resume."""
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            key = self.step_key(step_name, args, kwargs)
+            previous = self.completed_step(key)
+            if previous is not None:
+                logger.info(f"Skipping {step_name}: already completed in run {self.run_id}.")
+                return previous
+            self.record_step(key, step_name, "running", None)
+            try:
+                result = func(*args, **kwargs)
+            except Exception as e:
+                self.record_step(key, step_name, "error", {"error": str(e)})
+                raise
+            status = result.get("status", "success") if isinstance(result, dict) else "success"
+            self.record_step(key, step_name, status, result)
+            if step_name in VALIDATION_STEPS:
+                table_name = _bound_argument(func, args, kwargs, "table_name")
+                if table_name is None and isinstance(result, dict):
+                    table_name = result.get("table")
+                source = _bound_argument(func, args, kwargs, "legacy_db_config")
+                database = source.get("db") if isinstance(source, dict) else None
+                self.record_validation(qualified_table(database, table_name or ""), step_name, result)
+            return result
+        return wrapper
+
+    def set_state(self, key, value):
+        """Stores a JSON-serialisable value for the current run, e.g. a replication position."""
+        self._execute(
+            "INSERT OR REPLACE INTO state (run_id, key, value, updated_at) VALUES (?, ?, ?, ?)",
+            (self.run_id, key, json.dumps(value, default=str), time.time()),
+        )
+
+    def get_state(self, key, default=None):
+        rows = self._execute("SELECT value FROM state WHERE run_id = ? AND key = ?", (self.run_id, key))
+        return json.loads(rows[0][0]) if rows else default
+
+    def chunk_plan(self, table_name):
+        """Returns the journaled [(chunk_index, lower_key, upper_key, status)] plan of a table, or None.
+
+        table_name is the qualified_table() name, so tables of different databases never share a plan.
+        """
+        rows = self._execute(
+            "SELECT chunk_index, lower_key, upper_key, status FROM chunks WHERE run_id = ? AND table_name = ? ORDER BY chunk_index",
+            (self.run_id, table_name),
+        )
+        if not rows:
+            return None
+        return [(index, _decode_key(lower), _decode_key(upper), status) for index, lower, upper, status in rows]
+
+    def save_chunk_plan(self, table_name, ranges):
+        """Persists the chunk boundaries of a table so a resumed copy reuses exactly the same ranges."""
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO chunks (run_id, table_name, chunk_index, lower_key, upper_key, status, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, 'pending', ?)",
+                [(self.run_id, table_name, index, _encode_key(lower), _encode_key(upper), now)
+                 for index, (lower, upper) in enumerate(ranges)],
+            )
+            self._conn.commit()
+
+    def record_chunk(self, table_name, chunk_index, row_count):
+        """Marks one copy chunk as durably written to the target."""
+        self._execute(
+            "UPDATE chunks SET status = 'done', row_count = ?, updated_at = ? WHERE run_id = ? AND table_name = ? AND chunk_index = ?",
+            (row_count, time.time(), self.run_id, table_name, chunk_index),
+        )
+
+    def high_water_mark(self, table_name):
+        """Returns (chunks, upper_key) for the leading run of done chunks; everything up to upper_key is copied."""
+        done, mark = 0, None
+        for _, _, upper_key, status in self.chunk_plan(table_name) or []:
+            if status != "done":
+                break
+            done, mark = done + 1, upper_key
+        return done, mark
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
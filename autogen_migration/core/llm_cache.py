@@ -0,0 +1,120 @@
+import threading
+import hashlib
+import logging
+import pickle
+import sqlite3
+import time
+import os
+
+logger = logging.getLogger(__name__)
+
+CACHE_MODES = ("normal", "deterministic", "off")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key TEXT PRIMARY KEY,
+    value BLOB NOT NULL,
+    created_at REAL NOT NULL,
+    last_used REAL NOT NULL,
+    hits INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS responses_last_used ON responses (last_used);
+"""
+
+class LLMResponseCache:
+    """Persistent content-addressed cache of LLM responses, usable wherever autogen accepts a cache.
+
+    autogen keys each request on its full parameters (model, messages including tool results, tool definitions),
+    so identical prompts in the same tool state map to the same entry. Entries expire after ttl seconds and the
+    least recently used ones are evicted beyond max_entries. In "deterministic" mode entries never expire, so a
+    replayed run sees exactly the answers of the recorded one; "off" turns the cache into a pass-through.
+    """
+
+    def __init__(self, path="cache/llm_cache.sqlite", mode="normal", ttl=7 * 86400, max_entries=10000, namespace=""):
+        if mode not in CACHE_MODES:
+            raise ValueError(f"Unknown LLM cache mode: {mode}")
+        self.path = path
+        self.mode = mode
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.namespace = namespace
+        self.stats = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.executescript(_SCHEMA)
+        self._conn.commit()
+        self._count = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+
+    def _key(self, key):
+        return hashlib.sha256(f"{self.namespace}\0{key}".encode("utf-8")).hexdigest()
+
+    def get(self, key, default=None):
+        if self.mode == "off":
+            return default
+        digest = self._key(key)
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT value, created_at FROM responses WHERE key = ?", (digest,)).fetchone()
+            if row is None or (self.mode != "deterministic" and now - row[1] > self.ttl):
+                self.stats["misses"] += 1
+                return default
+            self._conn.execute("UPDATE responses SET last_used = ?, hits = hits + 1 WHERE key = ?", (now, digest))
+            self._conn.commit()
+            self.stats["hits"] += 1
+        return pickle.loads(row[0])
+
+    def set(self, key, value):
+        if self.mode == "off":
+            return
+        digest = self._key(key)
+        now = time.time()
+        data = pickle.dumps(value)
+        with self._lock:
+            # INSERT OR REPLACE reports one changed row whether or not the key existed, so only new keys are counted.
+            exists = self._conn.execute("SELECT 1 FROM responses WHERE key = ?", (digest,)).fetchone() is not None
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, value, created_at, last_used) VALUES (?, ?, ?, ?)",
+                (digest, data, now, now),
+            )
+            if not exists:
+                self._count += 1
+            self.stats["stores"] += 1
+            if self._count > self.max_entries:
+                self._evict(now)
+            self._conn.commit()
+
+    def _evict(self, now):
+        expired = 0
+        if self.mode != "deterministic":
+            expired = self._conn.execute("DELETE FROM responses WHERE created_at < ?", (now - self.ttl,)).rowcount
+        self._count = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        excess = self._count - int(self.max_entries * 0.9)
+        evicted = 0
+        if excess > 0:
+            # Evict down to 90% so eviction runs once per batch of inserts, not on every one.
+            evicted = self._conn.execute(
+                "DELETE FROM responses WHERE key IN (SELECT key FROM responses ORDER BY last_used LIMIT ?)", (excess,)
+            ).rowcount
+        self._count -= evicted
+        self.stats["evictions"] += expired + evicted
+
+    def hit_rate(self):
+        lookups = self.stats["hits"] + self.stats["misses"]
+        return self.stats["hits"] / lookups if lookups else None
+
+    def summary(self):
+        return {**self.stats, "hit_rate": self.hit_rate(), "entries": self._count, "mode": self.mode}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    # autogen treats caches as context managers; this one stays open for the whole process instead.
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        pass
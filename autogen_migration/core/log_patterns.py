@@ -0,0 +1,146 @@
+import re
+import logging
+
+logger = logging.getLogger(__name__)
+
+WILDCARD = "<*>"
+# Variable parts of log messages replaced before clustering, most specific first.
+_MASKS = [
+    re.compile(r"\b[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}\b"), # UUIDs
+    re.compile(r"\b\d{1,3}(?:\.\d{1,3}){3}(?::\d+)?\b"), # IPv4 addresses, optionally with a port
+    re.compile(r"\d{4}-\d{2}-\d{2}[T ]\d{2}:\d{2}:\d{2}(?:\.\d+)?Z?"), # timestamps
+    re.compile(r"'[^']*'|\"[^\"]*\"|`[^`]*`"), # quoted strings and identifiers
+    re.compile(r"\b0x[0-9a-fA-F]+\b"), # hex numbers
+    re.compile(r"(?<![A-Za-z])[-+]?\d+(?:\.\d+)?(?![A-Za-z])"), # plain numbers
+]
+
+def mask_message(message):
+    """Replaces numbers, addresses, timestamps and quoted values with a wildcard so similar messages line up."""
+    for pattern in _MASKS:
+        message = pattern.sub(WILDCARD, message)
+    return message
+
+def entry_message(entry):
+    """Text of a Cloud Logging entry: its text payload or the message field of its JSON payload."""
+    if getattr(entry, "text_payload", None):
+        return entry.text_payload
+    payload = getattr(entry, "json_payload", None)
+    if payload:
+        for field in ("message", "textPayload", "msg"):
+            if payload.get(field):
+                return str(payload[field])
+        return str(dict(payload))
+    return str(entry)
+
+class LogCluster:
+    """A message template and its counters; only a few exemplars of the raw messages are kept."""
+
+    def __init__(self, tokens):
+        self.tokens = tokens
+        self.count = 0
+        self.severities = {}
+        self.first_seen = None
+        self.last_seen = None
+        self.exemplars = []
+
+    @property
+    def template(self):
+        return " ".join(self.tokens)
+
+    def similarity(self, tokens):
+        same = sum(1 for a, b in zip(self.tokens, tokens) if a == b or a == WILDCARD)
+        return same / len(tokens)
+
+    def absorb(self, tokens):
+        self.tokens = [a if a == b else WILDCARD for a, b in zip(self.tokens, tokens)]
+
+    def to_dict(self):
+        return {
+            "template": self.template,
+            "count": self.count,
+            "severities": self.severities,
+            "first_seen": self.first_seen,
+            "last_seen": self.last_seen,
+            "exemplars": self.exemplars,
+        }
+
+class LogTemplateMiner:
+    """Streams log messages into templates with the Drain algorithm.
+
+    Messages are masked, tokenised and routed through a fixed-depth tree (token count, then the first depth tokens)
+    to a small list of clusters; a message joins the most similar cluster when at least similarity_threshold of its
+    tokens match, otherwise it starts a new one. Memory is bounded by max_clusters and max_exemplars, not by the
+    number of messages.
+    """
+
+    def __init__(self, similarity_threshold=0.5, depth=2, max_children=100, max_clusters=1000,
+                 max_exemplars=3, max_exemplar_chars=500):
+        self.similarity_threshold = similarity_threshold
+        self.depth = depth
+        self.max_children = max_children
+        self.max_clusters = max_clusters
+        self.max_exemplars = max_exemplars
+        self.max_exemplar_chars = max_exemplar_chars
+        self.tree = {}
+        self.clusters = []
+        self.total = 0
+        self.unclustered = 0
+
+    def _leaf(self, tokens):
+        node = self.tree.setdefault(len(tokens), {})
+        for token in tokens[:self.depth]:
+            # Tokens holding digits are likely variables; route them with the wildcard so the tree stays small.
+            key = WILDCARD if any(c.isdigit() for c in token) else token
+            if key not in node and len(node) >= self.max_children:
+                key = WILDCARD
+            node = node.setdefault(key, {})
+        return node.setdefault(None, [])
+
+    def add(self, message, severity=None, timestamp=None):
+        """Assigns one message to a cluster and returns it (None once max_clusters is reached and nothing matches)."""
+        self.total += 1
+        tokens = mask_message(message).split() or [""]
+        leaf = self._leaf(tokens)
+        best, best_score = None, -1.0
+        for cluster in leaf:
+            score = cluster.similarity(tokens)
+            if score > best_score:
+                best, best_score = cluster, score
+        if best is not None and best_score >= self.similarity_threshold:
+            best.absorb(tokens)
+            cluster = best
+        elif len(self.clusters) < self.max_clusters:
+            cluster = LogCluster(tokens)
+            leaf.append(cluster)
+            self.clusters.append(cluster)
+        else:
+            self.unclustered += 1
+            return None
+        cluster.count += 1
+        if severity is not None:
+            cluster.severities[severity] = cluster.severities.get(severity, 0) + 1
+        if timestamp is not None:
+            cluster.first_seen = cluster.first_seen or timestamp
+            cluster.last_seen = timestamp
+        if len(cluster.exemplars) < self.max_exemplars:
+            cluster.exemplars.append(message[:self.max_exemplar_chars])
+        return cluster
+
+    def add_entries(self, entries):
+        """Consumes an iterable of Cloud Logging entries without holding them in memory."""
+        for entry in entries:
+            severity = getattr(entry, "severity", None)
+            timestamp = getattr(entry, "timestamp", None)
+            self.add(entry_message(entry), getattr(severity, "name", severity),
+                     timestamp.isoformat() if hasattr(timestamp, "isoformat") else timestamp)
+        return self
+
+    def summary(self, top=10):
+        """The most frequent templates with counts and exemplars, small enough to hand to an LLM."""
+        ranked = sorted(self.clusters, key=lambda c: c.count, reverse=True)
+        return {
+            "total_messages": self.total,
+            "template_count": len(self.clusters),
+            "unclustered": self.unclustered,
+            "templates": [cluster.to_dict() for cluster in ranked[:top]],
+        }
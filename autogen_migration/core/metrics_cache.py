@@ -0,0 +1,131 @@
+import numpy as np
+import threading
+import logging
+import json
+import os
+
+logger = logging.getLogger(__name__)
+
+POINT_DTYPE = np.dtype([("timestamp", "<i8"), ("value", "<f8")])
+DEFAULT_SETTLE_SECONDS = 240 # Cloud Monitoring can still add points this far back
+DEFAULT_MIN_REFRESH_SECONDS = 60 # Cloud SQL metrics are sampled once a minute
+DEFAULT_RETENTION_DAYS = 30
+
+class MetricsCache:
+    """On-disk cache of metric time series with incremental fetches.
+
+    Each (project, instance, metric) has an append-only file of (timestamp, value) records plus a small JSON file with
+    the time range the records cover. A request fetches only what is missing: points newer than the covered range
+    (and, once, anything older than it). Points from the last settle_seconds are never persisted because Cloud
+    Monitoring may still fill them in; they are re-read on the next call. Callers for the same series share one
+    lock, so concurrent requests from different agents are served by a single fetch.
+    """
+
+    def __init__(self, directory="cache/metrics", settle_seconds=DEFAULT_SETTLE_SECONDS,
+                 min_refresh_seconds=DEFAULT_MIN_REFRESH_SECONDS, retention_days=DEFAULT_RETENTION_DAYS):
+        self.directory = directory
+        self.settle_seconds = int(settle_seconds)
+        self.min_refresh_seconds = int(min_refresh_seconds)
+        self.retention_seconds = int(retention_days * 86400)
+        self._locks = {}
+        self._locks_lock = threading.Lock()
+        # Unsettled recent points per series as (from, to, points), reused while to is within min_refresh_seconds of a request.
+        self._recent = {}
+        self.stats = {"requests": 0, "fetches": 0, "points_fetched": 0}
+        os.makedirs(directory, exist_ok=True)
+
+    def _paths(self, key):
+        base = os.path.join(self.directory, "__".join(part.replace("/", "_") for part in key))
+        return base + ".bin", base + ".json"
+
+    def _lock(self, key):
+        with self._locks_lock:
+            return self._locks.setdefault(key, threading.Lock())
+
+    def _load(self, key):
+        data_path, meta_path = self._paths(key)
+        if not os.path.exists(meta_path):
+            return np.empty(0, dtype=POINT_DTYPE), None
+        with open(meta_path, "r") as f:
+            coverage = json.load(f)
+        return np.fromfile(data_path, dtype=POINT_DTYPE) if os.path.exists(data_path) else np.empty(0, dtype=POINT_DTYPE), coverage
+
+    def _save(self, key, points, coverage, append=None):
+        data_path, meta_path = self._paths(key)
+        if append is not None:
+            with open(data_path, "ab") as f:
+                append.tofile(f)
+        else:
+            tmp_path = data_path + ".tmp"
+            points.tofile(tmp_path)
+            os.replace(tmp_path, data_path)
+        tmp_path = meta_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(coverage, f)
+        os.replace(tmp_path, meta_path)
+
+    def _fetch(self, fetch, start, end):
+        timestamps, values = fetch(start, end)
+        self.stats["fetches"] += 1
+        self.stats["points_fetched"] += len(timestamps)
+        points = np.empty(len(timestamps), dtype=POINT_DTYPE)
+        points["timestamp"], points["value"] = timestamps, values
+        return points[np.argsort(points["timestamp"], kind="stable")]
+
+    def get(self, key, start, end, fetch):
+        """Returns (timestamps, values) for start <= t <= end, calling fetch(start, end) only for uncached ranges.
+
+        key is a tuple such as (project_id, instance_id, metric_type); times are epoch seconds.
+        """
+        self.stats["requests"] += 1
+        start, end = int(start), int(end)
+        settled = end - self.settle_seconds
+        if settled <= start:
+            # The whole window is still settling; nothing in it can be cached yet.
+            timestamps, values = fetch(start, end)
+            return np.asarray(timestamps, dtype=np.int64), np.asarray(values, dtype=np.float64)
+        with self._lock(key):
+            points, coverage = self._load(key)
+            if coverage is None or coverage["end"] < start:
+                points, coverage = self._fetch(fetch, start, settled), {"start": start, "end": settled}
+                self._save(key, points, coverage)
+            else:
+                if start < coverage["start"]:
+                    older = self._fetch(fetch, start, coverage["start"])
+                    points = np.concatenate([older[older["timestamp"] < coverage["start"]], points])
+                    coverage["start"] = start
+                    self._save(key, points, coverage)
+                if settled > coverage["end"]:
+                    new = self._fetch(fetch, coverage["end"], settled)
+                    new = new[(new["timestamp"] > coverage["end"]) & (new["timestamp"] <= settled)]
+                    coverage["end"] = settled
+                    points = np.concatenate([points, new])
+                    cutoff = end - self.retention_seconds
+                    if len(points) and points["timestamp"][0] < cutoff - 86400:
+                        # Rewrite at most about once a day to drop points past retention.
+                        points = points[points["timestamp"] >= cutoff]
+                        coverage["start"] = max(coverage["start"], cutoff)
+                        self._save(key, points, coverage)
+                    else:
+                        self._save(key, points, coverage, append=new)
+
+            recent = self._recent.get(key)
+            if recent is None or recent[0] > coverage["end"] or end - recent[1] > self.min_refresh_seconds:
+                recent = (coverage["end"], end, self._fetch(fetch, coverage["end"], end))
+                self._recent[key] = recent
+            tail = recent[2][recent[2]["timestamp"] > coverage["end"]]
+
+        points = np.concatenate([points, tail])
+        window = points[(points["timestamp"] >= start) & (points["timestamp"] <= end)]
+        return window["timestamp"].copy(), window["value"].copy()
+
+_metrics_caches = {}
+_metrics_caches_lock = threading.Lock()
+
+def get_metrics_cache(directory="cache/metrics", **options):
+    """Returns the process-wide MetricsCache for a directory, so every agent shares its series and locks."""
+    with _metrics_caches_lock:
+        cache = _metrics_caches.get(directory)
+        if cache is None:
+            cache = _metrics_caches[directory] = MetricsCache(directory, **options)
+        return cache
@@ -0,0 +1,460 @@
+from autogen_migration.core.utils import get_mysql_connection, mysql_connection, get_mysql_pool
+from autogen_migration.core.validation import (
+    quote_identifier, get_table_columns, get_primary_key_columns, keyset_range_clause, split_key_ranges, stream_rows,
+)
+from autogen_migration.core.cdc import get_binlog_position
+from autogen_migration.core.ddl import convert_statement
+from autogen_migration.core.streaming import COMPRESSION_SUFFIXES, _compressor, _decompressor
+from autogen_migration.core.instrumentation import record_chunk
+from concurrent.futures import ThreadPoolExecutor
+import threading
+import hashlib
+import logging
+import pymysql
+import queue
+import json
+import time
+import os
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_EXPORT_WORKERS = 4
+DEFAULT_CHUNK_ROWS = 100000
+DEFAULT_INSERT_ROWS = 1000 # rows per INSERT statement in a chunk file
+MANIFEST_NAME = "manifest.json"
+IMPORT_STATE_NAME = "import_state.json"
+TABLE_EXISTS_ERROR = 1050
+CHUNK_HEADER = "SET NAMES utf8mb4;\nSET foreign_key_checks = 0;\nSET unique_checks = 0;\n"
+
+def _gtid_executed(cursor):
+    try:
+        cursor.execute("SELECT @@GLOBAL.gtid_executed")
+        return cursor.fetchone()[0]
+    except pymysql.MySQLError:
+        return None # no GTIDs on this server (e.g. MariaDB)
+
+def open_snapshot_sessions(source_config, sessions):
+    """Opens connections that all read from the same consistent snapshot.
+
+    A coordinator connection holds FLUSH TABLES WITH READ LOCK while every session runs START TRANSACTION WITH
+    CONSISTENT SNAPSHOT and the binlog position is read, then releases it, so writes are blocked only for that moment.
+    Without the RELOAD privilege (managed sources) the sessions are started back to back instead, and the snapshot
+    counts as consistent only if gtid_executed did not move while they started.
+    """
+    coordinator = get_mysql_connection(**source_config)
+    conns = []
+    try:
+        locked = False
+        with coordinator.cursor() as cursor:
+            try:
+                cursor.execute("FLUSH TABLES WITH READ LOCK")
+                locked = True
+            except pymysql.MySQLError as e:
+                logger.warning(f"FLUSH TABLES WITH READ LOCK is not allowed ({e}); starting the snapshot sessions without it.")
+            gtid_before = _gtid_executed(cursor)
+            try:
+                for _ in range(sessions):
+                    conn = get_mysql_connection(**source_config)
+                    conns.append(conn)
+                    with conn.cursor() as session:
+                        session.execute("SET SESSION TRANSACTION ISOLATION LEVEL REPEATABLE READ")
+                        session.execute("START TRANSACTION WITH CONSISTENT SNAPSHOT")
+                try:
+                    position = get_binlog_position(coordinator)
+                except (RuntimeError, pymysql.MySQLError) as e:
+                    logger.warning(f"Could not read the binlog position of the snapshot: {e}")
+                    position = None
+                gtid_after = _gtid_executed(cursor)
+            finally:
+                if locked:
+                    cursor.execute("UNLOCK TABLES")
+    except Exception:
+        for conn in conns:
+            conn.close()
+        raise
+    finally:
+        coordinator.close()
+    consistent = locked or bool(gtid_before) and gtid_before == gtid_after
+    if not consistent:
+        logger.warning("The export sessions may not share one snapshot; CDC from the recorded position will reconcile them.")
+    return conns, {"position": position, "locked": locked, "consistent": consistent, "started_at": time.time()}
+
+def _chunk_file_name(table, index, compression):
+    return f"{table}.{index:05d}.sql{COMPRESSION_SUFFIXES[compression]}"
+
+def _key_list(key):
+    return list(key) if key is not None else None
+
+def plan_tables(conn, tables=None, chunk_rows=DEFAULT_CHUNK_ROWS):
+    """Lists the tables to export with their columns, primary key and primary-key range chunks, read inside the snapshot."""
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT table_name, table_rows FROM information_schema.tables "
+                       "WHERE table_schema = DATABASE() AND table_type = 'BASE TABLE'")
+        estimates = {name: rows or 0 for name, rows in cursor.fetchall()}
+    plans = []
+    for table in tables or sorted(estimates):
+        pk_columns = get_primary_key_columns(conn, table)
+        with conn.cursor() as cursor:
+            cursor.execute(f"SHOW CREATE TABLE {quote_identifier(table)}")
+            create_sql = cursor.fetchone()[1]
+        if pk_columns and estimates.get(table, 0) > chunk_rows:
+            ranges = split_key_ranges(conn, table, pk_columns, chunk_rows)
+        else:
+            # Small tables, and tables without a primary key, are written as one chunk.
+            ranges = [(None, None)]
+        plans.append({"table": table, "columns": get_table_columns(conn, table), "primary_key": pk_columns,
+                      "estimated_rows": estimates.get(table, 0), "create_sql": create_sql,
+                      "chunks": [{"index": i, "lower_key": _key_list(lower), "upper_key": _key_list(upper)}
+                                 for i, (lower, upper) in enumerate(ranges)]})
+    return plans
+
+class _Manifest:
+    """The export manifest, rewritten atomically whenever a chunk finishes so an interrupted export can be resumed."""
+
+    def __init__(self, output_dir, data):
+        self.path = os.path.join(output_dir, MANIFEST_NAME)
+        self.data = data
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls, output_dir):
+        path = os.path.join(output_dir, MANIFEST_NAME)
+        if not os.path.exists(path):
+            return None
+        with open(path, "r") as f:
+            return cls(output_dir, json.load(f))
+
+    def table(self, name):
+        return next(t for t in self.data["tables"] if t["table"] == name)
+
+    def update(self, table, index, **fields):
+        with self._lock:
+            self.table(table)["chunks"][index].update(fields)
+            self.save()
+
+    def save(self):
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.data, f, indent=2, default=str)
+            f.flush()
+            os.fsync(f.fileno()) # the rename must not land before the data, or a crash leaves an empty manifest
+        os.replace(tmp_path, self.path)
+
+def _write_chunk(conn, output_dir, table, chunk, compression, insert_rows):
+    """Writes one primary-key range as multi-row INSERT statements, one statement per line, and returns its stats."""
+    started = time.monotonic()
+    columns, pk_columns = table["columns"], table["primary_key"]
+    lower_key = tuple(chunk["lower_key"]) if chunk["lower_key"] is not None else None
+    upper_key = tuple(chunk["upper_key"]) if chunk["upper_key"] is not None else None
+    where, params = keyset_range_clause(pk_columns, lower_key, upper_key)
+    select_list = ", ".join(quote_identifier(c) for c in columns)
+    order_by = f" ORDER BY {', '.join(quote_identifier(c) for c in pk_columns)}" if pk_columns else ""
+    insert_prefix = f"INSERT INTO {quote_identifier(table['table'])} ({select_list}) VALUES "
+    file_name = _chunk_file_name(table["table"], chunk["index"], compression)
+    path = os.path.join(output_dir, file_name)
+    compressor = _compressor(compression)
+    digest = hashlib.sha256()
+    counts = {"rows": 0, "bytes": 0, "file_bytes": 0}
+    escape = conn.escape
+
+    def emit(text):
+        data = text.encode("utf-8")
+        counts["bytes"] += len(data)
+        if compressor:
+            data = compressor.compress(data)
+        if data:
+            f.write(data)
+            digest.update(data)
+            counts["file_bytes"] += len(data)
+
+    with open(path + ".tmp", "wb") as f:
+        emit(CHUNK_HEADER)
+        batch = []
+        for row in stream_rows(conn, f"SELECT {select_list} FROM {quote_identifier(table['table'])}{where}{order_by}", params):
+            batch.append("(" + ",".join(escape(value) for value in row) + ")")
+            if len(batch) >= insert_rows:
+                emit(insert_prefix + ",".join(batch) + ";\n")
+                counts["rows"] += len(batch)
+                batch = []
+        if batch:
+            emit(insert_prefix + ",".join(batch) + ";\n")
+            counts["rows"] += len(batch)
+        if compressor:
+            tail = compressor.flush()
+            f.write(tail)
+            digest.update(tail)
+            counts["file_bytes"] += len(tail)
+        f.flush()
+        os.fsync(f.fileno())
+    # Only whole chunks get the final name, so a chunk file on disk is always complete.
+    os.replace(path + ".tmp", path)
+    seconds = time.monotonic() - started
+    record_chunk("export", seconds, counts["rows"])
+    return {"file": file_name, "status": "done", "sha256": digest.hexdigest(), **counts, "seconds": round(seconds, 3)}
+
+def export_database(source_config, output_dir, tables=None, workers=DEFAULT_EXPORT_WORKERS, chunk_rows=DEFAULT_CHUNK_ROWS,
+                    compression="none", insert_rows=DEFAULT_INSERT_ROWS, resume=True):
+    """Exports a database as one schema file per table plus row-range chunk files, written by parallel workers.
+
+    Every worker reads through its own session of one shared consistent snapshot (see open_snapshot_sessions), so
+    the chunks of all tables match a single binlog position, which is recorded in the manifest together with each
+    table's chunks, key ranges, row counts and SHA-256 checksums. With resume, a rerun against an existing manifest
+    exports only the chunks that are not done, under a new snapshot whose position is added to the manifest.
+    """
+    started = time.monotonic()
+    os.makedirs(output_dir, exist_ok=True)
+    manifest = _Manifest.load(output_dir) if resume else None
+    sessions, snapshot = open_snapshot_sessions(source_config, max(1, int(workers)))
+    sessions_lock = threading.Lock() # export workers drop failed sessions from the list
+    try:
+        if manifest is None:
+            plans = plan_tables(sessions[0], tables, chunk_rows)
+            for plan in plans:
+                schema_file = f"{plan['table']}-schema.sql"
+                with open(os.path.join(output_dir, schema_file), "w") as f:
+                    f.write(plan.pop("create_sql") + ";\n")
+                plan["schema_file"] = schema_file
+            manifest = _Manifest(output_dir, {"database": source_config["db"], "compression": compression,
+                                              "chunk_rows": chunk_rows, "snapshots": [], "tables": plans})
+        manifest.data["snapshots"].append(snapshot)
+        snapshot_index = len(manifest.data["snapshots"]) - 1
+        manifest.save()
+        pending = [(table, chunk) for table in manifest.data["tables"] for chunk in table["chunks"] if chunk.get("status") != "done"]
+        # Tables with the most chunks first, so the biggest table does not start last.
+        pending.sort(key=lambda item: len(item[0]["chunks"]), reverse=True)
+        logger.info(f"Exporting {len(pending)} chunks of {len(manifest.data['tables'])} tables from {source_config['db']} "
+                    f"with {len(sessions)} snapshot sessions...")
+
+        idle = queue.Queue()
+        for conn in sessions:
+            idle.put(conn)
+        alive = [len(sessions)]
+        failed = []
+
+        def fail(table, chunk, error):
+            logger.error(f"Exporting chunk {chunk['index']} of {table['table']} failed: {error}")
+            failed.append({"table": table["table"], "index": chunk["index"], "error": str(error)})
+            manifest.update(table["table"], chunk["index"], status="failed", error=str(error))
+
+        def export(item):
+            table, chunk = item
+            conn = idle.get()
+            if conn is None:
+                idle.put(None)
+                fail(table, chunk, "no snapshot session left")
+                return
+            try:
+                result = _write_chunk(conn, output_dir, table, chunk, manifest.data["compression"], insert_rows)
+            except Exception as e:
+                fail(table, chunk, e)
+                # A session cannot rejoin the snapshot once its transaction is in doubt, so it is dropped; the chunk
+                # is redone by a resumed export under a new snapshot.
+                with sessions_lock:
+                    sessions.remove(conn)
+                    alive[0] -= 1
+                    last = not alive[0]
+                conn.close()
+                if last:
+                    idle.put(None)
+                return
+            manifest.update(table["table"], chunk["index"], snapshot=snapshot_index, error=None, **result)
+            idle.put(conn)
+
+        with ThreadPoolExecutor(max_workers=len(sessions), thread_name_prefix="sharded-export") as executor:
+            list(executor.map(export, pending))
+    finally:
+        with sessions_lock:
+            remaining = list(sessions)
+        for conn in remaining:
+            try:
+                conn.rollback()
+            finally:
+                conn.close()
+
+    for table in manifest.data["tables"]:
+        done = [c for c in table["chunks"] if c.get("status") == "done"]
+        table["rows"] = sum(c["rows"] for c in done)
+        table["bytes"] = sum(c["bytes"] for c in done)
+    manifest.save()
+    elapsed = round(time.monotonic() - started, 3)
+    rows = sum(t["rows"] for t in manifest.data["tables"])
+    logger.info(f"Exported {rows} rows of {source_config['db']} to {output_dir} in {elapsed}s ({len(failed)} chunks failed)")
+    return {
+        "status": "failure" if failed else "success",
+        "manifest": manifest.path,
+        "tables": len(manifest.data["tables"]),
+        "chunks": sum(len(t["chunks"]) for t in manifest.data["tables"]),
+        "chunks_exported": len(pending) - len(failed),
+        "rows": rows,
+        "snapshot": snapshot,
+        "failed_chunks": failed,
+        "elapsed_seconds": elapsed,
+    }
+
+class _ImportState:
+    """Chunks already loaded into one target, kept next to the manifest so a rerun loads only the rest."""
+
+    def __init__(self, output_dir, target):
+        self.path = os.path.join(output_dir, IMPORT_STATE_NAME)
+        self.target = target
+        self.chunks = {}
+        self._lock = threading.Lock()
+        if os.path.exists(self.path):
+            with open(self.path, "r") as f:
+                saved = json.load(f)
+            if saved.get("target") == target:
+                self.chunks = saved["chunks"]
+
+    def done(self, table, index, rows):
+        with self._lock:
+            self.chunks[f"{table}/{index}"] = rows
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, "w") as f:
+                json.dump({"target": self.target, "chunks": self.chunks}, f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
+
+    def is_done(self, table, index):
+        return f"{table}/{index}" in self.chunks
+
+def _chunk_statements(path, compression, digest, block_size=1024 * 1024):
+    """Yields the statements of a chunk file (one per line), decompressing as it reads and hashing the file bytes."""
+    decompressor = _decompressor(compression)
+    tail = b""
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+            lines = (tail + (decompressor.decompress(block) if decompressor else block)).split(b"\n")
+            tail = lines.pop()
+            for line in lines:
+                if line.strip():
+                    yield line.decode("utf-8")
+    if decompressor:
+        tail += decompressor.flush()
+    if tail.strip():
+        yield tail.decode("utf-8")
+
+def _load_chunk(target_config, output_dir, table, chunk, compression):
+    """Loads one chunk file in a single transaction after clearing its key range, so loading it again is harmless.
+
+    A chunk without a key range (a single-chunk table, or a table without a primary key) clears the whole table.
+    """
+    started = time.monotonic()
+    lower_key = tuple(chunk["lower_key"]) if chunk["lower_key"] is not None else None
+    upper_key = tuple(chunk["upper_key"]) if chunk["upper_key"] is not None else None
+    where, params = keyset_range_clause(table["primary_key"], lower_key, upper_key)
+    digest = hashlib.sha256()
+    rows = 0
+    with mysql_connection(**target_config) as conn:
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT @@SESSION.foreign_key_checks, @@SESSION.unique_checks")
+            previous = cursor.fetchone()
+            try:
+                cursor.execute(f"DELETE FROM {quote_identifier(table['table'])}{where}", params)
+                for statement in _chunk_statements(os.path.join(output_dir, chunk["file"]), compression, digest):
+                    affected = cursor.execute(statement)
+                    if statement.startswith("INSERT"):
+                        rows += affected
+                if digest.hexdigest() != chunk["sha256"]:
+                    raise IOError(f"{chunk['file']} does not match its manifest checksum")
+                if rows != chunk["rows"]:
+                    raise IOError(f"{chunk['file']} loaded {rows} rows, the manifest says {chunk['rows']}")
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            finally:
+                # The chunk header relaxes checks for the session; pooled connections go back as they were borrowed.
+                cursor.execute("SET SESSION foreign_key_checks = %s, unique_checks = %s", previous)
+    seconds = time.monotonic() - started
+    record_chunk("import", seconds, rows)
+    return {"table": table["table"], "index": chunk["index"], "rows": rows, "seconds": round(seconds, 3)}
+
+def _create_table(target_config, output_dir, table, convert_schema):
+    with open(os.path.join(output_dir, table["schema_file"]), "r") as f:
+        text = f.read().strip().rstrip(";")
+    if convert_schema:
+        converted = convert_statement((text, ";"))
+        if converted["unresolved"]:
+            logger.warning(f"Schema of {table['table']} needs review: {converted['unresolved']}")
+        text = converted["text"]
+    with mysql_connection(**target_config) as conn:
+        with conn.cursor() as cursor:
+            try:
+                cursor.execute(text)
+            except pymysql.MySQLError as e:
+                if e.args[0] != TABLE_EXISTS_ERROR:
+                    raise
+
+def import_database(target_config, output_dir, workers=DEFAULT_EXPORT_WORKERS, chunks=None, create_tables=True,
+                    convert_schema=True, resume=True):
+    """Loads a sharded export into a database, several chunk files at a time.
+
+    Missing tables are created first from their schema files, run through the Cloud SQL DDL rules unless
+    convert_schema is off. Every chunk is checked against its manifest checksum and row count before it commits.
+    Loaded chunks are recorded in import_state.json, so a rerun loads only what is left; pass chunks (e.g. a previous
+    result's failed_chunks, as {"table", "index"} dicts) to redo just those. Chunks without a key range are refused
+    there, since reloading one empties the whole table, including rows loaded since by another process; they are
+    redone by a plain rerun, which loads every chunk not yet recorded as loaded.
+    """
+    started = time.monotonic()
+    manifest = _Manifest.load(output_dir)
+    if manifest is None:
+        raise FileNotFoundError(f"No {MANIFEST_NAME} in {output_dir}")
+    compression = manifest.data["compression"]
+    state = _ImportState(output_dir, f"{target_config['host']}:{target_config['port']}/{target_config['db']}")
+    wanted = {(c["table"], int(c["index"])) for c in chunks} if chunks else None
+    tables = manifest.data["tables"]
+    if create_tables:
+        for table in tables:
+            _create_table(target_config, output_dir, table, convert_schema)
+
+    pending, missing, loaded, failed = [], [], [], []
+    for table in tables:
+        for chunk in table["chunks"]:
+            key = (table["table"], chunk["index"])
+            if wanted is not None and key not in wanted:
+                continue
+            if chunk.get("status") != "done":
+                missing.append({"table": table["table"], "index": chunk["index"]})
+            elif wanted is not None and chunk["lower_key"] is None and chunk["upper_key"] is None:
+                failed.append({"table": table["table"], "index": chunk["index"],
+                               "error": "a chunk without a key range cannot be redone on its own; rerun the import without chunks"})
+            elif wanted is not None or not (resume and state.is_done(*key)):
+                pending.append((table, chunk))
+    skipped = sum(len(t["chunks"]) for t in tables) - len(pending) - len(missing) if wanted is None else 0
+    if missing:
+        logger.warning(f"{len(missing)} chunks were never exported and cannot be loaded; resume the export first.")
+    # Biggest chunks first, so the slowest loads do not start last.
+    pending.sort(key=lambda item: item[1]["rows"], reverse=True)
+    logger.info(f"Loading {len(pending)} chunks into {target_config['db']} with {workers} workers ({skipped} already loaded)...")
+    get_mysql_pool(**target_config, max_size=workers)
+
+    def load(item):
+        table, chunk = item
+        try:
+            result = _load_chunk(target_config, output_dir, table, chunk, compression)
+        except Exception as e:
+            logger.error(f"Loading chunk {chunk['index']} of {table['table']} failed: {e}")
+            failed.append({"table": table["table"], "index": chunk["index"], "error": str(e)})
+            return
+        state.done(table["table"], chunk["index"], result["rows"])
+        loaded.append(result)
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="sharded-import") as executor:
+        list(executor.map(load, pending))
+    elapsed = round(time.monotonic() - started, 3)
+    rows = sum(r["rows"] for r in loaded)
+    logger.info(f"Loaded {rows} rows in {len(loaded)} chunks into {target_config['db']} in {elapsed}s ({len(failed)} failed)")
+    return {
+        "status": "failure" if failed or missing else "success",
+        "chunks_loaded": len(loaded),
+        "chunks_skipped": skipped,
+        "rows": rows,
+        "rows_per_second": round(rows / elapsed, 1) if elapsed > 0 else None,
+        "slowest": sorted(loaded, key=lambda r: r["seconds"], reverse=True)[:5],
+        "failed_chunks": failed,
+        "missing_chunks": missing,
+        "elapsed_seconds": elapsed,
+    }
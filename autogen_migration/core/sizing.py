@@ -0,0 +1,212 @@
+import logging
+import math
+import time
+
+logger = logging.getLogger(__name__)
+
+GIB = 1024 ** 3
+SYSTEM_SCHEMAS = ("mysql", "information_schema", "performance_schema", "sys")
+DEFAULT_SAMPLE_SECONDS = 60
+DEFAULT_PROBE_SECONDS = 5 # how often Threads_running is read during the sample
+DEFAULT_TOP_DIGESTS = 10
+
+BUFFER_POOL_HEADROOM = 1.3 # buffer pool over the estimated working set
+BUFFER_POOL_MEMORY_RATIO = 0.7 # share of instance memory Cloud SQL can give the buffer pool
+TARGET_CPU_UTILIZATION = 0.6
+QPS_PER_VCPU = 1500 # simple OLTP statements one vCPU sustains
+IOPS_HEADROOM = 2.0 # sampled averages understate peaks
+STORAGE_HEADROOM = 1.5 # data + indexes, plus binary logs, temp space and growth
+SSD_IOPS_PER_GB = 30
+HDD_IOPS_PER_GB = 0.75
+MIN_DISK_GB = 10
+MIN_MEMORY_GB = 3.75
+MIN_MEMORY_PER_VCPU_GB = 0.9 # limits of Cloud SQL custom machine types
+MAX_MEMORY_PER_VCPU_GB = 6.5
+MAX_VCPUS = 96
+
+def _number(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+def global_status(conn):
+    """SHOW GLOBAL STATUS as a dict of name to number (non-numeric values are skipped)."""
+    with conn.cursor() as cursor:
+        cursor.execute("SHOW GLOBAL STATUS")
+        rows = cursor.fetchall()
+    return {name: value for name, value in ((row[0], _number(row[1])) for row in rows) if value is not None}
+
+def global_variable(conn, name):
+    with conn.cursor() as cursor:
+        cursor.execute("SHOW GLOBAL VARIABLES LIKE %s", (name,))
+        row = cursor.fetchone()
+    return _number(row[1]) if row else None
+
+def schema_sizes(conn, databases=None):
+    """Data and index bytes and table counts per schema from information_schema, system schemas excluded."""
+    sql = ("SELECT TABLE_SCHEMA, COALESCE(SUM(DATA_LENGTH), 0), COALESCE(SUM(INDEX_LENGTH), 0), COUNT(*) "
+           f"FROM information_schema.TABLES WHERE TABLE_SCHEMA NOT IN ({', '.join(['%s'] * len(SYSTEM_SCHEMAS))})")
+    params = list(SYSTEM_SCHEMAS)
+    if databases:
+        sql += f" AND TABLE_SCHEMA IN ({', '.join(['%s'] * len(databases))})"
+        params.extend(databases)
+    with conn.cursor() as cursor:
+        cursor.execute(sql + " GROUP BY TABLE_SCHEMA", params)
+        return {schema: {"data_bytes": int(data), "index_bytes": int(index), "tables": int(tables)}
+                for schema, data, index, tables in cursor.fetchall()}
+
+def statement_wait_seconds(conn):
+    """Total statement time recorded by performance_schema digests, or None when it is not available."""
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT COALESCE(SUM(SUM_TIMER_WAIT), 0) FROM performance_schema.events_statements_summary_by_digest")
+            return float(cursor.fetchone()[0]) / 1e12 # picoseconds
+    except Exception as e:
+        logger.warning(f"performance_schema statement digests unavailable: {e}")
+        return None
+
+def top_digests(conn, limit=DEFAULT_TOP_DIGESTS):
+    """The statements with the most total time since the digests were last reset."""
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute(
+                "SELECT SCHEMA_NAME, LEFT(DIGEST_TEXT, 200), COUNT_STAR, SUM_TIMER_WAIT, SUM_ROWS_EXAMINED, SUM_ROWS_SENT "
+                "FROM performance_schema.events_statements_summary_by_digest ORDER BY SUM_TIMER_WAIT DESC LIMIT %s",
+                (limit,),
+            )
+            rows = cursor.fetchall()
+    except Exception:
+        return []
+    return [{"schema": schema, "digest": text, "calls": int(calls), "total_seconds": round(float(wait) / 1e12, 3),
+             "rows_examined": int(examined), "rows_sent": int(sent)}
+            for schema, text, calls, wait, examined, sent in rows]
+
+def sample_source_workload(conn, databases=None, sample_seconds=DEFAULT_SAMPLE_SECONDS, probe_seconds=DEFAULT_PROBE_SECONDS,
+                           digests=DEFAULT_TOP_DIGESTS):
+    """Measures a MySQL server's size and load: two SHOW GLOBAL STATUS snapshots sample_seconds apart, statement
+    time from performance_schema over the same interval, and data/index sizes from information_schema."""
+    sizes = schema_sizes(conn, databases)
+    before, wait_before, started = global_status(conn), statement_wait_seconds(conn), time.monotonic()
+    running = []
+    while True:
+        # Our own SHOW STATUS is one of the running threads.
+        running.append(max(global_status(conn).get("Threads_running", 1) - 1, 0))
+        remaining = sample_seconds - (time.monotonic() - started)
+        if remaining <= 0:
+            break
+        time.sleep(min(probe_seconds, remaining))
+    after, wait_after = global_status(conn), statement_wait_seconds(conn)
+    interval = max(time.monotonic() - started, 1e-3)
+
+    def rate(name):
+        return max(after.get(name, 0) - before.get(name, 0), 0) / interval
+
+    read_requests = rate("Innodb_buffer_pool_read_requests")
+    page_size = after.get("Innodb_page_size") or global_variable(conn, "innodb_page_size") or 16384
+    return {
+        "schemas": sizes,
+        "data_bytes": sum(s["data_bytes"] for s in sizes.values()),
+        "index_bytes": sum(s["index_bytes"] for s in sizes.values()),
+        "tables": sum(s["tables"] for s in sizes.values()),
+        "sample_seconds": round(interval, 1),
+        "qps": round(rate("Questions"), 1),
+        "writes_per_second": round(sum(rate(f"Com_{c}") for c in ("insert", "update", "delete", "replace")), 1),
+        "read_iops": round(rate("Innodb_data_reads"), 1),
+        "write_iops": round(rate("Innodb_data_writes"), 1),
+        "buffer_pool_bytes": int(global_variable(conn, "innodb_buffer_pool_size") or 0),
+        "buffer_pool_data_bytes": int(after.get("Innodb_buffer_pool_pages_data", 0) * page_size),
+        "buffer_pool_miss_ratio": round(rate("Innodb_buffer_pool_reads") / read_requests, 5) if read_requests else None,
+        "threads_running_avg": round(sum(running) / len(running), 2),
+        "threads_running_peak": max(running),
+        "max_used_connections": int(after.get("Max_used_connections", 0)),
+        "statement_busy_seconds_per_second": round((wait_after - wait_before) / interval, 3) if wait_before is not None and wait_after is not None else None,
+        "top_digests": top_digests(conn, digests) if digests else [],
+    }
+
+def estimate_working_set(workload, reasoning):
+    """Bytes of data and indexes the workload keeps hot, judged by how well the source buffer pool serves it."""
+    total = workload["data_bytes"] + workload["index_bytes"]
+    resident = workload["buffer_pool_data_bytes"]
+    miss_ratio = workload["buffer_pool_miss_ratio"]
+    if not resident:
+        reasoning.append(f"No buffer pool statistics; assuming the whole {total / GIB:.1f} GiB of data and indexes is hot.")
+        return total
+    if miss_ratio is None:
+        reasoning.append(f"No reads during the sample; using the {resident / GIB:.1f} GiB resident in the source buffer pool as the working set.")
+        return min(resident, total) or resident
+    if miss_ratio <= 0.01:
+        reasoning.append(f"The source buffer pool serves {100 * (1 - miss_ratio):.2f}% of page reads from memory, so the "
+                         f"{resident / GIB:.1f} GiB it holds is taken as the working set.")
+        return min(resident, total) or resident
+    working_set = min(total, resident + workload["index_bytes"])
+    reasoning.append(f"The source buffer pool misses {100 * miss_ratio:.2f}% of page reads, so the working set is larger than "
+                     f"the {resident / GIB:.1f} GiB it holds; estimating it as that plus all indexes ({working_set / GIB:.1f} GiB).")
+    return working_set
+
+def recommend_sizing(workload):
+    """Derives a Cloud SQL tier, disk and InnoDB flags from a sampled workload, with the reasoning behind each choice."""
+    reasoning = []
+    total = workload["data_bytes"] + workload["index_bytes"]
+    working_set = estimate_working_set(workload, reasoning)
+
+    buffer_pool = max(working_set * BUFFER_POOL_HEADROOM, 128 * 1024 ** 2)
+    memory_gb = max(buffer_pool / BUFFER_POOL_MEMORY_RATIO / GIB, MIN_MEMORY_GB)
+    reasoning.append(f"Buffer pool of {buffer_pool / GIB:.1f} GiB ({BUFFER_POOL_HEADROOM}x the working set) needs "
+                     f"{memory_gb:.1f} GiB of memory at {int(BUFFER_POOL_MEMORY_RATIO * 100)}% for the buffer pool.")
+
+    busy = workload["statement_busy_seconds_per_second"]
+    cpu_demand = max(workload["threads_running_avg"], busy or 0)
+    vcpus_for_cpu = math.ceil(cpu_demand / TARGET_CPU_UTILIZATION)
+    vcpus_for_qps = math.ceil(workload["qps"] / QPS_PER_VCPU)
+    vcpus = max(1, vcpus_for_cpu, vcpus_for_qps)
+    reasoning.append(f"{cpu_demand:.2f} statements executing on average (threads running"
+                     f"{', performance_schema statement time' if busy is not None else ''}) need {vcpus_for_cpu} vCPUs at "
+                     f"{int(TARGET_CPU_UTILIZATION * 100)}% target utilization; {workload['qps']} QPS needs {vcpus_for_qps} "
+                     f"at {QPS_PER_VCPU} QPS per vCPU.")
+    if memory_gb > vcpus * MAX_MEMORY_PER_VCPU_GB:
+        vcpus = math.ceil(memory_gb / MAX_MEMORY_PER_VCPU_GB)
+        reasoning.append(f"Raised to {vcpus} vCPUs because custom machine types allow at most {MAX_MEMORY_PER_VCPU_GB} GiB per vCPU.")
+    if vcpus > 1 and vcpus % 2:
+        vcpus += 1 # custom machine types have 1 or an even number of vCPUs
+    if vcpus > MAX_VCPUS:
+        reasoning.append(f"Capped at {MAX_VCPUS} vCPUs, the largest custom machine type; consider read replicas for the rest.")
+        vcpus = MAX_VCPUS
+    memory_mb = int(math.ceil(max(memory_gb, vcpus * MIN_MEMORY_PER_VCPU_GB) * 4) * 256) # multiples of 256 MiB
+    memory_mb = min(memory_mb, int(vcpus * MAX_MEMORY_PER_VCPU_GB * 1024) // 256 * 256)
+
+    iops_needed = (workload["read_iops"] + workload["write_iops"]) * IOPS_HEADROOM
+    size_gb = max(total * STORAGE_HEADROOM / GIB, MIN_DISK_GB)
+    if iops_needed <= size_gb * HDD_IOPS_PER_GB and workload["qps"] < 50:
+        disk_type, disk_iops = "PD_HDD", size_gb * HDD_IOPS_PER_GB
+        reasoning.append(f"{iops_needed:.0f} IOPS at {IOPS_HEADROOM}x the sampled rate and under 50 QPS fit a standard (HDD) disk.")
+    else:
+        disk_type = "PD_SSD"
+        if iops_needed > size_gb * SSD_IOPS_PER_GB:
+            size_gb = iops_needed / SSD_IOPS_PER_GB
+            reasoning.append(f"Disk enlarged to reach {iops_needed:.0f} IOPS at {SSD_IOPS_PER_GB} IOPS per GB of SSD.")
+        disk_iops = size_gb * SSD_IOPS_PER_GB
+        reasoning.append(f"SSD for {iops_needed:.0f} IOPS ({IOPS_HEADROOM}x the sampled {workload['read_iops']} reads and "
+                         f"{workload['write_iops']} writes per second).")
+    size_gb = int(math.ceil(size_gb))
+    reasoning.append(f"{size_gb} GB disk holds {total / GIB:.1f} GiB of data and indexes with {STORAGE_HEADROOM}x headroom for logs, temp space and growth.")
+
+    io_capacity = int(min(max(200, math.ceil(workload["write_iops"] * IOPS_HEADROOM / 100) * 100), max(disk_iops // 2, 100)))
+    io_capacity_max = int(max(min(disk_iops, io_capacity * 4), io_capacity * 2))
+    reasoning.append(f"innodb_io_capacity {io_capacity} covers the sampled write rate with headroom and stays within half of "
+                     f"the disk's ~{disk_iops:.0f} IOPS; innodb_io_capacity_max {io_capacity_max} lets flushing burst.")
+    buffer_pool_flag = int(min(buffer_pool, memory_mb * 1024 ** 2 * BUFFER_POOL_MEMORY_RATIO)) // (128 * 1024 ** 2) * (128 * 1024 ** 2)
+    return {
+        "tier": f"db-custom-{vcpus}-{memory_mb}",
+        "vcpus": vcpus,
+        "memory_gb": round(memory_mb / 1024, 2),
+        "disk_size_gb": size_gb,
+        "disk_type": disk_type,
+        "working_set_gb": round(working_set / GIB, 2),
+        "database_flags": [
+            {"name": "innodb_buffer_pool_size", "value": str(buffer_pool_flag)},
+            {"name": "innodb_io_capacity", "value": str(io_capacity)},
+            {"name": "innodb_io_capacity_max", "value": str(io_capacity_max)},
+        ],
+        "reasoning": reasoning,
+    }
@@ -0,0 +1,344 @@
+import google_crc32c
+import threading
+import tempfile
+import sqlite3
+import pymysql
+import base64
+import zlib
+import re
+import os
+
+DEFAULT_BUSY_TIMEOUT = 120
+_SHOW_KEYS = re.compile(r"^\s*SHOW\s+KEYS\s+FROM\s+`([^`]+)`", re.IGNORECASE)
+_SHOW_COLUMNS = re.compile(r"^\s*SHOW\s+COLUMNS\s+FROM\s+`([^`]+)`", re.IGNORECASE)
+_SHOW_CREATE = re.compile(r"^\s*SHOW\s+CREATE\s+TABLE\s+`([^`]+)`", re.IGNORECASE)
+_TABLE_OPTIONS = re.compile(r"\)\s*(?:ENGINE|DEFAULT\s+CHARSET|CHARSET|COLLATE|ROW_FORMAT|AUTO_INCREMENT)\b[^)]*$", re.IGNORECASE)
+_ISNULL_CALL = re.compile(r"\bISNULL\(", re.IGNORECASE) # ISNULL is a postfix operator in SQLite, so it is renamed
+# MySQL upserts become SQLite ones: ON DUPLICATE KEY UPDATE c = VALUES(c) -> ON CONFLICT DO UPDATE SET c = excluded.c
+_ON_DUPLICATE = re.compile(r"\bON\s+DUPLICATE\s+KEY\s+UPDATE\b", re.IGNORECASE)
+_VALUES_CALL = re.compile(r"\bVALUES\((`[^`]+`)\)", re.IGNORECASE)
+_NO_OPS = ("SET ", "FLUSH ", "UNLOCK ", "CREATE DATABASE", "LOCK INSTANCE", "UNLOCK INSTANCE")
+_UNKNOWN_VARIABLE = 1193
+_TABLE_EXISTS = 1050
+_PARSE_ERROR = 1064
+
+def _upsert(text):
+    return _VALUES_CALL.sub(r"excluded.\1", _ON_DUPLICATE.sub("ON CONFLICT DO UPDATE SET", text))
+
+class _BitXor:
+    def __init__(self):
+        self.value = 0
+
+    def step(self, value):
+        if value is not None:
+            self.value ^= int(value)
+
+    def finalize(self):
+        return self.value
+
+def _concat(*values):
+    return None if any(v is None for v in values) else "".join(str(v) for v in values)
+
+def _concat_ws(separator, *values):
+    return separator.join(str(v) for v in values if v is not None)
+
+def _crc32(value):
+    return None if value is None else zlib.crc32(str(value).encode("utf-8"))
+
+class StandInCursor:
+    def __init__(self, conn):
+        self.conn = conn
+        self._rows = iter(())
+        self.rowcount = 0
+        self.description = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        self._rows = iter(())
+
+    def _result(self, rows):
+        rows = list(rows)
+        self._rows, self.rowcount = iter(rows), len(rows)
+        return len(rows)
+
+    def execute(self, sql, params=None):
+        text = sql.strip()
+        upper = text.upper()
+        db = self.conn.db
+        if upper.startswith(_NO_OPS):
+            return self._result(())
+        if upper.startswith(("START TRANSACTION", "BEGIN")):
+            if db.in_transaction:
+                db.commit() # MySQL commits an open transaction when a new one starts
+            db.execute("BEGIN")
+            db.execute("SELECT COUNT(*) FROM sqlite_master").fetchall() # take the read snapshot now
+            return self._result(())
+        if upper.startswith(("SHOW MASTER STATUS", "SHOW BINARY LOG STATUS")):
+            return self._result(()) # no binlog
+        if upper.startswith("SELECT @@"):
+            names = re.findall(r"@@(?:\w+\.)?(\w+)", text)
+            if "gtid_executed" in names:
+                raise pymysql.err.InternalError(_UNKNOWN_VARIABLE, "Unknown system variable 'gtid_executed'")
+            return self._result([tuple(1 for _ in names)])
+        match = _SHOW_KEYS.match(text)
+        if match:
+            info = db.execute(f"PRAGMA table_info(`{match.group(1)}`)").fetchall()
+            return self._result(sorted(((match.group(1), 0, "PRIMARY", row[5], row[1]) for row in info if row[5]),
+                                       key=lambda row: row[3]))
+        match = _SHOW_COLUMNS.match(text)
+        if match:
+            info = db.execute(f"PRAGMA table_info(`{match.group(1)}`)").fetchall()
+            return self._result((row[1], row[2], "NO" if row[3] else "YES", "PRI" if row[5] else "", row[4], "") for row in info)
+        match = _SHOW_CREATE.match(text)
+        if match:
+            row = db.execute("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?", (match.group(1),)).fetchone()
+            if row is None:
+                raise pymysql.err.ProgrammingError(1146, f"Table '{match.group(1)}' doesn't exist")
+            return self._result([(match.group(1), row[0])])
+        if "INFORMATION_SCHEMA.TABLES" in upper:
+            self.conn.refresh_table_stats()
+            text = re.sub(r"information_schema\.tables", "temp._information_schema_tables", text, flags=re.IGNORECASE)
+            text = re.sub(r"DATABASE\(\)", "'" + self.conn.database + "'", text, flags=re.IGNORECASE)
+        if upper.startswith("CREATE TABLE"):
+            text = _TABLE_OPTIONS.sub(")", text)
+        text = _upsert(_ISNULL_CALL.sub("MYSQL_ISNULL(", text))
+        try:
+            cursor = db.execute(text.replace("%s", "?"), tuple(params or ()))
+        except sqlite3.Error as e:
+            raise pymysql.err.ProgrammingError(_TABLE_EXISTS if "already exists" in str(e) else _PARSE_ERROR, str(e))
+        if cursor.description is None:
+            self._rows, self.rowcount, self.description = iter(()), cursor.rowcount, None
+            return cursor.rowcount
+        # Rows stream from SQLite as they are read, like pymysql's SSCursor.
+        self._rows, self.rowcount, self.description = cursor, -1, cursor.description
+        return 0
+
+    def executemany(self, sql, seq_of_params):
+        try:
+            cursor = self.conn.db.executemany(_upsert(sql).replace("%s", "?"), [tuple(p) for p in seq_of_params])
+        except sqlite3.Error as e:
+            raise pymysql.err.ProgrammingError(_PARSE_ERROR, str(e))
+        self.rowcount = cursor.rowcount
+        return cursor.rowcount
+
+    def fetchone(self):
+        return next(self._rows, None)
+
+    def fetchmany(self, size=1):
+        return [row for _, row in zip(range(size), self._rows)]
+
+    def fetchall(self):
+        return list(self._rows)
+
+    def __iter__(self):
+        return iter(self._rows)
+
+class StandInConnection:
+    """The subset of a pymysql connection this package uses, backed by <directory>/<database>.sqlite."""
+
+    def __init__(self, directory, database):
+        self.database = database or "mysql"
+        path = os.path.join(directory, f"{self.database}.sqlite")
+        # isolation_level="" opens a transaction implicitly before writes, like autocommit=0 in MySQL.
+        self.db = sqlite3.connect(path, timeout=DEFAULT_BUSY_TIMEOUT, check_same_thread=False, isolation_level="")
+        self.db.execute("PRAGMA journal_mode=WAL") # readers keep their snapshot while writers commit
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.create_function("CRC32", 1, _crc32, deterministic=True)
+        self.db.create_function("CONCAT", -1, _concat, deterministic=True)
+        self.db.create_function("CONCAT_WS", -1, _concat_ws, deterministic=True)
+        self.db.create_function("MYSQL_ISNULL", 1, lambda value: int(value is None), deterministic=True)
+        self.db.create_aggregate("BIT_XOR", 1, _BitXor)
+        self.open = True
+
+    def refresh_table_stats(self):
+        self.db.execute("CREATE TEMP TABLE IF NOT EXISTS _information_schema_tables (table_schema TEXT, table_name TEXT, "
+                        "table_type TEXT, engine TEXT, table_rows INTEGER, data_length INTEGER, index_length INTEGER)")
+        self.db.execute("DELETE FROM temp._information_schema_tables")
+        names = [row[0] for row in self.db.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%'")]
+        for name in names:
+            rows = self.db.execute(f"SELECT COUNT(*) FROM `{name}`").fetchone()[0]
+            self.db.execute("INSERT INTO temp._information_schema_tables VALUES (?, ?, 'BASE TABLE', 'InnoDB', ?, ?, 0)",
+                            (self.database, name, rows, rows * 100))
+
+    def cursor(self, cursor_class=None):
+        return StandInCursor(self)
+
+    def escape(self, value):
+        """A SQL literal SQLite reads back as the same value; newlines become char(10) so statements stay one line."""
+        if value is None:
+            return "NULL"
+        if isinstance(value, bool):
+            return str(int(value))
+        if isinstance(value, (int, float)):
+            return repr(value)
+        if isinstance(value, (bytes, bytearray)):
+            return "X'" + bytes(value).hex() + "'"
+        text = str(value).replace("'", "''").replace("\r", "' || char(13) || '").replace("\n", "' || char(10) || '")
+        return "'" + text + "'"
+
+    def commit(self):
+        self.db.commit()
+
+    def rollback(self):
+        self.db.rollback()
+
+    def begin(self):
+        self.cursor().execute("BEGIN")
+
+    def ping(self, reconnect=False):
+        return True
+
+    def close(self):
+        if self.open:
+            self.open = False
+            self.db.close()
+
+class MySQLStandIn:
+    """Replaces pymysql.connect with SQLite-backed connections for as long as it is installed.
+
+    Each database is a SQLite file under directory. The connections answer the statements the copy, validation and
+    export paths issue, but model no server-side cost (network round trips, InnoDB), so timings taken against the
+    stand-in measure this package's own work.
+    """
+
+    def __init__(self, directory=None):
+        self.directory = directory or tempfile.mkdtemp(prefix="mysql-standin-")
+        self._original = None
+
+    def connect(self, host=None, port=None, user=None, password=None, database=None, **kwargs):
+        return StandInConnection(self.directory, database)
+
+    def install(self):
+        self._original = pymysql.connect
+        pymysql.connect = self.connect
+        return self
+
+    def uninstall(self):
+        if self._original is not None:
+            pymysql.connect = self._original
+            self._original = None
+
+    def __enter__(self):
+        return self.install()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.uninstall()
+
+def _crc_of_file(path, block_size=1024 * 1024):
+    checksum = google_crc32c.Checksum()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            checksum.update(block)
+    return base64.b64encode(checksum.digest()).decode("ascii")
+
+class StandInBlob:
+    def __init__(self, bucket, name, chunk_size=None):
+        self.bucket = bucket
+        self.name = name
+        self.chunk_size = chunk_size
+        self.size = None
+        self.crc32c = None
+        self.generation = None
+
+    @property
+    def _path(self):
+        return os.path.join(self.bucket.directory, self.name.replace("/", "%2F"))
+
+    def _finish(self):
+        self.size = os.path.getsize(self._path)
+        self.crc32c, self.generation = self.bucket.client.record(self._path)
+
+    def upload_from_filename(self, filename, checksum=None, **kwargs):
+        with open(filename, "rb") as f:
+            self.upload_from_file(f, checksum=checksum)
+
+    def upload_from_file(self, file_obj, size=None, checksum=None, **kwargs):
+        with open(self._path + ".tmp", "wb") as out:
+            remaining = size
+            while remaining is None or remaining > 0:
+                block = file_obj.read(1024 * 1024 if remaining is None else min(remaining, 1024 * 1024))
+                if not block:
+                    break
+                out.write(block)
+                if remaining is not None:
+                    remaining -= len(block)
+        os.replace(self._path + ".tmp", self._path)
+        self._finish()
+
+    def compose(self, sources, **kwargs):
+        with open(self._path + ".tmp", "wb") as out:
+            for source in sources:
+                with open(source._path, "rb") as f:
+                    for block in iter(lambda: f.read(1024 * 1024), b""):
+                        out.write(block)
+        os.replace(self._path + ".tmp", self._path)
+        self._finish()
+
+    def reload(self, **kwargs):
+        blob = self.bucket.get_blob(self.name)
+        if blob is None:
+            raise FileNotFoundError(self.name)
+        self.size, self.crc32c, self.generation = blob.size, blob.crc32c, blob.generation
+
+    def download_as_bytes(self, start=None, end=None, generation=None, checksum=None, **kwargs):
+        with open(self._path, "rb") as f:
+            f.seek(start or 0)
+            return f.read(None if end is None else end - (start or 0) + 1)
+
+    def delete(self, **kwargs):
+        os.remove(self._path)
+        self.bucket.client.forget(self._path)
+
+class StandInBucket:
+    def __init__(self, client, name):
+        self.client = client
+        self.name = name
+        self.directory = os.path.join(client.directory, name)
+        os.makedirs(self.directory, exist_ok=True)
+
+    def blob(self, name, chunk_size=None):
+        return StandInBlob(self, name, chunk_size)
+
+    def get_blob(self, name):
+        blob = StandInBlob(self, name)
+        if not os.path.exists(blob._path):
+            return None
+        blob.size = os.path.getsize(blob._path)
+        blob.crc32c, blob.generation = self.client.metadata(blob._path)
+        return blob
+
+class StorageStandIn:
+    """A google.cloud.storage.Client look-alike for the calls core/gcs_transfer.py makes, storing objects as local files."""
+
+    def __init__(self, directory=None):
+        self.directory = directory or tempfile.mkdtemp(prefix="gcs-standin-")
+        self._generation = 0
+        self._metadata = {}
+        self._lock = threading.Lock()
+
+    def bucket(self, name):
+        return StandInBucket(self, name)
+
+    def record(self, path):
+        """Checksums a newly written object and gives it a new generation."""
+        crc, mtime = _crc_of_file(path), os.path.getmtime(path)
+        with self._lock:
+            self._generation += 1
+            self._metadata[path] = (mtime, crc, self._generation)
+            return crc, self._generation
+
+    def metadata(self, path):
+        with self._lock:
+            cached = self._metadata.get(path)
+        if cached is None or cached[0] != os.path.getmtime(path):
+            return self.record(path)
+        return cached[1], cached[2]
+
+    def forget(self, path):
+        with self._lock:
+            self._metadata.pop(path, None)
@@ -2,12 +2,160 @@ import pymysql
 from google.cloud import sql_admin_v1, storage, monitoring_v3, logging_v2
 from google.oauth2 import service_account
 from google.protobuf.timestamp_pb2 import Timestamp
+from autogen_migration.core.gcs_transfer import upload_file, download_file, DEFAULT_PART_SIZE, DEFAULT_MAX_WORKERS
+from autogen_migration.core.instrumentation import instrument_client, record_mysql_checkout
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
 import datetime
+import contextlib
+import threading
+import logging
+import atexit
+import time
+import os
+
+logger = logging.getLogger(__name__)
 
 def get_mysql_connection(host, port, user, password, db):
     """Establishes a connection to a MySQL database."""
     return pymysql.connect(host=host, port=int(port), user=user, password=password, database=db)
 
+class MySQLConnectionPool:
+    """Keeps reusable connections to one MySQL endpoint so callers skip the TCP/TLS/auth handshake."""
+
+    def __init__(self, host, port, user, password, db, max_size=8, idle_timeout=300, health_check_interval=0, checkout_timeout=60):
+        self.host, self.port, self.user, self.password, self.db = host, int(port), user, password, db
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.health_check_interval = health_check_interval
+        self.checkout_timeout = checkout_timeout
+        self._idle = []  # (connection, last_used) pairs, most recently returned last
+        self._size = 0
+        self._condition = threading.Condition()
+
+    def _discard(self, conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def _evict_idle(self, now):
+        expired = [entry for entry in self._idle if now - entry[1] > self.idle_timeout]
+        if expired:
+            self._idle = [entry for entry in self._idle if now - entry[1] <= self.idle_timeout]
+            self._size -= len(expired)
+            for conn, _ in expired:
+                self._discard(conn)
+
+    def _borrow(self):
+        deadline = time.monotonic() + self.checkout_timeout
+        with self._condition:
+            while True:
+                now = time.monotonic()
+                self._evict_idle(now)
+                if self._idle:
+                    conn, last_used = self._idle.pop()
+                    break
+                if self._size < self.max_size:
+                    self._size += 1
+                    conn, last_used = None, None
+                    break
+                if now >= deadline:
+                    raise TimeoutError(f"Timed out waiting for a MySQL connection to {self.host}:{self.port}")
+                self._condition.wait(timeout=deadline - now)
+        try:
+            if conn is not None and time.monotonic() - last_used >= self.health_check_interval:
+                try:
+                    conn.ping(reconnect=False)
+                except Exception:
+                    logger.info(f"Discarding stale pooled connection to {self.host}:{self.port}")
+                    self._discard(conn)
+                    conn = None
+            if conn is None:
+                conn = get_mysql_connection(self.host, self.port, self.user, self.password, self.db)
+            return conn
+        except Exception:
+            self._release_slot()
+            raise
+
+    def _release_slot(self):
+        with self._condition:
+            self._size -= 1
+            self._condition.notify()
+
+    def _return(self, conn, broken):
+        if not broken:
+            try:
+                # Ends any open transaction so the next borrower never sees a stale REPEATABLE READ snapshot.
+                conn.rollback()
+            except Exception:
+                broken = True
+        if broken:
+            self._discard(conn)
+            self._release_slot()
+            return
+        with self._condition:
+            self._idle.append((conn, time.monotonic()))
+            self._condition.notify()
+
+    @contextlib.contextmanager
+    def connection(self):
+        """Checks a connection out of the pool for the duration of a with-block."""
+        started = time.monotonic()
+        conn = self._borrow()
+        borrowed = time.monotonic()
+        broken = False
+        try:
+            yield conn
+        except pymysql.err.OperationalError:
+            broken = True
+            raise
+        finally:
+            self._return(conn, broken)
+            record_mysql_checkout(f"{self.host}:{self.port}", borrowed - started, time.monotonic() - borrowed, broken)
+
+    def widen(self, max_size):
+        """Raises max_size for a caller running more workers than the pool was sized for, waking blocked borrowers."""
+        with self._condition:
+            if max_size > self.max_size:
+                self.max_size = max_size
+                self._condition.notify_all()
+
+    def close(self):
+        """Closes every idle connection."""
+        with self._condition:
+            idle, self._idle = self._idle, []
+            self._size -= len(idle)
+        for conn, _ in idle:
+            self._discard(conn)
+
+_mysql_pools = {}
+_mysql_pools_lock = threading.Lock()
+
+def get_mysql_pool(host, port, user, password, db, **pool_options):
+    """Returns the process-wide connection pool for a MySQL endpoint, creating it on first use."""
+    key = (host, int(port), user, db)
+    with _mysql_pools_lock:
+        pool = _mysql_pools.get(key)
+        if pool is None:
+            pool = _mysql_pools[key] = MySQLConnectionPool(host, port, user, password, db, **pool_options)
+        elif pool_options.get("max_size", 0) > pool.max_size:
+            pool.widen(pool_options["max_size"])
+        return pool
+
+def mysql_connection(host, port, user, password, db):
+    """Checks out a pooled MySQL connection; use as `with mysql_connection(**db_config) as conn:`."""
+    return get_mysql_pool(host, port, user, password, db).connection()
+
+def close_mysql_pools():
+    """Closes the idle connections of every MySQL pool."""
+    with _mysql_pools_lock:
+        pools = list(_mysql_pools.values())
+    for pool in pools:
+        pool.close()
+
+atexit.register(close_mysql_pools)
+
 def get_gcp_credentials(key_path):
     """Loads GCP service account credentials."""
     return service_account.Credentials.from_service_account_file(key_path)
@@ -28,6 +176,75 @@ def get_logging_client(credentials):
     """Returns a Cloud Logging client."""
     return logging_v2.LoggingServiceV2Client(credentials=credentials)
 
+def get_dms_client(credentials):
+    """Returns a Database Migration Service client."""
+    # Imported here so modules that only need MySQL or GCS do not depend on the DMS client library.
+    from google.cloud import clouddms_v1
+    return clouddms_v1.DataMigrationServiceClient(credentials=credentials)
+
+_CLIENT_FACTORIES = {
+    "sql_admin": get_sql_admin_client,
+    "storage": get_storage_client,
+    "monitoring": get_monitoring_client,
+    "logging": get_logging_client,
+    "dms": get_dms_client,
+}
+_shared_credentials = {}
+_shared_clients = {}
+_gcp_lock = threading.Lock()
+
+def get_shared_gcp_credentials(key_path):
+    """Returns process-wide credentials for a service account key file, loading it only once."""
+    credentials = _shared_credentials.get(key_path)
+    if credentials is None:
+        with _gcp_lock:
+            credentials = _shared_credentials.get(key_path)
+            if credentials is None:
+                credentials = _shared_credentials[key_path] = get_gcp_credentials(key_path)
+    return credentials
+
+def get_shared_client(kind, credentials):
+    """Returns the process-wide client of a kind ("sql_admin", "storage", "monitoring", "logging", "dms"), built on first use."""
+    # Keyed on the credentials object itself; the entry keeps a reference so the id cannot be reused.
+    key = (kind, id(credentials))
+    entry = _shared_clients.get(key)
+    if entry is None:
+        with _gcp_lock:
+            entry = _shared_clients.get(key)
+            if entry is None:
+                # API calls made through shared clients are counted and timed per service (core/instrumentation.py).
+                entry = _shared_clients[key] = (credentials, instrument_client(kind, _CLIENT_FACTORIES[kind](credentials)))
+    return entry[1]
+
+class GCPClientsMixin:
+    """Gives an agent lazily-created GCP credentials and clients shared with every other agent in the process."""
+
+    gcp_key_path = None
+
+    @property
+    def gcp_credentials(self):
+        return get_shared_gcp_credentials(self.gcp_key_path)
+
+    @property
+    def sql_client(self):
+        return get_shared_client("sql_admin", self.gcp_credentials)
+
+    @property
+    def storage_client(self):
+        return get_shared_client("storage", self.gcp_credentials)
+
+    @property
+    def monitoring_client(self):
+        return get_shared_client("monitoring", self.gcp_credentials)
+
+    @property
+    def logging_client(self):
+        return get_shared_client("logging", self.gcp_credentials)
+
+    @property
+    def dms_client(self):
+        return get_shared_client("dms", self.gcp_credentials)
+
 def export_mysql_schema(host, port, user, password, db_name, output_file):
     """Exports MySQL schema using mysqldump."""
     cmd = f"mysqldump -h {host} -P {port} -u {user} -p'{password}' --no-data {db_name} > {output_file}"
@@ -46,30 +263,39 @@ def import_mysql_dump(host, port, user, password, db_name, input_file):
     os.system(cmd)
     print(f"Data imported from {input_file}")
 
-def upload_to_gcs(bucket_name, source_file_name, destination_blob_name, credentials):
-    """Uploads a file to Google Cloud Storage."""
-    storage_client = get_storage_client(credentials)
-    bucket = storage_client.bucket(bucket_name)
-    blob = bucket.blob(destination_blob_name)
-    blob.upload_from_filename(source_file_name)
-    print(f"File {source_file_name} uploaded to gs://{bucket_name}/{destination_blob_name}")
-
-def download_from_gcs(bucket_name, source_blob_name, destination_file_name, credentials):
-    """Downloads a file from Google Cloud Storage."""
-    storage_client = get_storage_client(credentials)
-    bucket = storage_client.bucket(bucket_name)
-    blob = bucket.blob(source_blob_name)
-    blob.download_to_filename(destination_file_name)
-    print(f"File gs://{bucket_name}/{source_blob_name} downloaded to {destination_file_name}")
-
-def get_cloud_sql_metrics(project_id, instance_id, metric_type, days=7, credentials=None):
-    """Fetches Cloud SQL metrics from Cloud Monitoring."""
-    client = get_monitoring_client(credentials)
+def upload_to_gcs(bucket_name, source_file_name, destination_blob_name, credentials, part_size=DEFAULT_PART_SIZE, max_workers=DEFAULT_MAX_WORKERS):
+    """Uploads a file to Google Cloud Storage as parallel slices composed into one object, resuming a partial upload."""
+    storage_client = get_shared_client("storage", credentials)
+    result = upload_file(storage_client, bucket_name, source_file_name, destination_blob_name, part_size, max_workers)
+    print(f"File {source_file_name} uploaded to gs://{bucket_name}/{destination_blob_name} ({result['mb_per_second']} MB/s)")
+    return result
+
+def download_from_gcs(bucket_name, source_blob_name, destination_file_name, credentials, part_size=DEFAULT_PART_SIZE, max_workers=DEFAULT_MAX_WORKERS):
+    """Downloads a file from Google Cloud Storage with parallel ranged reads, resuming a partial download."""
+    storage_client = get_shared_client("storage", credentials)
+    result = download_file(storage_client, bucket_name, source_blob_name, destination_file_name, part_size, max_workers)
+    print(f"File gs://{bucket_name}/{source_blob_name} downloaded to {destination_file_name} ({result['mb_per_second']} MB/s)")
+    return result
+
+def get_cloud_sql_metrics(project_id, instance_id, metric_type, days=7, credentials=None, cache=None):
+    """Fetches a Cloud SQL metric from Cloud Monitoring as columnar (timestamps, values) NumPy arrays sorted by time.
+
+    With a MetricsCache only the part of the window that is not cached yet is requested from the API.
+    """
+    end = int(datetime.datetime.now().timestamp())
+    start = int(end - days * 86400)
+    if cache is not None:
+        return cache.get(
+            (project_id, instance_id, metric_type), start, end,
+            lambda fetch_start, fetch_end: fetch_cloud_sql_metrics(project_id, instance_id, metric_type, fetch_start, fetch_end, credentials),
+        )
+    return fetch_cloud_sql_metrics(project_id, instance_id, metric_type, start, end, credentials)
+
+def fetch_cloud_sql_metrics(project_id, instance_id, metric_type, start, end, credentials=None):
+    """Reads the points of a Cloud SQL metric between two epoch-second timestamps."""
+    client = get_shared_client("monitoring", credentials)
     project_name = f"projects/{project_id}"
-    interval = monitoring_v3.TimeInterval(
-        end_time=Timestamp(seconds=int(datetime.datetime.now().timestamp())),
-        start_time=Timestamp(seconds=int((datetime.datetime.now() - datetime.timedelta(days=days)).timestamp())),
-    )
+    interval = monitoring_v3.TimeInterval(end_time=Timestamp(seconds=int(end)), start_time=Timestamp(seconds=int(start)))
     query = f'metric.type = "{metric_type}" AND resource.type = "cloudsql_database" AND resource.labels.database_id = "{instance_id}"'
     results = client.list_time_series(
         name=project_name,
@@ -77,25 +303,88 @@ def get_cloud_sql_metrics(project_id, instance_id, metric_type, days=7, credenti
         interval=interval,
         view=monitoring_v3.ListTimeSeriesRequest.TimeSeriesView.FULL,
     )
-    data =
+    timestamps, values = [], []
     for series in results:
+        is_double = series.value_type == monitoring_v3.MetricDescriptor.ValueType.DOUBLE
         for point in series.points:
-            data.append({
-                "timestamp": point.interval.end_time.seconds,
-                "value": point.value.double_value if point.value.value_type == monitoring_v3.TypedValue.ValueType.DOUBLE else point.value.int64_value
-            })
-    return data
+            timestamps.append(point.interval.end_time.seconds)
+            values.append(point.value.double_value if is_double else point.value.int64_value)
+    timestamps = np.array(timestamps, dtype=np.int64)
+    values = np.array(values, dtype=np.float64)
+    order = np.argsort(timestamps, kind="stable")
+    return timestamps[order], values[order]
 
-def get_cloud_sql_logs(project_id, instance_id, log_filter, hours=1, credentials=None):
-    """Fetches Cloud SQL logs from Cloud Logging."""
-    client = get_logging_client(credentials)
+def fetch_aligned_cloud_sql_metric(project_id, instance_id, metric_type, aligner, start, end, alignment_period=60, credentials=None):
+    """Reads one metric aligned and reduced by Cloud Monitoring: one point per alignment period, averaged across series."""
+    client = get_shared_client("monitoring", credentials)
+    request = {
+        "name": f"projects/{project_id}",
+        "filter": f'metric.type = "{metric_type}" AND resource.type = "cloudsql_database" AND resource.labels.database_id = "{instance_id}"',
+        "interval": monitoring_v3.TimeInterval(end_time=Timestamp(seconds=int(end)), start_time=Timestamp(seconds=int(start))),
+        "aggregation": monitoring_v3.Aggregation(
+            alignment_period={"seconds": int(alignment_period)},
+            per_series_aligner=monitoring_v3.Aggregation.Aligner[aligner],
+            cross_series_reducer=monitoring_v3.Aggregation.Reducer.REDUCE_MEAN,
+        ),
+        "view": monitoring_v3.ListTimeSeriesRequest.TimeSeriesView.FULL,
+    }
+    timestamps, values = [], []
+    for series in client.list_time_series(request=request):
+        is_double = series.value_type == monitoring_v3.MetricDescriptor.ValueType.DOUBLE
+        for point in series.points:
+            timestamps.append(point.interval.end_time.seconds)
+            values.append(point.value.double_value if is_double else point.value.int64_value)
+    return np.array(timestamps, dtype=np.int64), np.array(values, dtype=np.float64)
+
+def get_cloud_sql_metric_frame(project_id, instance_id, metrics, days=1, alignment_period=60, credentials=None, max_workers=8):
+    """Fetches several metrics concurrently with server-side alignment and returns them on one time grid.
+
+    metrics maps a column name to (metric_type, [aligners]), e.g. {"cpu": (".../cpu/utilization", ["ALIGN_MEAN"])}.
+    Percentile aligners (ALIGN_PERCENTILE_99 etc.) apply to distribution-valued metrics; gauges use ALIGN_MEAN or
+    ALIGN_MAX. Returns {"timestamps": grid, "series": {name: {aligner: values}}}, NaN where a period has no point.
+    """
+    end = int(datetime.datetime.now().timestamp())
+    start = int(end - days * 86400)
+    requests = [(name, metric_type, aligner) for name, (metric_type, aligners) in metrics.items() for aligner in aligners]
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="metrics") as executor:
+        results = list(executor.map(
+            lambda r: fetch_aligned_cloud_sql_metric(project_id, instance_id, r[1], r[2], start, end, alignment_period, credentials),
+            requests,
+        ))
+    grid = np.unique(np.concatenate([timestamps for timestamps, _ in results])) if results else np.empty(0, dtype=np.int64)
+    series = {name: {} for name in metrics}
+    for (name, _, aligner), (timestamps, values) in zip(requests, results):
+        column = np.full(len(grid), np.nan)
+        column[np.searchsorted(grid, timestamps)] = values
+        series[name][aligner] = column
+    return {"timestamps": grid, "series": series}
+
+def summarize_metric_frame(frame, aligner=None):
+    """Mean, p50/p95/p99 and max over the window of each metric's aligned values (its first aligner by default)."""
+    summary = {}
+    for name, columns in frame["series"].items():
+        values = columns.get(aligner) if aligner else next(iter(columns.values()), None)
+        if values is None or not np.any(~np.isnan(values)):
+            summary[name] = None
+            continue
+        p50, p95, p99 = np.nanpercentile(values, [50, 95, 99])
+        summary[name] = {"mean": float(np.nanmean(values)), "p50": float(p50), "p95": float(p95), "p99": float(p99),
+                         "max": float(np.nanmax(values))}
+    return summary
+
+def iter_cloud_sql_logs(project_id, instance_id, log_filter, hours=1, credentials=None, page_size=1000):
+    """Yields Cloud SQL log entries from Cloud Logging, fetching one page at a time as the caller consumes them."""
+    client = get_shared_client("logging", credentials)
     resource_names = [f"projects/{project_id}"]
     now = datetime.datetime.utcnow()
     start_time = (now - datetime.timedelta(hours=hours)).isoformat("T") + "Z"
     end_time = now.isoformat("T") + "Z"
     filter_string = f'resource.type="cloudsql_database" AND resource.labels.database_id="{instance_id}" AND timestamp>="{start_time}" AND timestamp<="{end_time}" {log_filter}'
-    entries = client.list_log_entries(resource_names=resource_names, filter=filter_string)
-    logs =
-    for entry in entries:
-        logs.append(entry.json_payload.copy() if entry.json_payload else entry.text_payload)
-    return logs
+    yield from client.list_log_entries(resource_names=resource_names, filter=filter_string, page_size=page_size)
+
+def get_cloud_sql_logs(project_id, instance_id, log_filter, hours=1, credentials=None):
+    """Fetches Cloud SQL logs from Cloud Logging."""
+    return [
+        entry.json_payload.copy() if entry.json_payload else entry.text_payload
+        for entry in iter_cloud_sql_logs(project_id, instance_id, log_filter, hours, credentials)
+    ]
@@ -0,0 +1,82 @@
+from autogen_migration.core.benchmark import (DEFAULT_ROWS, DEFAULT_CHUNK_ROWS, DEFAULT_WORKERS, DEFAULT_NULL_RATIO, DEFAULT_SKEW,
+                                              DEFAULT_WIDE_BYTES, DEFAULT_SCHEMA_TABLES, DEFAULT_PART_SIZE, DEFAULT_SEED,
+                                              DEFAULT_SCENARIOS, run_benchmarks, environment, format_report)
+from autogen_migration.core.standins import MySQLStandIn, StorageStandIn
+from autogen_migration.core.instrumentation import REGISTRY
+import tempfile
+import argparse
+import logging
+import pymysql
+import json
+import os
+
+BENCH_DATABASES = {"source": "bench_source", "target": "bench_target", "import": "bench_import"}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the copy, validation, export/import, transfer and schema conversion paths")
+    parser.add_argument("--rows", type=int, default=DEFAULT_ROWS, help="Rows of synthetic employees data (e.g. 100000 to 100000000)")
+    parser.add_argument("--skew", type=float, default=DEFAULT_SKEW, help="Fraction of keys followed by a large gap")
+    parser.add_argument("--null-ratio", type=float, default=DEFAULT_NULL_RATIO, help="Probability of each nullable column being NULL")
+    parser.add_argument("--wide", action="store_true", help="Add TEXT columns of about --row-bytes per row")
+    parser.add_argument("--row-bytes", type=int, default=DEFAULT_WIDE_BYTES)
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED)
+    parser.add_argument("--chunk-rows", type=int, default=DEFAULT_CHUNK_ROWS)
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS)
+    parser.add_argument("--compression", choices=("none", "gzip", "zstd"), default="none", help="Compression of the sharded export")
+    parser.add_argument("--part-size", type=int, default=DEFAULT_PART_SIZE, help="Part size of the GCS transfers in bytes")
+    parser.add_argument("--schema-tables", type=int, default=DEFAULT_SCHEMA_TABLES, help="Tables in the synthetic schema dump")
+    parser.add_argument("--scenarios", default=",".join(DEFAULT_SCENARIOS), help="Comma-separated scenarios to run")
+    parser.add_argument("--mysql-host", default=os.getenv("BENCH_MYSQL_HOST"),
+                        help="Benchmark against this MySQL/MariaDB server instead of the in-process stand-in")
+    parser.add_argument("--mysql-port", type=int, default=int(os.getenv("BENCH_MYSQL_PORT", "3306")))
+    parser.add_argument("--mysql-user", default=os.getenv("BENCH_MYSQL_USER", "root"))
+    parser.add_argument("--mysql-password", default=os.getenv("BENCH_MYSQL_PASSWORD", ""))
+    parser.add_argument("--work-dir", help="Directory for stand-in databases, export chunks and transfer files (default: a temporary one)")
+    parser.add_argument("--output", help="Write the results as JSON to this file")
+    parser.add_argument("--compare", help="A previous --output file to compare the results with")
+    parser.add_argument("--log-level", default="WARNING")
+    args = parser.parse_args()
+    logging.basicConfig(level=args.log_level.upper(), format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix="migration-bench-")
+    os.makedirs(work_dir, exist_ok=True)
+    standin = None
+    if args.mysql_host:
+        backend = "mysql"
+        server = {"host": args.mysql_host, "port": args.mysql_port, "user": args.mysql_user, "password": args.mysql_password}
+        conn = pymysql.connect(**server)
+        with conn.cursor() as cursor:
+            for name in BENCH_DATABASES.values():
+                cursor.execute(f"CREATE DATABASE IF NOT EXISTS `{name}`")
+        conn.close()
+    else:
+        backend = "standin"
+        standin = MySQLStandIn(os.path.join(work_dir, "mysql")).install()
+        server = {"host": "standin", "port": 3306, "user": "bench", "password": ""}
+        os.makedirs(standin.directory, exist_ok=True)
+    databases = {role: {**server, "db": name} for role, name in BENCH_DATABASES.items()}
+    # The GCS scenarios always use the stand-in bucket: they measure the transfer code, not the network.
+    storage_client = StorageStandIn(os.path.join(work_dir, "gcs"))
+
+    shape = {"skew": args.skew, "wide": args.wide, "null_ratio": args.null_ratio, "row_bytes": args.row_bytes, "seed": args.seed}
+    params = {"rows": args.rows, "chunk_rows": args.chunk_rows, "workers": args.workers, "compression": args.compression,
+              "part_size": args.part_size, "schema_tables": args.schema_tables, **shape}
+    REGISTRY.keep_samples = True
+    try:
+        report = environment(backend, params)
+        report["results"] = run_benchmarks(databases, work_dir, storage_client, scenarios=args.scenarios.split(","),
+                                           rows=args.rows, chunk_rows=args.chunk_rows, workers=args.workers,
+                                           compression=args.compression, part_size=args.part_size,
+                                           schema_tables=args.schema_tables, **shape)
+    finally:
+        if standin is not None:
+            standin.uninstall()
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, "r") as f:
+            baseline = json.load(f)
+    print(format_report(report, baseline))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
@@ -1,34 +1,166 @@
 import os
-from google.cloud import secretmanager
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+_secret_client = None
+_secret_client_lock = threading.Lock()
+
+def get_secret_client():
+    """Returns the process-wide Secret Manager client, created on first use."""
+    global _secret_client
+    if _secret_client is None:
+        with _secret_client_lock:
+            if _secret_client is None:
+                from google.cloud import secretmanager
+                _secret_client = secretmanager.SecretManagerServiceClient()
+    return _secret_client
 
 def get_secret(secret_id, project_id):
     """Access secrets from Google Cloud Secret Manager."""
-    client = secretmanager.SecretManagerServiceClient()
     name = f"projects/{project_id}/secrets/{secret_id}/versions/latest"
-    response = client.access_secret_version(request={"name": name})
+    response = get_secret_client().access_secret_version(request={"name": name})
     return response.payload.data.decode("UTF-8")
 
+class SecretStore:
+    """Fetches secrets on first access and caches them in memory for ttl seconds.
+
+    backend is "gcp" (Secret Manager), "env" (secret "legacy-mysql-user" read from LEGACY_MYSQL_USER)
+    or "file" (one file per secret id under secrets_dir), so offline runs and tests never touch the network.
+    """
+
+    def __init__(self, project_id, backend="gcp", ttl=3600, secrets_dir="secrets"):
+        if backend not in ("gcp", "env", "file"):
+            raise ValueError(f"Unknown secrets backend: {backend}")
+        self.project_id = project_id
+        self.backend = backend
+        self.ttl = ttl
+        self.secrets_dir = secrets_dir
+        self._cache = {}
+        self._lock = threading.Lock()
+
+    def _fetch(self, secret_id):
+        if self.backend == "env":
+            env_name = secret_id.upper().replace("-", "_")
+            if env_name not in os.environ:
+                raise KeyError(f"Secret {secret_id} not set; export {env_name}")
+            return os.environ[env_name]
+        if self.backend == "file":
+            with open(os.path.join(self.secrets_dir, secret_id), "r") as f:
+                return f.read().strip()
+        return get_secret(secret_id, self.project_id)
+
+    def get(self, secret_id):
+        entry = self._cache.get(secret_id)
+        if entry is not None and time.monotonic() - entry[1] < self.ttl:
+            return entry[0]
+        value = self._fetch(secret_id)
+        with self._lock:
+            self._cache[secret_id] = (value, time.monotonic())
+        return value
+
+    def prefetch(self, secret_ids, max_workers=4):
+        """Fetches several secrets concurrently so startup pays one round-trip instead of one per secret."""
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            list(executor.map(self.get, secret_ids))
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
+
+class SecretProperty:
+    """Class attribute that resolves to a secret only when it is read."""
+
+    def __init__(self, secret_id):
+        self.secret_id = secret_id
+
+    def __get__(self, instance, owner):
+        return owner.SECRETS.get(self.secret_id)
+
+class LLMConfigProperty:
+    """LLM configuration whose API key is fetched only when the configuration is read."""
+
+    def __init__(self, model, secret_id, **extra):
+        self.model = model
+        self.secret_id = secret_id
+        self.extra = extra
+
+    def __get__(self, instance, owner):
+        return {"model": self.model, "api_key": owner.SECRETS.get(self.secret_id), **self.extra}
+
 class Config:
     PROJECT_ID = os.getenv("GCP_PROJECT_ID", "your-gcp-project-id")
     REGION = os.getenv("GCP_REGION", "us-central1")
     LEGACY_MYSQL_HOST = os.getenv("LEGACY_MYSQL_HOST", "your-legacy-mysql-ip")
     LEGACY_MYSQL_PORT = os.getenv("LEGACY_MYSQL_PORT", "3306")
     LEGACY_MYSQL_DB = os.getenv("LEGACY_MYSQL_DB", "legacy_employees_db")
+    # Comma-separated list of databases migrated by the table scheduler; defaults to LEGACY_MYSQL_DB alone
+    LEGACY_MYSQL_DBS = [db.strip() for db in os.getenv("LEGACY_MYSQL_DBS", LEGACY_MYSQL_DB).split(",") if db.strip()]
     CLOUD_SQL_INSTANCE_ID = os.getenv("CLOUD_SQL_INSTANCE_ID", "cloud-sql-employees-instance")
     CLOUD_SQL_DB_NAME = os.getenv("CLOUD_SQL_DB_NAME", "employees_db")
     CLOUD_SQL_MACHINE_TYPE = os.getenv("CLOUD_SQL_MACHINE_TYPE", "db-n1-standard-2") # 2 vCPU, 7.5 GiB
     CLOUD_SQL_STORAGE_GB = int(os.getenv("CLOUD_SQL_STORAGE_GB", "20"))
+    # Opt-in: sample the legacy workload and size tier, disk and InnoDB flags from it instead of the two settings above
+    CLOUD_SQL_AUTO_SIZE = os.getenv("CLOUD_SQL_AUTO_SIZE", "false").lower() == "true"
+    SIZING_SAMPLE_SECONDS = int(os.getenv("SIZING_SAMPLE_SECONDS", "60")) # interval between the source status snapshots
     VPC_NETWORK_NAME = os.getenv("VPC_NETWORK_NAME", "default")
+    CLOUD_SQL_HOST = os.getenv("CLOUD_SQL_HOST", "your-cloud-sql-private-ip")
+    CLOUD_SQL_USER = os.getenv("CLOUD_SQL_USER", "root")
+    GCS_BUCKET_NAME = os.getenv("GCS_BUCKET_NAME", "your-migration-bucket")
+    DMS_SOURCE_PROFILE_ID = os.getenv("DMS_SOURCE_PROFILE_ID", "legacy-mysql-profile")
+    DMS_MIGRATION_JOB_ID = os.getenv("DMS_MIGRATION_JOB_ID", "legacy-to-cloudsql-job")
+    DUMP_COMPRESSION = os.getenv("DUMP_COMPRESSION", "gzip") # "gzip", "zstd" (needs the zstandard package) or "none"
+    GCS_PART_SIZE_MB = int(os.getenv("GCS_PART_SIZE_MB", "16")) # resumable upload part and ranged read size
+    SHARDED_EXPORT_DIR = os.getenv("SHARDED_EXPORT_DIR", "dumps") # per-table chunk exports go to <dir>/<database>
+    SHARDED_EXPORT_WORKERS = int(os.getenv("SHARDED_EXPORT_WORKERS", "4")) # snapshot sessions exporting, and chunks loaded, at once
+    SHARDED_EXPORT_CHUNK_ROWS = int(os.getenv("SHARDED_EXPORT_CHUNK_ROWS", "100000")) # rows per chunk file of a large table
+    PIPELINE_MAX_WORKERS = int(os.getenv("PIPELINE_MAX_WORKERS", "4"))
+    SCHEDULER_MAX_WORKERS = int(os.getenv("SCHEDULER_MAX_WORKERS", "8"))
+    SCHEDULER_SOURCE_CONCURRENCY = int(os.getenv("SCHEDULER_SOURCE_CONCURRENCY", "4")) # concurrent table stages per source server
+    SCHEDULER_TARGET_CONCURRENCY = int(os.getenv("SCHEDULER_TARGET_CONCURRENCY", "4")) # concurrent table stages per target server
+    SCHEMA_CONVERSION_WORKERS = int(os.getenv("SCHEMA_CONVERSION_WORKERS", str(os.cpu_count() or 1))) # processes running the DDL rules
+    # Create tables with only their primary keys and build secondary indexes, foreign keys and triggers after the data load
+    DEFER_SECONDARY_INDEXES = os.getenv("DEFER_SECONDARY_INDEXES", "false").lower() == "true"
+    INDEX_BUILD_WORKERS = int(os.getenv("INDEX_BUILD_WORKERS", "4")) # tables whose deferred indexes are built at once
+    # Comma-separated name=value session variables set while deferred indexes are built
+    INDEX_BUILD_SESSION_SETTINGS = {
+        name.strip(): int(value) if value.strip().isdigit() else value.strip()
+        for name, value in (item.split("=", 1) for item in os.getenv("INDEX_BUILD_SESSION_SETTINGS", "foreign_key_checks=0,unique_checks=0").split(",") if item.strip())
+    }
+    MIGRATION_JOURNAL_PATH = os.getenv("MIGRATION_JOURNAL_PATH", "logs/migration_journal.sqlite")
+    MIGRATION_LOG_PATH = os.getenv("MIGRATION_LOG_PATH", "logs/migration.log") # JSON lines: log records and tool/API/LLM events
+    METRICS_PATH = os.getenv("METRICS_PATH", "logs/metrics.prom") # Prometheus text dump written at the end of a run
+    METRICS_CACHE_DIR = os.getenv("METRICS_CACHE_DIR", "cache/metrics")
+    LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH", "cache/llm_cache.sqlite")
+    LLM_CACHE_MODE = os.getenv("LLM_CACHE_MODE", "normal") # "normal", "deterministic" (replay, temperature 0) or "off"
+    LLM_CACHE_TTL = int(os.getenv("LLM_CACHE_TTL", str(7 * 86400)))
+    LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "10000"))
+    ARTIFACT_DIR = os.getenv("ARTIFACT_DIR", "artifacts")
+    TOOL_RESULT_TOKEN_BUDGET = int(os.getenv("TOOL_RESULT_TOKEN_BUDGET", "1000")) # max tokens a tool result adds to the GroupChat
+    TRANSCRIPT_MAX_MESSAGES = int(os.getenv("TRANSCRIPT_MAX_MESSAGES", "20")) # recent messages sent to the model besides the task
+    TRANSCRIPT_MAX_TOKENS_PER_MESSAGE = int(os.getenv("TRANSCRIPT_MAX_TOKENS_PER_MESSAGE", "1500"))
 
-    # Retrieve sensitive credentials from Secret Manager
-    LEGACY_MYSQL_USER = get_secret("legacy-mysql-user", PROJECT_ID)
-    LEGACY_MYSQL_PASSWORD = get_secret("legacy-mysql-password", PROJECT_ID)
-    CLOUD_SQL_ROOT_PASSWORD = get_secret("cloud-sql-root-password", PROJECT_ID)
+    # Sensitive credentials are resolved lazily from the secrets backend (Secret Manager by default)
+    SECRETS = SecretStore(
+        PROJECT_ID,
+        backend=os.getenv("SECRETS_BACKEND", "gcp"),
+        ttl=int(os.getenv("SECRETS_CACHE_TTL", "3600")),
+        secrets_dir=os.getenv("SECRETS_DIR", "secrets"),
+    )
+    LEGACY_MYSQL_USER = SecretProperty("legacy-mysql-user")
+    LEGACY_MYSQL_PASSWORD = SecretProperty("legacy-mysql-password")
+    CLOUD_SQL_ROOT_PASSWORD = SecretProperty("cloud-sql-root-password")
     GCP_SERVICE_ACCOUNT_KEY_PATH = os.getenv("GCP_SERVICE_ACCOUNT_KEY_PATH", "/path/to/your/key.json")
 
     # LLM Configuration
-    LLM_CONFIG = {
-        "model": "gemini-1.5-pro", # Or another suitable model
-        "api_key": get_secret("gemini-api-key", PROJECT_ID),
-        # "base_url": "..." # If using a self-hosted LLM or specific endpoint
-    }
+    LLM_CONFIG = LLMConfigProperty(
+        "gemini-1.5-pro", # Or another suitable model
+        "gemini-api-key",
+        # base_url="..." # If using a self-hosted LLM or specific endpoint
+    )
+
+    @classmethod
+    def prefetch_secrets(cls):
+        """Loads every secret Config refers to in parallel."""
+        secret_ids = [attr.secret_id for attr in vars(cls).values() if isinstance(attr, (SecretProperty, LLMConfigProperty))]
+        cls.SECRETS.prefetch(secret_ids)
@@ -0,0 +1,190 @@
+import numpy as np
+import logging
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_WINDOW = 30 # points in the rolling baseline (30 minutes at 1-minute resolution)
+DEFAULT_Z_THRESHOLD = 4.0
+DEFAULT_EWMA_ALPHA = 0.1
+DEFAULT_SEASON_PERIOD = 1440 # one day of 1-minute points
+DEFAULT_CHANGE_THRESHOLD = 8.0
+
+def align_series(series, step=60):
+    """Puts {name: (timestamps, values)} on one time grid of step seconds; returns (grid, names, matrix).
+
+    matrix has one row per metric and NaN where a metric has no point in a bucket, so every detector below works on
+    all metrics at once along axis 1.
+    """
+    names = list(series)
+    non_empty = [ts for ts, _ in series.values() if len(ts)]
+    if not non_empty:
+        return np.empty(0, dtype=np.int64), names, np.empty((len(names), 0))
+    start = min(int(ts.min()) for ts in non_empty) // step * step
+    end = max(int(ts.max()) for ts in non_empty) // step * step
+    grid = np.arange(start, end + step, step, dtype=np.int64)
+    matrix = np.full((len(names), len(grid)), np.nan)
+    for row, name in enumerate(names):
+        timestamps, values = series[name]
+        if len(timestamps):
+            # Later points in the same bucket overwrite earlier ones.
+            matrix[row, (np.asarray(timestamps, dtype=np.int64) - start) // step] = values
+    return grid, names, matrix
+
+def forward_fill(matrix):
+    """Replaces NaN gaps with the last seen value of the row (leading NaNs stay NaN)."""
+    idx = np.where(np.isnan(matrix), 0, np.arange(matrix.shape[1]))
+    np.maximum.accumulate(idx, axis=1, out=idx)
+    return matrix[np.arange(matrix.shape[0])[:, None], idx]
+
+def rolling_mean_std(matrix, window):
+    """Mean and standard deviation of the window points before each point (NaN until a full window exists)."""
+    n = matrix.shape[1]
+    mean = np.full(matrix.shape, np.nan)
+    std = np.full(matrix.shape, np.nan)
+    if n <= window:
+        return mean, std
+    zero = np.zeros((matrix.shape[0], 1))
+    csum = np.concatenate([zero, np.cumsum(matrix, axis=1)], axis=1)
+    csq = np.concatenate([zero, np.cumsum(matrix * matrix, axis=1)], axis=1)
+    # Window for point t covers t-window .. t-1, so a spike never inflates its own baseline.
+    total = csum[:, window:n] - csum[:, :n - window]
+    total_sq = csq[:, window:n] - csq[:, :n - window]
+    mean[:, window:] = total / window
+    std[:, window:] = np.sqrt(np.maximum(total_sq / window - mean[:, window:] ** 2, 0.0))
+    return mean, std
+
+def ewma(matrix, alpha):
+    """Exponentially weighted moving average along axis 1, evaluated in closed form block by block.
+
+    Within a block y_t = (1-a)^(t+1) * (y_-1 + a * cumsum(x_k / (1-a)^(k+1))); blocks are short enough that
+    (1-a)^-k stays far from overflow, so the result matches the recursive definition.
+    """
+    decay = 1.0 - alpha
+    if decay <= 0:
+        return matrix.astype(float)
+    out = np.empty(matrix.shape)
+    if matrix.shape[1] == 0:
+        return out
+    block = max(1, int(300 / -np.log(decay)))
+    previous = matrix[:, 0].astype(float)
+    for start in range(0, matrix.shape[1], block):
+        chunk = matrix[:, start:start + block]
+        powers = decay ** np.arange(1, chunk.shape[1] + 1)
+        out[:, start:start + block] = powers * (previous[:, None] + alpha * np.cumsum(chunk / powers, axis=1))
+        previous = out[:, start + chunk.shape[1] - 1]
+    return out
+
+def seasonal_baseline(matrix, period):
+    """Mean of the same phase in all earlier seasons (e.g. the same minute on previous days); NaN for the first season."""
+    rows, n = matrix.shape
+    seasons = -(-n // period)
+    padded = np.full((rows, seasons * period), np.nan)
+    padded[:, :n] = matrix
+    folded = padded.reshape(rows, seasons, period)
+    present = ~np.isnan(folded)
+    sums = np.cumsum(np.where(present, folded, 0.0), axis=1)
+    counts = np.cumsum(present, axis=1)
+    baseline = np.full(folded.shape, np.nan)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        baseline[:, 1:] = sums[:, :-1] / counts[:, :-1]
+    return baseline.reshape(rows, -1)[:, :n]
+
+def noise_level(matrix):
+    """Robust per-row noise estimate from the median absolute first difference, unaffected by level shifts."""
+    sigma = np.median(np.abs(np.diff(matrix, axis=1)), axis=1, keepdims=True) / 0.6745 / np.sqrt(2)
+    return np.where(sigma > 0, sigma, np.std(matrix, axis=1, keepdims=True) + 1e-12)
+
+def change_points(matrix):
+    """Most likely single mean shift per row: (index, score), where score is the shift in standard errors.
+
+    Uses the cumulative-sum form of the two-sample statistic, so every split point of every row is scored at once.
+    """
+    rows, n = matrix.shape
+    if n < 4:
+        return np.zeros(rows, dtype=int), np.zeros(rows)
+    csum = np.cumsum(matrix, axis=1)
+    total = csum[:, -1:]
+    left = np.arange(1, n)
+    mean_left = csum[:, :-1] / left
+    mean_right = (total - csum[:, :-1]) / (n - left)
+    score = np.abs(mean_left - mean_right) * np.sqrt(left * (n - left) / n) / noise_level(matrix)
+    best = np.argmax(score, axis=1)
+    return best + 1, score[np.arange(rows), best]
+
+class MetricAnomalyDetector:
+    """Flags spikes, EWMA deviations, seasonal deviations and level shifts across several metrics in one pass."""
+
+    def __init__(self, window=DEFAULT_WINDOW, z_threshold=DEFAULT_Z_THRESHOLD, ewma_alpha=DEFAULT_EWMA_ALPHA,
+                 season_period=DEFAULT_SEASON_PERIOD, change_threshold=DEFAULT_CHANGE_THRESHOLD, step=60):
+        self.window = int(window)
+        self.z_threshold = float(z_threshold)
+        self.ewma_alpha = float(ewma_alpha)
+        self.season_period = int(season_period)
+        self.change_threshold = float(change_threshold)
+        self.step = int(step)
+
+    def detect(self, series):
+        """Analyses {name: (timestamps, values)} and returns {name: findings}."""
+        grid, names, raw = align_series(series, self.step)
+        report = {name: {"points": int(np.count_nonzero(~np.isnan(raw[row])))} for row, name in enumerate(names)}
+        if raw.shape[1] < 2:
+            return report
+        matrix = forward_fill(raw)
+        # Rows that start with a gap take their first observed value there, so the cumulative sums stay finite.
+        first_observed = raw[np.arange(len(names)), np.argmax(~np.isnan(raw), axis=1)]
+        matrix = np.where(np.isnan(matrix), np.nan_to_num(first_observed)[:, None], matrix)
+        missing = np.isnan(raw)
+
+        # Flat stretches (or filled gaps) have near-zero spread; the noise floor keeps them from producing huge z-scores.
+        noise = noise_level(matrix)
+        mean, std = rolling_mean_std(matrix, self.window)
+        rolling_z = (matrix - mean) / np.maximum(std, noise)
+
+        level = ewma(matrix, self.ewma_alpha)
+        previous_level = np.concatenate([matrix[:, :1], level[:, :-1]], axis=1)
+        residual = matrix - previous_level
+        spread = np.sqrt(ewma(residual * residual, self.ewma_alpha))
+        previous_spread = np.concatenate([spread[:, :1], spread[:, :-1]], axis=1)
+        ewma_z = residual / np.maximum(previous_spread, noise)
+        ewma_z[:, :self.window] = 0.0
+
+        seasonal_z = None
+        if matrix.shape[1] >= 2 * self.season_period:
+            seasonal_residual = matrix - seasonal_baseline(matrix, self.season_period)
+            scale = np.maximum(np.nanmedian(np.abs(seasonal_residual), axis=1, keepdims=True) / 0.6745, noise)
+            seasonal_z = seasonal_residual / scale
+            # Daily cycles are not level shifts: look for change points in what the seasonal baseline does not explain.
+            change_index, change_score = change_points(seasonal_residual[:, self.season_period:])
+            change_index = change_index + self.season_period
+        else:
+            change_index, change_score = change_points(matrix)
+
+        for row, name in enumerate(names):
+            findings = report[name]
+            observed = ~missing[row]
+            values = raw[row][observed]
+            findings.update({
+                "mean": float(values.mean()) if values.size else None,
+                "max": float(values.max()) if values.size else None,
+                "last": float(values[-1]) if values.size else None,
+            })
+            spikes = observed & (np.abs(np.nan_to_num(rolling_z[row])) > self.z_threshold)
+            if spikes.any():
+                findings["spikes"] = {"count": int(spikes.sum()), "max_z": round(float(np.abs(rolling_z[row][spikes]).max()), 2),
+                                      "last_timestamp": int(grid[spikes][-1])}
+            deviations = observed & (np.abs(np.nan_to_num(ewma_z[row])) > self.z_threshold)
+            if deviations.any():
+                findings["ewma_deviations"] = {"count": int(deviations.sum()), "last_timestamp": int(grid[deviations][-1])}
+            if seasonal_z is not None:
+                seasonal = observed & (np.abs(np.nan_to_num(seasonal_z[row])) > self.z_threshold)
+                if seasonal.any():
+                    findings["seasonal_deviations"] = {"count": int(seasonal.sum()), "last_timestamp": int(grid[seasonal][-1])}
+            if change_score[row] > self.change_threshold:
+                split = change_index[row]
+                findings["level_shift"] = {
+                    "timestamp": int(grid[split]),
+                    "before_mean": float(matrix[row, :split].mean()),
+                    "after_mean": float(matrix[row, split:].mean()),
+                    "score": round(float(change_score[row]), 2),
+                }
+        return report
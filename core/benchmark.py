@@ -0,0 +1,377 @@
+from autogen_migration.core.utils import mysql_connection, close_mysql_pools
+from autogen_migration.core.instrumentation import REGISTRY, record_chunk
+from autogen_migration.core.sharded_export import export_database, import_database, MANIFEST_NAME
+from autogen_migration.core.gcs_transfer import upload_file, download_file
+from autogen_migration.core.validation import KeysetDiffValidator
+from autogen_migration.core.checksum import RangeChecksumComparator
+from autogen_migration.core.bulk_copy import BulkCopyEngine
+from autogen_migration.core.ddl import convert_schema_file
+import subprocess
+import threading
+import platform
+import resource
+import datetime
+import logging
+import random
+import json
+import time
+import sys
+import os
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_ROWS = 100000
+DEFAULT_CHUNK_ROWS = 10000
+DEFAULT_WORKERS = 4
+DEFAULT_NULL_RATIO = 0.2
+DEFAULT_SKEW = 0.01
+DEFAULT_WIDE_BYTES = 2048
+DEFAULT_BATCH_ROWS = 5000
+DEFAULT_SCHEMA_TABLES = 1000
+DEFAULT_PART_SIZE = 4 * 1024 * 1024
+DEFAULT_SEED = 42
+DEFAULT_SCENARIOS = ("generate", "bulk_copy", "keyset_diff", "range_checksum", "sharded_export", "sharded_import",
+                     "gcs_upload", "gcs_download", "schema_conversion")
+# Scenarios that read what an earlier one wrote; selecting one runs its prerequisites too.
+SCENARIO_PREREQUISITES = {
+    "bulk_copy": ("generate",),
+    "keyset_diff": ("bulk_copy",),
+    "range_checksum": ("bulk_copy",),
+    "sharded_export": ("generate",),
+    "sharded_import": ("sharded_export",),
+    "gcs_download": ("gcs_upload",),
+}
+# The record_chunk operation whose latency each scenario reports.
+CHUNK_OPERATIONS = {
+    "generate": "load",
+    "bulk_copy": "copy_write",
+    "keyset_diff": "keyset_diff",
+    "range_checksum": "range_checksum",
+    "sharded_export": "export",
+    "sharded_import": "import",
+    "gcs_upload": "gcs_upload",
+    "gcs_download": "gcs_download",
+}
+# (metric, higher is better) pairs compared between two result files.
+COMPARED_METRICS = (("rows_per_second", True), ("mb_per_second", True), ("peak_rss_mb", False), ("chunk_p99_seconds", False))
+BENCH_TABLE = "employees"
+BENCH_BUCKET = "benchmark"
+
+FIRST_NAMES = ("Steven", "Neena", "Lex", "Alexander", "Bruce", "David", "Valli", "Diana", "Nancy", "Daniel", "John",
+               "Ismael", "Jose Manuel", "Luis", "Den", "Shelli", "Sigal", "Guy", "Karen", "Matthew", "Adam", "Payam")
+LAST_NAMES = ("King", "Kochhar", "De Haan", "Hunold", "Ernst", "Austin", "Pataballa", "Lorentz", "Greenberg", "Faviet",
+              "Chen", "Sciarra", "Urman", "Popp", "Raphaely", "Khoo", "Baida", "Tobias", "Himuro", "Colmenares", "O'Brien")
+JOB_IDS = ("AD_PRES", "AD_VP", "IT_PROG", "FI_MGR", "FI_ACCOUNT", "PU_MAN", "PU_CLERK", "ST_MAN", "ST_CLERK", "SA_REP", "SH_CLERK")
+EMPLOYEE_COLUMNS = ("EMPLOYEE_ID", "FIRST_NAME", "LAST_NAME", "EMAIL", "PHONE_NUMBER", "HIRE_DATE", "JOB_ID", "SALARY",
+                    "COMMISSION_PCT", "MANAGER_ID", "DEPARTMENT_ID")
+WIDE_COLUMNS = ("BIO", "ADDRESS", "NOTES")
+
+def employees_ddl(wide=False):
+    """CREATE TABLE for the benchmark table: data/employees_schema.sql's employees, plus three TEXT columns when wide."""
+    columns = [
+        "EMPLOYEE_ID BIGINT NOT NULL", "FIRST_NAME VARCHAR(255) NOT NULL", "LAST_NAME VARCHAR(255) NOT NULL",
+        "EMAIL VARCHAR(255)", "PHONE_NUMBER VARCHAR(20)", "HIRE_DATE DATE", "JOB_ID VARCHAR(10)", "SALARY DECIMAL(10, 2)",
+        "COMMISSION_PCT DECIMAL(2, 2)", "MANAGER_ID INT", "DEPARTMENT_ID INT",
+    ]
+    if wide:
+        columns += [f"{name} TEXT" for name in WIDE_COLUMNS]
+    return (f"CREATE TABLE `{BENCH_TABLE}` ({', '.join(columns)}, PRIMARY KEY (EMPLOYEE_ID), UNIQUE (EMAIL)) "
+            f"ENGINE=InnoDB DEFAULT CHARSET=utf8mb4")
+
+def employee_rows(count, skew=DEFAULT_SKEW, wide=False, null_ratio=DEFAULT_NULL_RATIO, row_bytes=DEFAULT_WIDE_BYTES, seed=DEFAULT_SEED):
+    """Yields count synthetic employees rows, the same ones for the same arguments.
+
+    skew is the fraction of keys followed by a Pareto-sized gap, so key ranges are dense in places and sparse in
+    others; null_ratio is the probability of each nullable column being NULL; wide rows carry about row_bytes of text.
+    """
+    rng = random.Random(seed)
+    text = "".join(rng.choice("abcdefghijklmnopqrstuvwxyz      ,.'\n") for _ in range(row_bytes + 1024))
+    column_bytes = row_bytes // len(WIDE_COLUMNS)
+    hired = datetime.date(1987, 6, 17)
+    employee_id = 100
+
+    def nullable(value):
+        return None if rng.random() < null_ratio else value
+
+    for _ in range(count):
+        employee_id += 1 if rng.random() >= skew else 1 + int(rng.paretovariate(1.2) * 1000)
+        first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+        row = [
+            employee_id, first, last,
+            nullable(f"{first[0]}{last.replace(' ', '').replace(chr(39), '')}{employee_id}".upper()),
+            nullable(f"515.{rng.randrange(100, 1000)}.{rng.randrange(1000, 10000)}"),
+            nullable((hired + datetime.timedelta(days=rng.randrange(12000))).isoformat()),
+            nullable(rng.choice(JOB_IDS)),
+            nullable(f"{rng.randrange(2100, 24000)}.00"),
+            nullable(f"0.{rng.randrange(5, 40):02d}"),
+            nullable(rng.randrange(100, 206)),
+            nullable(rng.randrange(1, 28) * 10),
+        ]
+        if wide:
+            for _ in WIDE_COLUMNS:
+                start = rng.randrange(1024)
+                row.append(nullable(text[start:start + column_bytes]))
+        yield tuple(row)
+
+def row_bytes_estimate(row):
+    return sum(len(value) if isinstance(value, str) else 8 for value in row if value is not None)
+
+def create_bench_table(db_config, wide=False):
+    with mysql_connection(**db_config) as conn:
+        with conn.cursor() as cursor:
+            cursor.execute(f"DROP TABLE IF EXISTS `{BENCH_TABLE}`")
+            cursor.execute(employees_ddl(wide))
+        conn.commit()
+
+def load_employees(db_config, rows, batch_rows=DEFAULT_BATCH_ROWS, **shape):
+    """(Re)creates the benchmark table in db_config and fills it with employee_rows(rows, **shape), batch by batch."""
+    create_bench_table(db_config, shape.get("wide", False))
+    columns = EMPLOYEE_COLUMNS + (WIDE_COLUMNS if shape.get("wide") else ())
+    sql = f"INSERT INTO `{BENCH_TABLE}` ({', '.join(columns)}) VALUES ({', '.join(['%s'] * len(columns))})"
+    loaded, size, batch = 0, 0, []
+    with mysql_connection(**db_config) as conn:
+
+        def flush():
+            started = time.monotonic()
+            with conn.cursor() as cursor:
+                cursor.executemany(sql, batch)
+            conn.commit()
+            record_chunk("load", time.monotonic() - started, len(batch))
+
+        for row in employee_rows(rows, **shape):
+            batch.append(row)
+            size += row_bytes_estimate(row)
+            if len(batch) >= batch_rows:
+                flush()
+                loaded += len(batch)
+                batch = []
+        if batch:
+            flush()
+            loaded += len(batch)
+    return {"rows": loaded, "bytes": size}
+
+def write_schema_dump(path, tables):
+    """Writes a mysqldump-style schema of `tables` tables with what the conversion rules rewrite: MyISAM, utf8,
+    zero dates, DEFINER clauses, triggers and views."""
+    with open(path, "w") as f:
+        f.write("/*!40101 SET NAMES utf8 */;\n")
+        for i in range(tables):
+            f.write(f"DROP TABLE IF EXISTS `t{i:06d}`;\n")
+            f.write(f"CREATE TABLE `t{i:06d}` (\n  `id` int(11) NOT NULL AUTO_INCREMENT,\n  `parent_id` int(11) DEFAULT NULL,\n"
+                    f"  `name` varchar(255) CHARACTER SET utf8 NOT NULL,\n  `created` datetime NOT NULL DEFAULT '0000-00-00 00:00:00',\n"
+                    f"  `body` text,\n  PRIMARY KEY (`id`),\n  KEY `parent_id` (`parent_id`)\n"
+                    f") ENGINE={'MyISAM' if i % 3 == 0 else 'InnoDB'} DEFAULT CHARSET=utf8;\n")
+            if i % 10 == 0:
+                f.write("DELIMITER ;;\n")
+                f.write(f"CREATE DEFINER=`root`@`localhost` TRIGGER `t{i:06d}_bi` BEFORE INSERT ON `t{i:06d}` FOR EACH ROW BEGIN\n"
+                        f"  SET NEW.created = NOW();\nEND ;;\nDELIMITER ;\n")
+            if i % 25 == 0:
+                f.write(f"CREATE ALGORITHM=UNDEFINED DEFINER=`root`@`%` SQL SECURITY DEFINER VIEW `v{i:06d}` AS "
+                        f"SELECT `id`, `name` FROM `t{i:06d}`;\n")
+    return os.path.getsize(path)
+
+def _rss_bytes():
+    try:
+        with open("/proc/self/statm", "r") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024 # high-water mark, in KiB on Linux
+
+class PeakMemory:
+    """Samples the resident set size on a background thread while in use; peak is the highest value seen, in bytes."""
+
+    def __init__(self, interval=0.05):
+        self.interval = interval
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._sample, name="rss-sampler", daemon=True)
+
+    def _sample(self):
+        while not self._stop.wait(self.interval):
+            self.peak = max(self.peak, _rss_bytes())
+
+    def __enter__(self):
+        self.peak = _rss_bytes()
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, _rss_bytes())
+
+def _manifest_bytes(output_dir):
+    with open(os.path.join(output_dir, MANIFEST_NAME), "r") as f:
+        tables = json.load(f)["tables"]
+    return sum(chunk.get("bytes", 0) for table in tables for chunk in table["chunks"])
+
+def measure(scenario, func):
+    """Runs func() (which returns at least rows and bytes) and adds throughput, peak RSS and chunk latency figures."""
+    REGISTRY.reset()
+    with PeakMemory() as memory:
+        started = time.monotonic()
+        details = func()
+        seconds = time.monotonic() - started
+    operation = CHUNK_OPERATIONS.get(scenario)
+    chunk_snapshot = REGISTRY.snapshot().get("migration_chunk_seconds", {"values": []})["values"]
+    p99 = REGISTRY.quantile("migration_chunk_seconds", 0.99, operation=operation) if operation else None
+    rows, size = details.pop("rows"), details.pop("bytes")
+    return {
+        "scenario": scenario,
+        "rows": rows,
+        "bytes": size,
+        "seconds": round(seconds, 3),
+        "rows_per_second": round(rows / seconds, 1) if seconds > 0 else None,
+        "mb_per_second": round(size / 1e6 / seconds, 2) if seconds > 0 else None,
+        "peak_rss_mb": round(memory.peak / 1e6, 1),
+        "chunks": sum(value["count"] for labels, value in chunk_snapshot if labels.get("operation") == operation),
+        "chunk_p99_seconds": round(p99, 4) if p99 is not None else None,
+        "details": details,
+    }
+
+def _selected(scenarios):
+    wanted, ordered = set(), []
+
+    def add(name):
+        if name not in DEFAULT_SCENARIOS:
+            raise ValueError(f"Unknown benchmark scenario {name!r}; choose from {', '.join(DEFAULT_SCENARIOS)}")
+        for prerequisite in SCENARIO_PREREQUISITES.get(name, ()):
+            add(prerequisite)
+        wanted.add(name)
+
+    for name in scenarios:
+        add(name)
+    ordered.extend(name for name in DEFAULT_SCENARIOS if name in wanted)
+    return ordered
+
+def run_benchmarks(databases, work_dir, storage_client, scenarios=DEFAULT_SCENARIOS, rows=DEFAULT_ROWS,
+                   chunk_rows=DEFAULT_CHUNK_ROWS, workers=DEFAULT_WORKERS, compression="none", part_size=DEFAULT_PART_SIZE,
+                   schema_tables=DEFAULT_SCHEMA_TABLES, **shape):
+    """Runs the selected scenarios in order and returns one measure() result per scenario.
+
+    databases maps "source", "target" and "import" to connection configs; the benchmark table is dropped and rebuilt
+    in each, so point them at scratch databases. storage_client is a google.cloud.storage.Client or StorageStandIn.
+    """
+    source, target, imported = databases["source"], databases["target"], databases["import"]
+    export_dir = os.path.join(work_dir, "export")
+    payload = os.path.join(work_dir, "payload.tsv")
+    state = {}
+
+    def generate():
+        return load_employees(source, rows, **shape)
+
+    def bulk_copy():
+        create_bench_table(target, shape.get("wide", False))
+        result = BulkCopyEngine(source, target, readers=workers, writers=workers, chunk_rows=chunk_rows).copy_table(BENCH_TABLE)
+        return {"rows": result["rows_copied"], "bytes": state["bytes"], "chunks_copied": result["chunks_copied"],
+                "failed_chunks": len(result["failed_chunks"])}
+
+    def keyset_diff():
+        with mysql_connection(**source) as source_conn, mysql_connection(**target) as target_conn:
+            result = KeysetDiffValidator(source_conn, target_conn, BENCH_TABLE, chunk_size=chunk_rows).run()
+        return {"rows": state["rows"], "bytes": state["bytes"], "match": result["match"]}
+
+    def range_checksum():
+        result = RangeChecksumComparator(source, target, BENCH_TABLE, range_rows=chunk_rows, workers=workers).run()
+        return {"rows": state["rows"], "bytes": state["bytes"], "match": result["match"],
+                "checksum_queries": result.get("checksum_queries")}
+
+    def sharded_export():
+        result = export_database(source, export_dir, tables=[BENCH_TABLE], workers=workers, chunk_rows=chunk_rows,
+                                 compression=compression, resume=False)
+        return {"rows": result["rows"], "bytes": _manifest_bytes(export_dir), "status": result["status"],
+                "snapshot_consistent": result["snapshot"]["consistent"]}
+
+    def sharded_import():
+        with mysql_connection(**imported) as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(f"DROP TABLE IF EXISTS `{BENCH_TABLE}`")
+            conn.commit()
+        result = import_database(imported, export_dir, workers=workers, resume=False)
+        return {"rows": result["rows"], "bytes": _manifest_bytes(export_dir), "status": result["status"]}
+
+    def gcs_upload():
+        with open(payload, "w") as f:
+            for row in employee_rows(rows, **shape):
+                f.write("\t".join("\\N" if value is None else str(value).replace("\n", "\\n") for value in row) + "\n")
+        result = upload_file(storage_client, BENCH_BUCKET, payload, f"{BENCH_TABLE}.tsv", part_size=part_size,
+                             max_workers=workers, resume=False)
+        return {"rows": rows, "bytes": result["bytes"], "parts": result["parts"]}
+
+    def gcs_download():
+        result = download_file(storage_client, BENCH_BUCKET, f"{BENCH_TABLE}.tsv", payload + ".downloaded",
+                               part_size=part_size, max_workers=workers, resume=False)
+        return {"rows": rows, "bytes": result["bytes"], "parts": result["parts"]}
+
+    def schema_conversion():
+        dump_path = os.path.join(work_dir, "schema.sql")
+        size = write_schema_dump(dump_path, schema_tables)
+        result = convert_schema_file(dump_path, dump_path + ".converted", workers=workers)
+        return {"rows": schema_tables, "bytes": size, "rule_counts": result["rule_counts"],
+                "unresolved": len(result["unresolved"])}
+
+    runners = {"generate": generate, "bulk_copy": bulk_copy, "keyset_diff": keyset_diff, "range_checksum": range_checksum,
+               "sharded_export": sharded_export, "sharded_import": sharded_import, "gcs_upload": gcs_upload,
+               "gcs_download": gcs_download, "schema_conversion": schema_conversion}
+    results = []
+    for name in _selected(scenarios):
+        logger.info(f"Benchmark scenario {name}")
+        result = measure(name, runners[name])
+        if name == "generate":
+            state.update(rows=result["rows"], bytes=result["bytes"])
+        results.append(result)
+    close_mysql_pools()
+    return results
+
+def environment(backend, params):
+    """What a result depends on besides the code: commit, interpreter, machine and the benchmark parameters."""
+    commit, dirty = None, None
+    try:
+        root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], cwd=root, capture_output=True, text=True, check=True).stdout.strip()
+        dirty = bool(subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=root,
+                                    capture_output=True, text=True, check=True).stdout.strip())
+    except (OSError, subprocess.CalledProcessError):
+        pass # not a git checkout
+    return {
+        "commit": commit,
+        "dirty": dirty,
+        "started_at": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "backend": backend,
+        "params": params,
+    }
+
+def compare_reports(report, baseline):
+    """Per scenario and metric, the change from baseline in percent and whether it is an improvement."""
+    before = {result["scenario"]: result for result in baseline["results"]}
+    changes = []
+    for result in report["results"]:
+        old = before.get(result["scenario"])
+        if old is None:
+            continue
+        for metric, higher_is_better in COMPARED_METRICS:
+            if result.get(metric) is None or not old.get(metric):
+                continue
+            change = (result[metric] - old[metric]) / old[metric] * 100
+            changes.append({"scenario": result["scenario"], "metric": metric, "baseline": old[metric], "current": result[metric],
+                            "change_pct": round(change, 1), "better": change > 0 if higher_is_better else change < 0})
+    return changes
+
+def format_report(report, baseline=None):
+    lines = [f"commit {report['commit'] or 'unknown'}{' (dirty)' if report['dirty'] else ''}, backend {report['backend']}, "
+             f"{report['params']['rows']} rows, {report['cpus']} cpus",
+             f"{'scenario':<18}{'rows':>12}{'seconds':>10}{'rows/s':>12}{'MB/s':>9}{'peak RSS MB':>13}{'chunks':>8}{'p99 chunk s':>13}"]
+    for r in report["results"]:
+        lines.append(f"{r['scenario']:<18}{r['rows']:>12}{r['seconds']:>10}{str(r['rows_per_second']):>12}"
+                     f"{str(r['mb_per_second']):>9}{r['peak_rss_mb']:>13}{r['chunks']:>8}{str(r['chunk_p99_seconds']):>13}")
+    if baseline is not None:
+        lines.append(f"compared with {baseline['commit'] or 'unknown'} ({baseline['started_at']}):")
+        if baseline["params"] != report["params"] or baseline["backend"] != report["backend"]:
+            lines.append("  note: parameters or backend differ, so the numbers are not directly comparable")
+        for change in compare_reports(report, baseline):
+            lines.append(f"  {change['scenario']:<18}{change['metric']:<20}{change['baseline']:>12} -> {change['current']:<12}"
+                         f"{change['change_pct']:+.1f}% {'better' if change['better'] else 'worse'}")
+    return "\n".join(lines)
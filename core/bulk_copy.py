@@ -0,0 +1,209 @@
+from autogen_migration.core.utils import mysql_connection, get_mysql_pool
+from autogen_migration.core.validation import (
+    quote_identifier, get_table_columns, get_primary_key_columns, keyset_range_clause, split_key_ranges, stream_rows,
+)
+from autogen_migration.core.instrumentation import record_retry, record_chunk
+from autogen_migration.core.journal import qualified_table
+from concurrent.futures import ThreadPoolExecutor
+import threading
+import logging
+import queue
+import time
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CHUNK_ROWS = 50000
+DEFAULT_BATCH_ROWS = 1000
+DEFAULT_READERS = 4
+DEFAULT_WRITERS = 4
+DEFAULT_MAX_RETRIES = 3
+
+class BulkCopyEngine:
+    """Copies tables between MySQL servers in primary-key range chunks with parallel readers and writers."""
+
+    def __init__(self, source_config, target_config, readers=DEFAULT_READERS, writers=DEFAULT_WRITERS,
+                 chunk_rows=DEFAULT_CHUNK_ROWS, batch_rows=DEFAULT_BATCH_ROWS, queue_size=None,
+                 max_retries=DEFAULT_MAX_RETRIES, progress_callback=None, journal=None):
+        self.source_config = source_config
+        self.target_config = target_config
+        self.readers = int(readers)
+        self.writers = int(writers)
+        self.chunk_rows = int(chunk_rows)
+        self.batch_rows = int(batch_rows)
+        # Readers block once this many chunks are waiting, so memory stays at a few chunks per worker.
+        self.queue_size = int(queue_size) if queue_size else 2 * self.writers
+        self.max_retries = int(max_retries)
+        self.progress_callback = progress_callback
+        # With a MigrationJournal the chunk plan and finished chunks are persisted, so a rerun copies only what is left.
+        self.journal = journal
+        get_mysql_pool(**source_config, max_size=self.readers + 1)
+        get_mysql_pool(**target_config, max_size=self.writers)
+
+    def _with_retries(self, description, func, *args):
+        for attempt in range(self.max_retries + 1):
+            try:
+                return func(attempt, *args)
+            except Exception as e:
+                if attempt == self.max_retries:
+                    raise
+                delay = min(2 ** attempt, 30)
+                record_retry("mysql", description, attempt + 1, e)
+                logger.warning(f"{description} failed (attempt {attempt + 1}/{self.max_retries + 1}): {e}. Retrying in {delay}s...")
+                time.sleep(delay)
+
+    def _read_chunk(self, attempt, table_name, select_list, pk_columns, lower_key, upper_key):
+        where, params = keyset_range_clause(pk_columns, lower_key, upper_key)
+        order_by = ", ".join(quote_identifier(c) for c in pk_columns)
+        with mysql_connection(**self.source_config) as conn:
+            return list(stream_rows(conn, f"SELECT {select_list} FROM {quote_identifier(table_name)}{where} ORDER BY {order_by}", params))
+
+    def _write_chunk(self, attempt, table_name, insert_sql, pk_columns, lower_key, upper_key, rows):
+        with mysql_connection(**self.target_config) as conn:
+            try:
+                with conn.cursor() as cursor:
+                    # Tables are loaded concurrently and in any order, so child rows may arrive before their parents.
+                    cursor.execute("SET SESSION foreign_key_checks = 0")
+                    if attempt:
+                        # An earlier attempt may have committed before its acknowledgement was lost; start the range clean.
+                        where, params = keyset_range_clause(pk_columns, lower_key, upper_key)
+                        cursor.execute(f"DELETE FROM {quote_identifier(table_name)}{where}", params)
+                    for start in range(0, len(rows), self.batch_rows):
+                        # pymysql folds executemany on INSERT ... VALUES into multi-row INSERT statements.
+                        cursor.executemany(insert_sql, rows[start:start + self.batch_rows])
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+
+    def _requested_chunks(self, plan_name, ranges):
+        """(index, lower_key, upper_key) of ranges given as (lower_key, upper_key) pairs or failed_chunks dicts.
+
+        A range of the journaled plan gets its chunk index, so redoing it is journaled, and the plan's own keys, which
+        keep column types that a JSON round trip of the result (e.g. through an agent) turns into strings.
+        """
+        plan = self.journal.chunk_plan(plan_name) if self.journal is not None else None
+        by_index = {index: (lower, upper) for index, lower, upper, _ in plan or ()}
+        by_keys = {(lower, upper): index for index, lower, upper, _ in plan or ()}
+        chunks = []
+        for item in ranges:
+            if isinstance(item, dict):
+                index, lower, upper = item.get("index"), item["lower_key"], item["upper_key"]
+            else:
+                index, (lower, upper) = None, item
+            lower = tuple(lower) if lower is not None else None
+            upper = tuple(upper) if upper is not None else None
+            if index not in by_index:
+                index = by_keys.get((lower, upper))
+            if index is not None:
+                lower, upper = by_index[index]
+            chunks.append((index, lower, upper))
+        return chunks
+
+    def copy_table(self, table_name, ranges=None):
+        """Copies one table; pass ranges (e.g. a previous result's failed_chunks) to redo only those chunks."""
+        start_time = time.time()
+        with mysql_connection(**self.source_config) as conn:
+            pk_columns = get_primary_key_columns(conn, table_name)
+            if not pk_columns:
+                raise ValueError(f"Table {table_name} has no primary key; chunked copy needs one.")
+            columns = get_table_columns(conn, table_name)
+            # One journal run can copy same-named tables from several databases, so plans are keyed by db.table.
+            plan_name = qualified_table(self.source_config["db"], table_name)
+            plan = self.journal.chunk_plan(plan_name) if self.journal is not None and ranges is None else None
+            if plan is None and ranges is None:
+                ranges = split_key_ranges(conn, table_name, pk_columns, self.chunk_rows)
+                if self.journal is not None:
+                    self.journal.save_chunk_plan(plan_name, ranges)
+                    plan = self.journal.chunk_plan(plan_name)
+        if plan is not None:
+            total_chunks = len(plan)
+            chunks = [(index, lower, upper) for index, lower, upper, status in plan if status != "done"]
+            if len(chunks) < total_chunks:
+                logger.info(f"Resuming {table_name}: {total_chunks - len(chunks)} of {total_chunks} chunks already copied.")
+        else:
+            total_chunks = len(ranges)
+            chunks = self._requested_chunks(plan_name, ranges)
+        select_list = ", ".join(quote_identifier(c) for c in columns)
+        insert_sql = (f"INSERT INTO {quote_identifier(table_name)} ({select_list}) "
+                      f"VALUES ({', '.join(['%s'] * len(columns))})")
+
+        chunk_queue = queue.Queue(maxsize=self.queue_size)
+        stats_lock = threading.Lock()
+        stats = {"chunks_done": 0, "rows_copied": 0, "failed_chunks": []}
+
+        def record_failure(index, lower_key, upper_key, stage, error):
+            logger.error(f"Chunk ({lower_key}, {upper_key}] of {table_name} failed while {stage}: {error}")
+            with stats_lock:
+                stats["failed_chunks"].append({
+                    "index": index,
+                    "lower_key": list(lower_key) if lower_key is not None else None,
+                    "upper_key": list(upper_key) if upper_key is not None else None,
+                    "stage": stage,
+                    "error": str(error),
+                })
+
+        def read(chunk):
+            index, lower_key, upper_key = chunk
+            started = time.monotonic()
+            try:
+                rows = self._with_retries(f"Reading {table_name} chunk", self._read_chunk,
+                                          table_name, select_list, pk_columns, lower_key, upper_key)
+            except Exception as e:
+                record_failure(index, lower_key, upper_key, "reading", e)
+                return
+            record_chunk("copy_read", time.monotonic() - started, len(rows))
+            chunk_queue.put((index, lower_key, upper_key, rows))
+
+        def write_loop():
+            while True:
+                item = chunk_queue.get()
+                if item is None:
+                    return
+                index, lower_key, upper_key, rows = item
+                started = time.monotonic()
+                try:
+                    if rows:
+                        self._with_retries(f"Writing {table_name} chunk", self._write_chunk,
+                                           table_name, insert_sql, pk_columns, lower_key, upper_key, rows)
+                except Exception as e:
+                    record_failure(index, lower_key, upper_key, "writing", e)
+                    continue
+                record_chunk("copy_write", time.monotonic() - started, len(rows))
+                if self.journal is not None and index is not None:
+                    self.journal.record_chunk(plan_name, index, len(rows))
+                with stats_lock:
+                    stats["chunks_done"] += 1
+                    stats["rows_copied"] += len(rows)
+                    chunks_done, rows_copied = stats["chunks_done"], stats["rows_copied"]
+                logger.info(f"Copied chunk {chunks_done}/{len(chunks)} of {table_name} ({rows_copied} rows so far)")
+                if self.progress_callback:
+                    try:
+                        self.progress_callback(table_name, chunks_done, len(chunks), rows_copied)
+                    except Exception as e:
+                        # A failing callback must not kill the writer, or readers block forever on the full queue.
+                        logger.warning(f"Progress callback for {table_name} failed: {e}")
+
+        writer_threads = [threading.Thread(target=write_loop, name=f"bulk-copy-writer-{i}", daemon=True)
+                          for i in range(self.writers)]
+        for thread in writer_threads:
+            thread.start()
+        try:
+            with ThreadPoolExecutor(max_workers=self.readers, thread_name_prefix="bulk-copy-reader") as executor:
+                list(executor.map(read, chunks))
+        finally:
+            for _ in writer_threads:
+                chunk_queue.put(None)
+            for thread in writer_threads:
+                thread.join()
+
+        elapsed = time.time() - start_time
+        return {
+            "table": table_name,
+            "chunks": total_chunks,
+            "chunks_skipped": total_chunks - len(chunks),
+            "chunks_copied": stats["chunks_done"],
+            "rows_copied": stats["rows_copied"],
+            "failed_chunks": stats["failed_chunks"],
+            "elapsed_seconds": round(elapsed, 3),
+            "rows_per_second": round(stats["rows_copied"] / elapsed, 1) if elapsed > 0 else None,
+        }
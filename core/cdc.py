@@ -0,0 +1,305 @@
+from autogen_migration.core.utils import mysql_connection
+from autogen_migration.core.validation import quote_identifier, get_primary_key_columns
+from autogen_migration.core.instrumentation import record_replication_lag
+import pymysql
+import threading
+import logging
+import queue
+import time
+import re
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SERVER_ID = 4379
+DEFAULT_BATCH_WINDOW = 0.5
+DEFAULT_MAX_BATCH_ROWS = 5000
+CDC_POSITION_KEY = "cdc_position"
+# Statements that change a table's shape or contents outside row events; replication stops at them.
+_DDL = re.compile(r"^\s*(?:ALTER|CREATE|DROP|RENAME|TRUNCATE)\s+(?:(?:TEMPORARY|ONLINE|OFFLINE|IGNORE|UNIQUE|FULLTEXT|SPATIAL)\s+)*"
+                  r"(?:TABLE|INDEX)\b", re.IGNORECASE)
+
+class SchemaChangeError(RuntimeError):
+    """Raised by BinlogReplicator.run at DDL on a replicated table; position is where to resume once it is applied."""
+
+    def __init__(self, query, position):
+        super().__init__(f"Replication stopped at DDL, apply it to the target and resume from {position}: {query}")
+        self.query = query
+        self.position = position
+
+def get_binlog_position(conn):
+    """Returns the source's current binlog file, position and executed GTID set."""
+    with conn.cursor() as cursor:
+        try:
+            cursor.execute("SHOW MASTER STATUS")
+        except pymysql.MySQLError:
+            # MySQL 8.4 removed SHOW MASTER STATUS in favour of SHOW BINARY LOG STATUS.
+            cursor.execute("SHOW BINARY LOG STATUS")
+        row = cursor.fetchone()
+    if not row:
+        raise RuntimeError("Binary logging is disabled on the source; CDC needs log_bin=ON and binlog_format=ROW.")
+    check_binlog_format(conn)
+    return {"log_file": row[0], "log_pos": int(row[1]), "gtid_set": row[4] if len(row) > 4 and row[4] else None}
+
+def check_binlog_format(conn):
+    """Raises RuntimeError unless the source logs full row images.
+
+    MINIMAL and NOBLOB images leave the unchanged columns out, and the replication library reports them as None, so
+    applying such an event would overwrite the target row with NULLs (and an unchanged key with a NULL key).
+    """
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT @@GLOBAL.binlog_format, @@GLOBAL.binlog_row_image")
+        binlog_format, row_image = cursor.fetchone()
+    if str(binlog_format).upper() != "ROW" or str(row_image).upper() != "FULL":
+        raise RuntimeError(f"CDC needs binlog_format=ROW and binlog_row_image=FULL; the source has {binlog_format} and {row_image}.")
+
+class BinlogReplicator:
+    """Tails the source binlog, coalesces row events per primary key and applies them to the target in batches."""
+
+    def __init__(self, source_config, target_config, server_id=DEFAULT_SERVER_ID, tables=None,
+                 batch_window=DEFAULT_BATCH_WINDOW, max_batch_rows=DEFAULT_MAX_BATCH_ROWS, journal=None):
+        self.source_config = source_config
+        self.target_config = target_config
+        self.server_id = int(server_id)
+        self.tables = tables
+        self.batch_window = float(batch_window)
+        self.max_batch_rows = int(max_batch_rows)
+        self.journal = journal
+        self._pk_cache = {}
+        self._metrics_lock = threading.Lock()
+        self.metrics = {
+            "events": 0,
+            "batches": 0,
+            "rows_applied": 0,
+            "replication_lag_seconds": None,
+            "position": None,
+        }
+
+    def _open_stream(self, start_position):
+        with mysql_connection(**self.source_config) as conn:
+            check_binlog_format(conn)
+        # python-mysql-replication is only needed for CDC, so it is imported here rather than at module load.
+        from pymysqlreplication import BinLogStreamReader
+        from pymysqlreplication.event import XidEvent, QueryEvent
+        from pymysqlreplication.row_event import WriteRowsEvent, UpdateRowsEvent, DeleteRowsEvent
+
+        options = {}
+        if start_position.get("gtid_set") and not start_position.get("log_file"):
+            options["auto_position"] = start_position["gtid_set"]
+        else:
+            options.update(log_file=start_position["log_file"], log_pos=int(start_position["log_pos"]))
+        return BinLogStreamReader(
+            connection_settings={
+                "host": self.source_config["host"],
+                "port": int(self.source_config["port"]),
+                "user": self.source_config["user"],
+                "passwd": self.source_config["password"],
+            },
+            server_id=self.server_id,
+            blocking=True,
+            resume_stream=True,
+            only_events=[WriteRowsEvent, UpdateRowsEvent, DeleteRowsEvent, XidEvent, QueryEvent],
+            only_schemas=[self.source_config["db"]],
+            only_tables=self.tables,
+            **options,
+        )
+
+    def _is_replicated_ddl(self, event):
+        query = event.query if isinstance(event.query, str) else event.query.decode("utf-8", "replace")
+        if not _DDL.match(query):
+            return False
+        schema = event.schema.decode("utf-8", "replace") if isinstance(event.schema, bytes) else event.schema
+        db = self.source_config["db"]
+        if schema != db and f"{db}." not in query and f"`{db}`." not in query:
+            return False
+        return self.tables is None or any(re.search(rf"\b{re.escape(t)}\b", query) for t in self.tables)
+
+    def _read_events(self, stream, events, stop):
+        from pymysqlreplication.event import XidEvent, QueryEvent
+        try:
+            for event in stream:
+                if stop.is_set():
+                    return
+                position = {"log_file": stream.log_file, "log_pos": stream.log_pos}
+                if isinstance(event, XidEvent):
+                    # Only transaction boundaries are safe resume points for the stream.
+                    events.put(("commit", position))
+                elif isinstance(event, QueryEvent):
+                    query = event.query if isinstance(event.query, str) else event.query.decode("utf-8", "replace")
+                    if query.strip().upper() == "COMMIT":
+                        events.put(("commit", position)) # end of a non-transactional (e.g. MyISAM) statement group
+                    elif self._is_replicated_ddl(event):
+                        events.put(("ddl", (query, position)))
+                        return
+                else:
+                    events.put(("rows", event))
+        except Exception as e:
+            if not stop.is_set():
+                events.put(("error", e))
+
+    def _pk_columns(self, table_name):
+        if table_name not in self._pk_cache:
+            with mysql_connection(**self.target_config) as conn:
+                pk_columns = get_primary_key_columns(conn, table_name)
+            if not pk_columns:
+                raise ValueError(f"Table {table_name} has no primary key; CDC apply needs one.")
+            self._pk_cache[table_name] = pk_columns
+        return self._pk_cache[table_name]
+
+    def _coalesce(self, pending, event):
+        """Folds a row event into pending {table: {pk: row or None}}; the last change per key wins."""
+        pk_columns = self._pk_columns(event.table)
+        changes = pending.setdefault(event.table, {})
+        for row in event.rows:
+            if "after_values" in row:
+                old_key = tuple(row["before_values"][c] for c in pk_columns)
+                new_key = tuple(row["after_values"][c] for c in pk_columns)
+                if old_key != new_key:
+                    changes[old_key] = None
+                changes[new_key] = row["after_values"]
+            elif event.__class__.__name__ == "DeleteRowsEvent":
+                changes[tuple(row["values"][c] for c in pk_columns)] = None
+            else:
+                changes[tuple(row["values"][c] for c in pk_columns)] = row["values"]
+        return len(event.rows)
+
+    def _apply(self, pending):
+        """Applies coalesced changes in one target transaction; replaying them is idempotent.
+
+        Foreign key checks are off for the batch, since coalescing reorders changes across tables and transactions.
+        """
+        applied = 0
+        with mysql_connection(**self.target_config) as conn:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT @@SESSION.foreign_key_checks")
+                previous = cursor.fetchone()[0]
+                cursor.execute("SET SESSION foreign_key_checks = 0")
+            try:
+                with conn.cursor() as cursor:
+                    for table_name, changes in pending.items():
+                        pk_columns = self._pk_columns(table_name)
+                        table = quote_identifier(table_name)
+                        key_list = "(" + ", ".join(quote_identifier(c) for c in pk_columns) + ")"
+                        placeholder = "(" + ", ".join(["%s"] * len(pk_columns)) + ")"
+                        deletes = [key for key, row in changes.items() if row is None]
+                        for start in range(0, len(deletes), self.max_batch_rows):
+                            batch = deletes[start:start + self.max_batch_rows]
+                            cursor.execute(
+                                f"DELETE FROM {table} WHERE {key_list} IN ({', '.join([placeholder] * len(batch))})",
+                                [value for key in batch for value in key],
+                            )
+                        # One statement per column set, so every statement names exactly the columns its rows carry.
+                        upserts = {}
+                        for row in changes.values():
+                            if row is not None:
+                                upserts.setdefault(tuple(row.keys()), []).append(row)
+                        for columns, rows in upserts.items():
+                            column_list = ", ".join(quote_identifier(c) for c in columns)
+                            updates = ", ".join(f"{quote_identifier(c)} = VALUES({quote_identifier(c)})" for c in columns)
+                            cursor.executemany(
+                                f"INSERT INTO {table} ({column_list}) VALUES ({', '.join(['%s'] * len(columns))}) "
+                                f"ON DUPLICATE KEY UPDATE {updates}",
+                                [[row[c] for c in columns] for row in rows],
+                            )
+                        applied += len(changes)
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            finally:
+                # Pooled connections go back as they were borrowed.
+                with conn.cursor() as cursor:
+                    cursor.execute("SET SESSION foreign_key_checks = %s", (previous,))
+        return applied
+
+    def _set_lag(self, seconds):
+        with self._metrics_lock:
+            self.metrics["replication_lag_seconds"] = seconds
+        record_replication_lag(self.source_config["db"], seconds)
+
+    def _checkpoint(self, position):
+        with self._metrics_lock:
+            self.metrics["position"] = position
+        if self.journal is not None:
+            self.journal.set_state(CDC_POSITION_KEY, position)
+
+    def run(self, start_position, duration_seconds=None, until_caught_up=False, stop_event=None):
+        """Replicates from start_position until the duration elapses, stop_event is set, or (optionally) lag reaches zero.
+
+        Changes are applied and checkpointed only at source transaction boundaries, so the target never holds half a
+        transaction; rows of a transaction still open when replication stops are read again on resume. DDL on a
+        replicated table raises SchemaChangeError after everything committed before it has been applied.
+        """
+        stop = threading.Event()
+        events = queue.Queue(maxsize=self.max_batch_rows * 2)
+        stream = self._open_stream(start_position)
+        reader = threading.Thread(target=self._read_events, args=(stream, events, stop), name="cdc-binlog-reader", daemon=True)
+        reader.start()
+        deadline = time.monotonic() + duration_seconds if duration_seconds else None
+        # pending holds coalesced changes of committed transactions; transaction those of the one still open.
+        pending, pending_rows, batch_started = {}, 0, None
+        transaction, transaction_rows = {}, 0
+        commit_position, last_event_time = None, None
+
+        def flush():
+            nonlocal pending, pending_rows, batch_started
+            if pending:
+                applied = self._apply(pending)
+                with self._metrics_lock:
+                    self.metrics["batches"] += 1
+                    self.metrics["rows_applied"] += applied
+                if last_event_time is not None:
+                    self._set_lag(max(time.time() - last_event_time, 0.0))
+            if commit_position is not None:
+                self._checkpoint(commit_position)
+            pending, pending_rows, batch_started = {}, 0, None
+
+        try:
+            while True:
+                timeout = self.batch_window
+                if batch_started is not None:
+                    timeout = max(self.batch_window - (time.monotonic() - batch_started), 0.0)
+                try:
+                    kind, payload = events.get(timeout=timeout)
+                except queue.Empty:
+                    kind, payload = None, None
+
+                if kind == "error":
+                    raise payload
+                if kind == "ddl":
+                    query, position = payload
+                    flush()
+                    self._pk_cache.clear()
+                    with self._metrics_lock:
+                        self.metrics["stopped_at_ddl"] = {"query": query, "resume_position": position}
+                    raise SchemaChangeError(query, position)
+                if kind == "rows":
+                    transaction_rows += self._coalesce(transaction, payload)
+                    last_event_time = payload.timestamp
+                    with self._metrics_lock:
+                        self.metrics["events"] += 1
+                elif kind == "commit":
+                    for table_name, changes in transaction.items():
+                        pending.setdefault(table_name, {}).update(changes)
+                    pending_rows += transaction_rows
+                    transaction, transaction_rows = {}, 0
+                    commit_position = payload
+                    if pending:
+                        batch_started = batch_started or time.monotonic()
+
+                if pending and (pending_rows >= self.max_batch_rows or time.monotonic() - batch_started >= self.batch_window):
+                    flush()
+                if kind is None and not pending and not transaction:
+                    # The stream is idle and everything read has been applied: the target has caught up.
+                    if commit_position is not None and commit_position != self.metrics["position"]:
+                        self._checkpoint(commit_position)
+                    self._set_lag(0.0)
+                    if until_caught_up:
+                        break
+                if (deadline is not None and time.monotonic() >= deadline) or (stop_event is not None and stop_event.is_set()):
+                    flush()
+                    break
+        finally:
+            stop.set()
+            stream.close()
+        with self._metrics_lock:
+            return dict(self.metrics)
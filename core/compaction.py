@@ -0,0 +1,129 @@
+import functools
+import hashlib
+import logging
+import json
+import copy
+import os
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_RESULT_TOKEN_BUDGET = 1000
+CHARS_PER_TOKEN = 4 # rough average for English text and JSON
+
+def estimate_tokens(text):
+    """Cheap token estimate; close enough to budget prompts without loading a tokenizer."""
+    return len(text) // CHARS_PER_TOKEN + 1
+
+def _dumps(value):
+    return json.dumps(value, default=str, sort_keys=True)
+
+class ArtifactStore:
+    """Content-addressed store for full tool results; the transcript only carries their IDs."""
+
+    def __init__(self, directory="artifacts"):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, artifact_id):
+        return os.path.join(self.directory, f"{artifact_id}.json")
+
+    def put(self, payload):
+        data = _dumps(payload)
+        artifact_id = hashlib.sha256(data.encode("utf-8")).hexdigest()[:16]
+        path = self._path(artifact_id)
+        if not os.path.exists(path):
+            tmp_path = path + ".tmp"
+            with open(tmp_path, "w") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        return artifact_id
+
+    def get(self, artifact_id):
+        with open(self._path(artifact_id), "r") as f:
+            return json.load(f)
+
+def _shrink(value, max_items, max_chars):
+    """Copy of value with long lists cut to max_items and long strings cut to max_chars."""
+    if isinstance(value, dict):
+        return {k: _shrink(v, max_items, max_chars) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        items = [_shrink(v, max_items, max_chars) for v in value[:max_items]]
+        if len(value) > max_items:
+            items.append(f"... {len(value) - max_items} more items")
+        return items
+    if isinstance(value, str) and len(value) > max_chars:
+        return value[:max_chars] + f"... ({len(value) - max_chars} more chars)"
+    return value
+
+def compact_result(result, budget_tokens=DEFAULT_RESULT_TOKEN_BUDGET, store=None):
+    """Returns result unchanged if it fits budget_tokens, otherwise a shrunken copy that points at the stored original.
+
+    Dict keys and scalar fields (status, counts, paths) are always kept; only long lists and strings are cut,
+    progressively harder until the summary fits.
+    """
+    if estimate_tokens(_dumps(result)) <= budget_tokens:
+        return result
+    artifact_id = store.put(result) if store is not None else None
+    max_items, max_chars = 20, 2000
+    while True:
+        compacted = _shrink(copy.deepcopy(result), max_items, max_chars)
+        if isinstance(compacted, dict):
+            compacted["truncated"] = True
+            compacted["artifact_id"] = artifact_id
+        else:
+            compacted = {"truncated": True, "artifact_id": artifact_id, "preview": compacted}
+        if estimate_tokens(_dumps(compacted)) <= budget_tokens or (max_items == 0 and max_chars <= 50):
+            return compacted
+        max_items, max_chars = max_items // 2, max(max_chars // 2, 50)
+
+def compacting(func, budget_tokens=DEFAULT_RESULT_TOKEN_BUDGET, store=None):
+    """Wraps an agent function so what it returns to the conversation fits budget_tokens.
+
+    The untouched function stays reachable as wrapper.uncompacted for callers that need the full result.
+    """
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        result = compact_result(func(*args, **kwargs), budget_tokens, store)
+        if isinstance(result, dict) and result.get("truncated"):
+            logger.info(f"Compacted result of {func.__name__} to {budget_tokens} tokens (artifact {result['artifact_id']})")
+        return result
+    wrapper.uncompacted = func
+    return wrapper
+
+class TranscriptCompactor:
+    """autogen message transform that bounds the history sent to the model on every round.
+
+    Keeps the first message (the migration task) and the most recent max_messages, replaces everything in between
+    with a one-line note, and cuts any single message to max_tokens_per_message.
+    """
+
+    def __init__(self, max_messages=20, max_tokens_per_message=1500):
+        self.max_messages = max_messages
+        self.max_tokens_per_message = max_tokens_per_message
+
+    def _truncate(self, message):
+        content = message.get("content")
+        limit = self.max_tokens_per_message * CHARS_PER_TOKEN
+        if isinstance(content, str) and len(content) > limit:
+            message = dict(message)
+            message["content"] = content[:limit] + f"\n... [truncated {len(content) - limit} chars]"
+        return message
+
+    def apply_transform(self, messages):
+        if len(messages) > self.max_messages + 1:
+            omitted = len(messages) - self.max_messages - 1
+            # Tool calls and their responses must stay paired, so the recent window never starts on a tool response.
+            start = len(messages) - self.max_messages
+            while start < len(messages) and messages[start].get("role") == "tool":
+                start += 1
+                omitted += 1
+            note = {"role": "user", "content": f"[{omitted} earlier messages omitted to save context; full tool results are in the artifact store]"}
+            messages = [messages[0], note] + messages[start:]
+        return [self._truncate(message) for message in messages]
+
+    def get_logs(self, pre_transform_messages, post_transform_messages):
+        before = sum(estimate_tokens(str(m.get("content", ""))) for m in pre_transform_messages)
+        after = sum(estimate_tokens(str(m.get("content", ""))) for m in post_transform_messages)
+        if after < before:
+            return f"Compacted transcript from ~{before} to ~{after} tokens ({len(post_transform_messages)} messages).", True
+        return "", False
@@ -0,0 +1,165 @@
+from google.api_core import exceptions as api_exceptions
+import asyncio
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+TERMINAL_STATES = {"COMPLETED", "FAILED", "STOPPED"}
+DEFAULT_MIN_INTERVAL = 2.0
+DEFAULT_MAX_INTERVAL = 60.0
+DEFAULT_BACKOFF = 1.5
+DEFAULT_MAX_CONCURRENT_REQUESTS = 10
+DEFAULT_MAX_POLL_RETRIES = 5
+# Poll failures worth waiting out; anything else ends the watch of that job.
+TRANSIENT_ERRORS = (api_exceptions.RetryError, api_exceptions.ServiceUnavailable, api_exceptions.DeadlineExceeded, TimeoutError)
+
+class DMSJobHandle:
+    """Live view of one watched migration job; await it to get the final result dict."""
+
+    def __init__(self, name, future):
+        self.name = name
+        self.job_id = name.rsplit("/", 1)[-1]
+        self.state = None
+        self.phase = None
+        self.progress = None
+        self.eta_seconds = None
+        self.polls = 0
+        self.poll_errors = 0
+        self.started_at = time.monotonic()
+        self._future = future
+
+    def __await__(self):
+        return self._future.__await__()
+
+    def done(self):
+        return self._future.done()
+
+    def snapshot(self):
+        return {
+            "job_id": self.job_id,
+            "state": self.state,
+            "phase": self.phase,
+            "progress": self.progress,
+            "eta_seconds": self.eta_seconds,
+            "elapsed_seconds": round(time.monotonic() - self.started_at, 1),
+            "polls": self.polls,
+            "poll_errors": self.poll_errors,
+        }
+
+class DMSJobMonitor:
+    """Polls many DMS migration jobs concurrently from one event loop with adaptive intervals.
+
+    Each job is polled every min_interval seconds after it starts or changes state/phase, and the interval grows by
+    backoff (up to max_interval) while nothing changes. progress_fn(job) may return the fraction done (0..1), which
+    drives the ETA and switches back to fast polling once the job is close to finishing. A poll failing with a
+    transient API error (timeout, 503) is retried with exponential backoff up to max_poll_retries times in a row.
+    """
+
+    def __init__(self, dms_client, min_interval=DEFAULT_MIN_INTERVAL, max_interval=DEFAULT_MAX_INTERVAL,
+                 backoff=DEFAULT_BACKOFF, progress_callback=None, progress_fn=None,
+                 max_concurrent_requests=DEFAULT_MAX_CONCURRENT_REQUESTS, max_poll_retries=DEFAULT_MAX_POLL_RETRIES):
+        self.dms_client = dms_client
+        self.min_interval = float(min_interval)
+        self.max_interval = float(max_interval)
+        self.backoff = float(backoff)
+        self.progress_callback = progress_callback
+        self.progress_fn = progress_fn
+        self.max_concurrent_requests = int(max_concurrent_requests)
+        self.max_poll_retries = int(max_poll_retries)
+        self._semaphore = None
+        self.handles = []
+
+    async def _get_job(self, name):
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrent_requests)
+        # The DMS client is synchronous; the semaphore caps how many threads poll the API at once.
+        async with self._semaphore:
+            return await asyncio.to_thread(self.dms_client.get_migration_job, name=name)
+
+    async def _poll(self, handle):
+        for attempt in range(self.max_poll_retries + 1):
+            try:
+                return await self._get_job(handle.name)
+            except TRANSIENT_ERRORS as e:
+                handle.poll_errors += 1
+                if attempt == self.max_poll_retries:
+                    raise
+                delay = min(self.min_interval * 2 ** attempt, self.max_interval)
+                logger.warning(f"Polling job {handle.job_id} failed (attempt {attempt + 1}/{self.max_poll_retries + 1}): {e}. "
+                               f"Retrying in {delay:g}s...")
+                await asyncio.sleep(delay)
+
+    async def _progress(self, job):
+        if self.progress_fn is None:
+            return None
+        try:
+            if asyncio.iscoroutinefunction(self.progress_fn):
+                return await self.progress_fn(job)
+            return await asyncio.to_thread(self.progress_fn, job)
+        except Exception as e:
+            logger.warning(f"Progress estimate for {job.name} failed: {e}")
+            return None
+
+    def _next_interval(self, handle, interval, changed):
+        if changed:
+            return self.min_interval
+        interval = min(interval * self.backoff, self.max_interval)
+        if handle.eta_seconds is not None:
+            # Close to the end, poll no later than the expected finish so completion is noticed promptly.
+            interval = max(min(interval, handle.eta_seconds), self.min_interval)
+        return interval
+
+    async def _watch(self, handle, stop_phases):
+        interval = self.min_interval
+        while True:
+            job = await self._poll(handle)
+            handle.polls += 1
+            state = job.state.name
+            phase = job.phase.name if getattr(job, "phase", None) is not None else None
+            changed = (state, phase) != (handle.state, handle.phase)
+            handle.state, handle.phase = state, phase
+            if changed:
+                logger.info(f"Job {handle.job_id} is now {state}" + (f" ({phase})" if phase else ""))
+
+            progress = await self._progress(job)
+            if progress is not None:
+                handle.progress = max(0.0, min(float(progress), 1.0))
+                elapsed = time.monotonic() - handle.started_at
+                handle.eta_seconds = round(elapsed * (1 - handle.progress) / handle.progress, 1) if handle.progress > 0 else None
+            if self.progress_callback:
+                self.progress_callback(handle.snapshot())
+
+            if state in TERMINAL_STATES or (phase is not None and phase in stop_phases):
+                result = handle.snapshot()
+                result["status"] = state
+                if state == "FAILED" and getattr(job, "error", None) is not None:
+                    result["error"] = job.error.message
+                logger.info(f"Job {handle.job_id} finished with state: {state} after {handle.polls} polls")
+                return result
+            interval = self._next_interval(handle, interval, changed)
+            await asyncio.sleep(interval)
+
+    def watch(self, name, stop_phases=()):
+        """Starts watching a job by its full resource name and returns an awaitable DMSJobHandle.
+
+        stop_phases lets a CONTINUOUS job count as done once it reaches e.g. the "CDC" phase.
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        handle = DMSJobHandle(name, future)
+
+        async def run():
+            try:
+                future.set_result(await self._watch(handle, set(stop_phases)))
+            except Exception as e:
+                future.set_exception(e)
+
+        handle._task = loop.create_task(run())
+        self.handles.append(handle)
+        return handle
+
+    async def wait_all(self, names, stop_phases=()):
+        """Watches every job concurrently and returns their results in the order given."""
+        handles = [self.watch(name, stop_phases) for name in names]
+        return await asyncio.gather(*(handle._future for handle in handles), return_exceptions=True)
@@ -0,0 +1,274 @@
+from autogen_migration.core.instrumentation import record_chunk
+from concurrent.futures import ThreadPoolExecutor
+import google_crc32c
+import threading
+import hashlib
+import logging
+import errno
+import base64
+import json
+import time
+import io
+import os
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PART_SIZE = 64 * 1024 * 1024
+DEFAULT_MAX_WORKERS = 8
+MAX_COMPOSE_SOURCES = 32 # GCS limit per compose request
+_CRC32C_POLY = 0x82F63B78 # reflected Castagnoli polynomial
+
+def _gf2_times(matrix, vector):
+    total, i = 0, 0
+    while vector:
+        if vector & 1:
+            total ^= matrix[i]
+        vector >>= 1
+        i += 1
+    return total
+
+def _gf2_square(matrix):
+    return [_gf2_times(matrix, row) for row in matrix]
+
+def crc32c_combine(crc1, crc2, length2):
+    """CRC32C of A+B from the CRCs of A and B and the length of B (zlib's crc32_combine for Castagnoli)."""
+    if length2 <= 0:
+        return crc1
+    odd = [_CRC32C_POLY] + [1 << n for n in range(31)] # operator for one zero bit
+    even = _gf2_square(odd) # two zero bits
+    odd = _gf2_square(even) # four zero bits
+    while True:
+        # Apply len2 zero bytes to crc1, one bit of the length at a time.
+        even = _gf2_square(odd)
+        if length2 & 1:
+            crc1 = _gf2_times(even, crc1)
+        length2 >>= 1
+        if not length2:
+            break
+        odd = _gf2_square(even)
+        if length2 & 1:
+            crc1 = _gf2_times(odd, crc1)
+        length2 >>= 1
+        if not length2:
+            break
+    return crc1 ^ crc2
+
+def crc32c_to_gcs(crc):
+    """The base64 big-endian form GCS reports in Blob.crc32c."""
+    return base64.b64encode(crc.to_bytes(4, "big")).decode("ascii")
+
+def crc32c_from_gcs(value):
+    return int.from_bytes(base64.b64decode(value), "big")
+
+def combine_part_crcs(parts):
+    """Whole-object CRC32C from [(crc, length), ...] in object order."""
+    crc = 0
+    for part_crc, length in parts:
+        crc = crc32c_combine(crc, part_crc, length)
+    return crc
+
+def _ranges(size, part_size):
+    return [(start, min(start + part_size, size)) for start in range(0, size, part_size)] or [(0, 0)]
+
+class _FileSlice(io.RawIOBase):
+    """Read-only view of [start, end) of a file, so each upload worker streams its slice without loading it."""
+
+    def __init__(self, path, start, end):
+        self._file = open(path, "rb")
+        self._start, self._end = start, end
+        self._file.seek(start)
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self._file.tell() - self._start
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        base = {io.SEEK_SET: 0, io.SEEK_CUR: self.tell(), io.SEEK_END: self._end - self._start}[whence]
+        self._file.seek(self._start + min(max(base + offset, 0), self._end - self._start))
+        return self.tell()
+
+    def read(self, size=-1):
+        remaining = self._end - self._file.tell()
+        size = remaining if size is None or size < 0 else min(size, remaining)
+        return self._file.read(size) if size > 0 else b""
+
+    def readinto(self, buffer):
+        data = self.read(len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
+
+    def close(self):
+        self._file.close()
+        super().close()
+
+class _TransferState:
+    """Finished parts of a transfer, kept in a JSON file next to the local file so an interrupted transfer resumes."""
+
+    def __init__(self, path, identity, load=True):
+        self.path = path
+        self.identity = identity
+        self.parts = {}
+        self._lock = threading.Lock()
+        if load and os.path.exists(path):
+            with open(path, "r") as f:
+                saved = json.load(f)
+            if saved.get("identity") == identity:
+                self.parts = {int(index): crc for index, crc in saved["parts"].items()}
+
+    def done(self, index, crc):
+        with self._lock:
+            self.parts[index] = crc
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, "w") as f:
+                json.dump({"identity": self.identity, "parts": self.parts}, f)
+                f.flush()
+                os.fsync(f.fileno()) # the rename must not land before the data, or a crash leaves an empty state file
+            os.replace(tmp_path, self.path)
+
+    def clear(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+def upload_file(client, bucket_name, source_file, blob_name, part_size=DEFAULT_PART_SIZE, max_workers=DEFAULT_MAX_WORKERS, resume=True):
+    """Uploads a file as concurrently uploaded slices composed server-side into one object.
+
+    Each slice is sent with a CRC32C check, and the composed object's CRC32C is compared with the combination of the
+    slice CRCs. Finished slices are remembered in <source_file>.gcsupload.json, so a rerun only sends what is missing.
+    """
+    started = time.monotonic()
+    bucket = client.bucket(bucket_name)
+    size = os.path.getsize(source_file)
+    ranges = _ranges(size, part_size)
+    if len(ranges) == 1:
+        blob = bucket.blob(blob_name)
+        blob.upload_from_filename(source_file, checksum="crc32c")
+        return _result(size, 1, 0, blob.crc32c, started)
+
+    identity = f"{blob_name}:{size}:{os.path.getmtime(source_file)}:{part_size}"
+    state = _TransferState(source_file + ".gcsupload.json", identity, resume)
+    prefix = f"{blob_name}.parts/{hashlib.sha256(identity.encode('utf-8')).hexdigest()[:12]}"
+
+    def upload_part(index):
+        part = bucket.blob(f"{prefix}/{index:05d}")
+        if index in state.parts:
+            existing = bucket.get_blob(part.name)
+            if existing is not None and existing.crc32c == state.parts[index]:
+                return existing, True
+        start, end = ranges[index]
+        part_started = time.monotonic()
+        with _FileSlice(source_file, start, end) as data:
+            part.upload_from_file(data, size=end - start, checksum="crc32c")
+        if not part.crc32c or part.size != end - start:
+            # Only a slice GCS has acknowledged in full may be skipped by a resumed upload.
+            raise IOError(f"Upload of {part.name} was not confirmed: {part.size} of {end - start} bytes, CRC32C {part.crc32c}")
+        state.done(index, part.crc32c)
+        record_chunk("gcs_upload", time.monotonic() - part_started)
+        return part, False
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        uploaded = list(executor.map(upload_part, range(len(ranges))))
+        parts, resumed = [part for part, _ in uploaded], sum(1 for _, reused in uploaded if reused)
+        expected = combine_part_crcs([(crc32c_from_gcs(p.crc32c), end - start) for p, (start, end) in zip(parts, ranges)])
+        sources, level, intermediates = parts, 0, []
+        while len(sources) > MAX_COMPOSE_SOURCES:
+            # Compose in rounds of up to 32 objects until one request can take them all.
+            groups = [sources[i:i + MAX_COMPOSE_SOURCES] for i in range(0, len(sources), MAX_COMPOSE_SOURCES)]
+
+            def compose_group(item):
+                i, group = item
+                target = bucket.blob(f"{prefix}/compose-{level}-{i:05d}")
+                target.compose(group)
+                return target
+
+            sources = list(executor.map(compose_group, enumerate(groups)))
+            intermediates.extend(sources)
+            level += 1
+        blob = bucket.blob(blob_name)
+        blob.compose(sources)
+        blob.reload()
+        # The slices are not needed once composed; a mismatch below means the whole upload is redone anyway.
+        executor.map(_delete_quietly, parts + intermediates)
+    if crc32c_from_gcs(blob.crc32c) != expected:
+        state.clear()
+        # Never leave a corrupt object where an import or download would pick it up.
+        try:
+            blob.delete()
+        except Exception as e:
+            logger.error(f"Could not delete corrupt object gs://{bucket_name}/{blob_name}: {e}")
+        raise IOError(f"CRC32C mismatch after composing gs://{bucket_name}/{blob_name}: {blob.crc32c} != {crc32c_to_gcs(expected)}")
+    state.clear()
+    logger.info(f"Uploaded {source_file} to gs://{bucket_name}/{blob_name} in {len(ranges)} parts ({resumed} resumed)")
+    return _result(size, len(ranges), resumed, blob.crc32c, started)
+
+def _delete_quietly(blob):
+    try:
+        blob.delete()
+    except Exception as e:
+        logger.debug(f"Could not delete temporary object {blob.name}: {e}")
+
+def download_file(client, bucket_name, blob_name, dest_file, part_size=DEFAULT_PART_SIZE, max_workers=DEFAULT_MAX_WORKERS, resume=True):
+    """Downloads an object with concurrent ranged GETs written in place into a preallocated file.
+
+    Ranges are pinned to the object's generation, each range's CRC32C is combined into the whole-object CRC32C and
+    checked against GCS before the file is renamed into place. Finished ranges are remembered in
+    <dest_file>.gcsdownload.json next to the partial <dest_file>.part, so a rerun fetches only the missing ranges.
+    """
+    started = time.monotonic()
+    blob = client.bucket(bucket_name).get_blob(blob_name)
+    if blob is None:
+        raise FileNotFoundError(f"gs://{bucket_name}/{blob_name} does not exist")
+    size = blob.size
+    ranges = _ranges(size, part_size)
+    tmp_path = dest_file + ".part"
+    state = _TransferState(dest_file + ".gcsdownload.json", f"{blob_name}:{blob.generation}:{size}:{part_size}",
+                           resume and os.path.exists(tmp_path))
+    resumed = sum(1 for index in state.parts if index < len(ranges))
+    fd = os.open(tmp_path, os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        os.ftruncate(fd, size)
+        if hasattr(os, "posix_fallocate") and size:
+            try:
+                os.posix_fallocate(fd, 0, size) # fail now rather than part-way if the disk is too small
+            except OSError as e:
+                if e.errno not in (errno.EOPNOTSUPP, errno.EINVAL): # not supported by this filesystem
+                    raise
+
+        def download_range(index):
+            if index in state.parts:
+                return
+            start, end = ranges[index]
+            part_started = time.monotonic()
+            data = blob.download_as_bytes(start=start, end=end - 1, generation=blob.generation, checksum=None) if end > start else b""
+            view, offset = memoryview(data), start
+            while view:
+                written = os.pwrite(fd, view, offset)
+                view, offset = view[written:], offset + written
+            os.fsync(fd) # on disk before it is recorded as done
+            state.done(index, google_crc32c.value(data))
+            record_chunk("gcs_download", time.monotonic() - part_started)
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            list(executor.map(download_range, range(len(ranges))))
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+    actual = combine_part_crcs([(state.parts[i], end - start) for i, (start, end) in enumerate(ranges)])
+    if blob.crc32c and actual != crc32c_from_gcs(blob.crc32c):
+        state.clear()
+        os.remove(tmp_path)
+        raise IOError(f"CRC32C mismatch downloading gs://{bucket_name}/{blob_name}: {crc32c_to_gcs(actual)} != {blob.crc32c}")
+    os.replace(tmp_path, dest_file)
+    state.clear()
+    logger.info(f"Downloaded gs://{bucket_name}/{blob_name} to {dest_file} in {len(ranges)} ranges ({resumed} resumed)")
+    return _result(size, len(ranges), resumed, blob.crc32c, started)
+
+def _result(size, parts, resumed, crc32c, started):
+    elapsed = time.monotonic() - started
+    return {"bytes": size, "parts": parts, "resumed_parts": resumed, "crc32c": crc32c, "elapsed_seconds": round(elapsed, 3),
+            "mb_per_second": round(size / 1e6 / elapsed, 1) if elapsed else None}
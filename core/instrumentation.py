@@ -0,0 +1,361 @@
+import functools
+import threading
+import logging
+import math
+import json
+import time
+import os
+
+logger = logging.getLogger(__name__)
+event_logger = logging.getLogger("autogen_migration.events")
+event_logger.propagate = False # events belong in the JSON log, not on the console
+
+DEFAULT_LOG_PATH = "logs/migration.log"
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800, 3600)
+LOG_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+# Result keys counted as rows and bytes processed by a tool function, looked up at the top level of its result first.
+ROW_KEYS = ("rows", "rows_copied", "rows_applied")
+BYTE_KEYS = ("bytes", "bytes_dumped", "bytes_imported", "bytes_downloaded")
+RETRYABLE_HTTP_STATUSES = {408, 429, 500, 502, 503, 504}
+
+class _Metric:
+    def __init__(self, name, help_text, kind):
+        self.name = name
+        self.help = help_text
+        self.kind = kind
+        self.values = {}
+
+class MetricsRegistry:
+    """In-process counters and histograms keyed by label sets, with a Prometheus text exposition dump."""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS, keep_samples=False):
+        self.buckets = tuple(buckets)
+        # With keep_samples, histograms also keep every observation so quantiles are exact (used by the benchmarks).
+        self.keep_samples = keep_samples
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _metric(self, name, help_text, kind):
+        metric = self._metrics.get(name)
+        if metric is None:
+            metric = self._metrics[name] = _Metric(name, help_text, kind)
+        return metric
+
+    def inc(self, name, value=1, help_text="", **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            values = self._metric(name, help_text, "counter").values
+            values[key] = values.get(key, 0) + value
+
+    def set(self, name, value, help_text="", **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._metric(name, help_text, "gauge").values[key] = value
+
+    def observe(self, name, value, help_text="", **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            values = self._metric(name, help_text, "histogram").values
+            state = values.get(key)
+            if state is None:
+                state = values[key] = {"buckets": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state["buckets"][i] += 1
+                    break
+            state["sum"] += value
+            state["count"] += 1
+            if self.keep_samples:
+                state.setdefault("samples", []).append(value)
+
+    def snapshot(self):
+        """Plain-dict copy of every metric: {name: {"kind", "help", "values": [(labels, value), ...]}}."""
+        with self._lock:
+            return {
+                metric.name: {"kind": metric.kind, "help": metric.help, "values": [
+                    (dict(key), {**value, "buckets": list(value["buckets"]), "samples": list(value.get("samples", ()))}
+                     if metric.kind == "histogram" else value)
+                    for key, value in metric.values.items()
+                ]}
+                for metric in self._metrics.values()
+            }
+
+    def prometheus_text(self):
+        lines = []
+        for name, metric in sorted(self.snapshot().items()):
+            if metric["help"]:
+                lines.append(f"# HELP {name} {metric['help']}")
+            lines.append(f"# TYPE {name} {metric['kind']}")
+            for labels, value in metric["values"]:
+                if metric["kind"] in ("counter", "gauge"):
+                    lines.append(f"{name}{_labels(labels)} {_number(value)}")
+                    continue
+                cumulative = 0
+                for bound, count in zip(self.buckets, value["buckets"]):
+                    cumulative += count
+                    lines.append(f"{name}_bucket{_labels({**labels, 'le': _number(bound)})} {cumulative}")
+                lines.append(f"{name}_bucket{_labels({**labels, 'le': '+Inf'})} {value['count']}")
+                lines.append(f"{name}_sum{_labels(labels)} {_number(value['sum'])}")
+                lines.append(f"{name}_count{_labels(labels)} {value['count']}")
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path):
+        """Writes the text exposition to path (e.g. for node_exporter's textfile collector), replacing it atomically."""
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w") as f:
+            f.write(self.prometheus_text())
+        os.replace(tmp_path, path)
+
+    def seconds_by(self, name, label):
+        """Total observed seconds of a histogram grouped by one label, e.g. time spent per external service."""
+        totals = {}
+        for labels, value in self.snapshot().get(name, {"values": []})["values"]:
+            totals[labels.get(label)] = totals.get(labels.get(label), 0) + value["sum"]
+        return {key: round(seconds, 3) for key, seconds in sorted(totals.items(), key=lambda item: -item[1])}
+
+    def quantile(self, name, q, **labels):
+        """The q-quantile of a histogram over every label set matching labels; exact from samples, else interpolated
+        within buckets like PromQL's histogram_quantile. None when nothing was observed."""
+        matching = [value for key, value in self.snapshot().get(name, {"values": []})["values"]
+                    if all(key.get(label) == wanted for label, wanted in labels.items())]
+        count = sum(value["count"] for value in matching)
+        if not count:
+            return None
+        samples = sorted(sample for value in matching for sample in value["samples"])
+        if len(samples) == count:
+            return samples[min(count - 1, max(0, math.ceil(q * count) - 1))] # nearest rank
+        buckets = [sum(value["buckets"][i] for value in matching) for i in range(len(self.buckets))]
+        rank, cumulative, lower = q * count, 0, 0.0
+        for bound, bucket_count in zip(self.buckets, buckets):
+            if bucket_count and cumulative + bucket_count >= rank:
+                return lower + (bound - lower) * (rank - cumulative) / bucket_count
+            cumulative += bucket_count
+            lower = bound
+        return self.buckets[-1] # in the +Inf bucket
+
+    def reset(self):
+        with self._lock:
+            self._metrics.clear()
+
+def _labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in sorted(labels.items())) + "}"
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+REGISTRY = MetricsRegistry()
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line; structured events carry their fields next to the message."""
+
+    def format(self, record):
+        entry = {"ts": round(record.created, 3), "level": record.levelname, "logger": record.name, "message": record.getMessage()}
+        entry.update(getattr(record, "event_fields", {}))
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+_configured = []
+
+def configure_logging(path=DEFAULT_LOG_PATH, level=logging.INFO):
+    """Sends log records to the console as text and to path as JSON lines; structured events go to the file only."""
+    if _configured:
+        return
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    console = logging.StreamHandler()
+    console.setFormatter(logging.Formatter(LOG_FORMAT))
+    file_handler = logging.FileHandler(path)
+    file_handler.setFormatter(JsonFormatter())
+    root = logging.getLogger()
+    root.setLevel(level)
+    root.addHandler(console)
+    root.addHandler(file_handler)
+    event_logger.setLevel(logging.INFO)
+    event_logger.addHandler(file_handler)
+    _configured.append(path)
+
+def emit_event(event, **fields):
+    """Writes a structured event (tool_call, api_call, llm_round, ...) to the JSON log."""
+    event_logger.info(event, extra={"event_fields": {"event": event, **fields}})
+
+def _measure(result, keys):
+    """Sums the first matching keys of a result dict, descending into nested lists of dicts when the top has none."""
+    if isinstance(result, dict):
+        found = [result[key] for key in keys if isinstance(result.get(key), (int, float)) and not isinstance(result.get(key), bool)]
+        if found:
+            return found[0]
+        return sum(_measure(value, keys) for value in result.values() if isinstance(value, (dict, list)))
+    if isinstance(result, list):
+        return sum(_measure(item, keys) for item in result if isinstance(item, (dict, list)))
+    return 0
+
+def instrumented(agent_name, function_name, func, registry=REGISTRY):
+    """Wraps an agent function to record its duration, outcome and rows/bytes processed."""
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        started = time.monotonic()
+        status, result, error = "exception", None, None
+        try:
+            result = func(*args, **kwargs)
+            status = result.get("status", "success") if isinstance(result, dict) else "success"
+            return result
+        except Exception as e:
+            error = str(e)
+            raise
+        finally:
+            seconds = time.monotonic() - started
+            labels = {"agent": agent_name, "function": function_name}
+            registry.observe("migration_tool_call_seconds", seconds, "Duration of agent tool function calls", **labels, status=status)
+            rows, size = _measure(result, ROW_KEYS), _measure(result, BYTE_KEYS)
+            if rows:
+                registry.inc("migration_rows_total", rows, "Rows processed by agent tool functions", **labels)
+            if size:
+                registry.inc("migration_bytes_total", size, "Bytes processed by agent tool functions", **labels)
+            emit_event("tool_call", **labels, status=status, seconds=round(seconds, 3), rows=rows, bytes=size, error=error)
+    return wrapper
+
+def instrument_agent(agent, registry=REGISTRY):
+    """Re-registers every function of an agent wrapped by instrumented(), and counts its LLM rounds and tokens."""
+    agent.register_function(function_map={
+        name: instrumented(agent.name, name, func, registry) for name, func in agent.function_map.items()
+    })
+    instrument_llm_client(agent, registry)
+
+def record_api_call(service, method, seconds, outcome="ok", registry=REGISTRY, event=True):
+    registry.inc("migration_api_calls_total", 1, "Calls to external services", service=service, method=method, outcome=outcome)
+    registry.observe("migration_api_call_seconds", seconds, "Duration of calls to external services", service=service, method=method)
+    if event:
+        emit_event("api_call", service=service, method=method, outcome=outcome, seconds=round(seconds, 3))
+
+def record_chunk(operation, seconds, rows=0, registry=REGISTRY):
+    """Records one unit of chunked work: a copied, diffed, checksummed, exported or loaded key range."""
+    registry.observe("migration_chunk_seconds", seconds, "Duration of chunked work per operation", operation=operation)
+    if rows:
+        registry.inc("migration_chunk_rows_total", rows, "Rows handled by chunked work", operation=operation)
+
+def record_replication_lag(database, seconds, registry=REGISTRY):
+    """Records how far CDC apply trails the source binlog, by the timestamp of the last applied event."""
+    registry.set("migration_replication_lag_seconds", seconds, "Seconds the target trails the source binlog", database=database)
+
+def record_mysql_checkout(endpoint, wait_seconds, held_seconds, broken=False, registry=REGISTRY):
+    """Records a pooled MySQL connection's checkout: time spent waiting for it and time it was held for queries."""
+    registry.observe("migration_mysql_pool_wait_seconds", wait_seconds, "Time spent waiting for a pooled MySQL connection", endpoint=endpoint)
+    # Checkouts are too frequent for one event each; they only feed the metrics.
+    record_api_call("mysql", "connection", held_seconds, "error" if broken else "ok", registry, event=False)
+
+def record_retry(service, operation, attempt, error=None, registry=REGISTRY):
+    registry.inc("migration_retries_total", 1, "Retried calls to external services", service=service, operation=operation)
+    emit_event("retry", service=service, operation=operation, attempt=attempt, error=str(error) if error else None)
+
+def _usage(response):
+    usage = getattr(response, "usage", None)
+    if usage is None:
+        return 0, 0
+    return getattr(usage, "prompt_tokens", 0) or 0, getattr(usage, "completion_tokens", 0) or 0
+
+def _actual_usage(client):
+    """Tokens an autogen client actually paid for so far (its usage summary leaves out cache hits), or None."""
+    summary = getattr(client, "actual_usage_summary", None)
+    if not isinstance(summary, dict):
+        return None
+    models = [usage for usage in summary.values() if isinstance(usage, dict)]
+    return sum(u.get("prompt_tokens", 0) for u in models), sum(u.get("completion_tokens", 0) for u in models)
+
+def instrument_llm_client(agent, registry=REGISTRY):
+    """Counts each completion request of an agent's LLM client as one round, with its duration and token usage."""
+    client = getattr(agent, "client", None)
+    if client is None or getattr(client.create, "instrumented", False):
+        return
+    create = client.create
+
+    @functools.wraps(create)
+    def timed_create(*args, **kwargs):
+        started = time.monotonic()
+        before = _actual_usage(client)
+        outcome = "error"
+        try:
+            response = create(*args, **kwargs)
+            outcome = "ok"
+        finally:
+            seconds = time.monotonic() - started
+            registry.observe("migration_llm_round_seconds", seconds, "Duration of LLM completion requests", agent=agent.name)
+            record_api_call("llm", "create", seconds, outcome, registry)
+        prompt_tokens, completion_tokens = _usage(response)
+        after = _actual_usage(client)
+        if before is not None and after is not None:
+            # Responses served from the LLM cache still carry the original usage, but cost no tokens now.
+            paid_prompt, paid_completion = after[0] - before[0], after[1] - before[1]
+        else:
+            paid_prompt, paid_completion = prompt_tokens, completion_tokens
+        cached = not (paid_prompt or paid_completion) and bool(prompt_tokens or completion_tokens)
+        registry.inc("migration_llm_rounds_total", 1, "LLM completion requests", agent=agent.name, cached=str(cached).lower())
+        registry.inc("migration_llm_tokens_total", paid_prompt, "LLM tokens used", agent=agent.name, kind="prompt")
+        registry.inc("migration_llm_tokens_total", paid_completion, "LLM tokens used", agent=agent.name, kind="completion")
+        emit_event("llm_round", agent=agent.name, seconds=round(seconds, 3), prompt_tokens=prompt_tokens,
+                   completion_tokens=completion_tokens, cached=cached)
+        return response
+
+    timed_create.instrumented = True
+    client.create = timed_create
+
+_LOCAL_ATTRIBUTES = (str, bytes, int, float, bool, type(None), dict, list, tuple)
+
+class InstrumentedClient:
+    """Proxy for a GAPIC or discovery client that records every API method call under one service name."""
+
+    def __init__(self, service, client, path=""):
+        self._service = service
+        self._client = client
+        self._path = path
+
+    def __getattr__(self, name):
+        value = getattr(self._client, name)
+        path = f"{self._path}.{name}" if self._path else name
+        if name.startswith("_") or name.endswith("_path") or name.startswith(("parse_", "common_")) or isinstance(value, _LOCAL_ATTRIBUTES):
+            return value # resource path helpers and plain attributes make no API call
+        if not callable(value):
+            return InstrumentedClient(self._service, value, path) # e.g. sql_client.instances.insert
+
+        @functools.wraps(value)
+        def call(*args, **kwargs):
+            started = time.monotonic()
+            outcome = "error"
+            try:
+                result = value(*args, **kwargs)
+                outcome = "ok"
+                return result
+            finally:
+                record_api_call(self._service, path, time.monotonic() - started, outcome)
+        return call
+
+def instrument_http_session(service, session, registry=REGISTRY):
+    """Records every HTTP response of a requests session (e.g. the Cloud Storage client's), retried attempts included."""
+    def on_response(response, *args, **kwargs):
+        outcome = "ok" if response.status_code < 400 else str(response.status_code)
+        record_api_call(service, response.request.method, response.elapsed.total_seconds(), outcome, registry)
+        if response.status_code in RETRYABLE_HTTP_STATUSES:
+            record_retry(service, response.request.method, None, f"HTTP {response.status_code}", registry)
+        return response
+    session.hooks.setdefault("response", []).append(on_response)
+
+SERVICE_NAMES = {"sql_admin": "cloudsql", "storage": "gcs", "monitoring": "monitoring", "logging": "logging", "dms": "dms"}
+
+def instrument_client(kind, client, registry=REGISTRY):
+    """Returns a shared GCP client whose API calls are recorded; Storage is hooked at its HTTP session instead."""
+    service = SERVICE_NAMES.get(kind, kind)
+    if kind == "storage":
+        session = getattr(client, "_http", None)
+        if hasattr(session, "hooks"):
+            instrument_http_session(service, session, registry)
+        return client
+    return InstrumentedClient(service, client)
@@ -1,18 +1,32 @@
 from autogen import AssistantAgent, UserProxyAgent, GroupChat, GroupChatManager
+from autogen.agentchat.contrib.capabilities import transform_messages
 from autogen_migration.agents.environment_setup_agent import EnvironmentSetupAgent
 from autogen_migration.agents.schema_conversion_agent import SchemaConversionAgent
 from autogen_migration.agents.data_migration_agent import DataMigrationAgent
 from autogen_migration.agents.data_validation_agent import DataValidationAgent
 from autogen_migration.agents.anomaly_detection_agent import AnomalyDetectionAgent
 from autogen_migration.agents.performance_optimization_agent import PerformanceOptimizationAgent
+from autogen_migration.core.journal import MigrationJournal, CHECKPOINTED_STEPS
+from autogen_migration.core.llm_cache import LLMResponseCache
+from autogen_migration.core.compaction import ArtifactStore, TranscriptCompactor, compacting
+from autogen_migration.core.pipeline import PipelineStep, PipelineExecutor
+from autogen_migration.core.scheduler import MigrationScheduler, TableStage, TableTask, discover_tables
+from autogen_migration.core.utils import mysql_connection
+from autogen_migration.core.instrumentation import REGISTRY, configure_logging, instrument_agent, instrument_llm_client
 from autogen_migration.config.settings import Config
 import logging
 
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+configure_logging(Config.MIGRATION_LOG_PATH)
 logger = logging.getLogger(__name__)
 
 class MigrationOrchestrator:
-    def __init__(self):
+    def __init__(self, resume=False):
+        self.journal = MigrationJournal(Config.MIGRATION_JOURNAL_PATH)
+        self.journal.start_run(resume=resume)
+        self.llm_cache = LLMResponseCache(
+            Config.LLM_CACHE_PATH, mode=Config.LLM_CACHE_MODE, ttl=Config.LLM_CACHE_TTL,
+            max_entries=Config.LLM_CACHE_MAX_ENTRIES, namespace=Config.LLM_CONFIG["model"],
+        )
         self.user_proxy = UserProxyAgent(
             name="Admin",
             system_message="A human admin. Interact with the agents to ensure the migration is successful. Provide feedback and approve steps.",
@@ -20,12 +34,12 @@ class MigrationOrchestrator:
             human_input_mode="ALWAYS", # Or "TERMINATE" for full automation
         )
 
-        self.env_agent = EnvironmentSetupAgent(name="EnvironmentSetupAgent", llm_config={"config_list": [{"model": Config.LLM_CONFIG["model"], "api_key": Config.LLM_CONFIG["api_key"]}]})
-        self.schema_agent = SchemaConversionAgent(name="SchemaConversionAgent", llm_config={"config_list": [{"model": Config.LLM_CONFIG["model"], "api_key": Config.LLM_CONFIG["api_key"]}]})
-        self.data_agent = DataMigrationAgent(name="DataMigrationAgent", llm_config={"config_list": [{"model": Config.LLM_CONFIG["model"], "api_key": Config.LLM_CONFIG["api_key"]}]})
-        self.validation_agent = DataValidationAgent(name="DataValidationAgent", llm_config={"config_list": [{"model": Config.LLM_CONFIG["model"], "api_key": Config.LLM_CONFIG["api_key"]}]})
-        self.anomaly_agent = AnomalyDetectionAgent(name="AnomalyDetectionAgent", llm_config={"config_list": [{"model": Config.LLM_CONFIG["model"], "api_key": Config.LLM_CONFIG["api_key"]}]})
-        self.perf_agent = PerformanceOptimizationAgent(name="PerformanceOptimizationAgent", llm_config={"config_list": [{"model": Config.LLM_CONFIG["model"], "api_key": Config.LLM_CONFIG["api_key"]}]})
+        self.env_agent = EnvironmentSetupAgent(name="EnvironmentSetupAgent", llm_config=self._llm_config())
+        self.schema_agent = SchemaConversionAgent(name="SchemaConversionAgent", llm_config=self._llm_config())
+        self.data_agent = DataMigrationAgent(name="DataMigrationAgent", llm_config=self._llm_config(), journal=self.journal)
+        self.validation_agent = DataValidationAgent(name="DataValidationAgent", llm_config=self._llm_config())
+        self.anomaly_agent = AnomalyDetectionAgent(name="AnomalyDetectionAgent", llm_config=self._llm_config())
+        self.perf_agent = PerformanceOptimizationAgent(name="PerformanceOptimizationAgent", llm_config=self._llm_config())
 
         self.groupchat = GroupChat(
             agents=[
@@ -37,25 +51,234 @@ class MigrationOrchestrator:
                 self.anomaly_agent,
                 self.perf_agent,
             ],
-            messages=,
+            messages=[],
             max_round=50,
             speaker_selection_method="auto",
             allow_repeat_speaker=False,
+            # Speaker selection sends the whole transcript to the model each round; it gets the same bound as the agents.
+            select_speaker_transform_messages=self._transcript_transforms(),
         )
-        self.manager = GroupChatManager(groupchat=self.groupchat, llm_config={"config_list": [{"model": Config.LLM_CONFIG["model"], "api_key": Config.LLM_CONFIG["api_key"]}]})
+        for agent in self.groupchat.agents[1:]:
+            # Innermost wrapper: only real work is timed, not results replayed from the journal.
+            instrument_agent(agent)
+        for agent in self.groupchat.agents[1:]:
+            # Journal finished steps so a --resume run replays their results instead of redoing the work.
+            agent.register_function(function_map={
+                name: self.journal.checkpointed(name, func)
+                for name, func in agent.function_map.items() if name in CHECKPOINTED_STEPS
+            })
+        self.artifacts = ArtifactStore(Config.ARTIFACT_DIR)
+        for agent in self.groupchat.agents[1:]:
+            # Large results go to the artifact store; the GroupChat only sees a summary within the token budget.
+            agent.register_function(function_map={
+                name: compacting(func, Config.TOOL_RESULT_TOKEN_BUDGET, self.artifacts)
+                for name, func in agent.function_map.items()
+            })
+            self._transcript_transforms().add_to_agent(agent)
+        self.manager = GroupChatManager(groupchat=self.groupchat, llm_config=self._llm_config())
+        self._transcript_transforms().add_to_agent(self.manager)
+        instrument_llm_client(self.manager)
+        for agent in self.groupchat.agents + [self.manager]:
+            # Every LLM call, including failure advice outside the chat, goes through the shared response cache.
+            agent.client_cache = self.llm_cache
+
+    def _transcript_transforms(self):
+        """Message transforms that keep the history sent to the model within the configured transcript budget."""
+        return transform_messages.TransformMessages(transforms=[
+            TranscriptCompactor(Config.TRANSCRIPT_MAX_MESSAGES, Config.TRANSCRIPT_MAX_TOKENS_PER_MESSAGE),
+        ])
+
+    def _llm_config(self):
+        # cache_seed=None turns off autogen's own disk cache; LLMResponseCache takes its place.
+        llm_config = {"config_list": [{"model": Config.LLM_CONFIG["model"], "api_key": Config.LLM_CONFIG["api_key"]}], "cache_seed": None}
+        if Config.LLM_CACHE_MODE == "deterministic":
+            llm_config["temperature"] = 0
+        return llm_config
 
     def run_migration(self):
         logger.info("Starting automated database migration process...")
         self.user_proxy.initiate_chat(
             self.manager,
+            cache=self.llm_cache,
             message=f"""
             Automate the migration of a legacy MySQL database '{Config.LEGACY_MYSQL_DB}'
             on host '{Config.LEGACY_MYSQL_HOST}' to GCP Cloud SQL for MySQL.
             The target Cloud SQL instance ID should be '{Config.CLOUD_SQL_INSTANCE_ID}'.
-            The migration should include both schema and data for the 'employees' table.
+            The migration should include both schema and data for every table in the database.
             After migration, validate data integrity, monitor for anomalies, and suggest performance optimizations.
             Use the provided sample employee dataset for implementation.
             Ensure all GCP best practices are followed, especially regarding private IP and secure credential management.
-            Proceed with a one-time migration first, then discuss how CDC would be implemented.
+            Proceed with a one-time migration first, then run CDC replication from the recorded binlog position until the target has caught up.
             """
         )
+        logger.info(f"LLM response cache: {self.llm_cache.summary()}")
+        self._report_metrics()
+        self.journal.finish_run()
+
+    def _db_configs(self):
+        legacy_db_config = {
+            "host": Config.LEGACY_MYSQL_HOST, "port": Config.LEGACY_MYSQL_PORT,
+            "user": Config.LEGACY_MYSQL_USER, "password": Config.LEGACY_MYSQL_PASSWORD, "db": Config.LEGACY_MYSQL_DB,
+        }
+        cloud_sql_config = {
+            "host": Config.CLOUD_SQL_HOST, "port": 3306,
+            "user": Config.CLOUD_SQL_USER, "password": Config.CLOUD_SQL_ROOT_PASSWORD, "db": Config.CLOUD_SQL_DB_NAME,
+        }
+        return legacy_db_config, cloud_sql_config
+
+    def _report_metrics(self):
+        """Dumps the metrics registry in Prometheus text format and logs where the run spent its time."""
+        REGISTRY.write_prometheus(Config.METRICS_PATH)
+        logger.info(f"Time in external services (s): {REGISTRY.seconds_by('migration_api_call_seconds', 'service')}")
+        logger.info(f"Time in agent functions (s): {REGISTRY.seconds_by('migration_tool_call_seconds', 'function')}")
+        logger.info(f"Metrics written to {Config.METRICS_PATH}")
+
+    def _function(self, agent, name):
+        """An agent's registered (journaled) function without result compaction, for code that reads its full result."""
+        func = agent.function_map[name]
+        return getattr(func, "uncompacted", func)
+
+    def _pipeline_steps(self, table_name="employees"):
+        """Builds the standard migration DAG from the agents' registered (and journaled) functions."""
+        legacy, cloud_sql = self._db_configs()
+        project, region, instance = Config.PROJECT_ID, Config.REGION, Config.CLOUD_SQL_INSTANCE_ID
+        validation = {"legacy_db_config": legacy, "cloud_sql_config": cloud_sql, "table_name": table_name}
+
+        def step(agent, name, depends_on=(), kwargs=None):
+            return PipelineStep(name, self._function(agent, name), depends_on, kwargs, agent=agent)
+
+        instance_kwargs = {
+            "project_id": project, "instance_id": instance, "region": region,
+            "machine_type": Config.CLOUD_SQL_MACHINE_TYPE, "storage_gb": Config.CLOUD_SQL_STORAGE_GB,
+            "root_password": Config.CLOUD_SQL_ROOT_PASSWORD,
+        }
+        if Config.CLOUD_SQL_AUTO_SIZE:
+            sizing = [step(self.perf_agent, "recommend_target_sizing", kwargs={"legacy_db_config": legacy, "databases": [legacy["db"]]})]
+
+            def sized_instance(r):
+                recommendation = r["recommend_target_sizing"]["recommendation"]
+                return {**instance_kwargs, "machine_type": recommendation["tier"], "storage_gb": recommendation["disk_size_gb"],
+                        "disk_type": recommendation["disk_type"], "database_flags": recommendation["database_flags"]}
+
+            create_instance = step(self.env_agent, "create_cloud_sql_instance", ["recommend_target_sizing"], sized_instance)
+        else:
+            sizing, create_instance = [], step(self.env_agent, "create_cloud_sql_instance", kwargs=instance_kwargs)
+
+        return sizing + [
+            create_instance,
+            step(self.env_agent, "create_gcs_bucket", kwargs={
+                "project_id": project, "bucket_name": Config.GCS_BUCKET_NAME, "region": region,
+            }),
+            step(self.schema_agent, "export_legacy_schema", kwargs={
+                "host": legacy["host"], "port": legacy["port"], "user": legacy["user"],
+                "password": legacy["password"], "db_name": legacy["db"],
+            }),
+            step(self.schema_agent, "analyze_and_convert_schema", ["export_legacy_schema"],
+                 lambda r: {"schema_file_path": r["export_legacy_schema"]["schema_file"]}),
+            step(self.schema_agent, "apply_cloud_sql_schema", ["create_cloud_sql_instance", "analyze_and_convert_schema"],
+                 lambda r: {"host": cloud_sql["host"], "port": cloud_sql["port"], "user": cloud_sql["user"],
+                            "password": cloud_sql["password"], "db_name": cloud_sql["db"],
+                            "schema_file_path": r["analyze_and_convert_schema"]["converted_schema_file"],
+                            "defer_indexes": Config.DEFER_SECONDARY_INDEXES}),
+            step(self.data_agent, "create_dms_connection_profile", kwargs={
+                "project_id": project, "region": region, "profile_id": Config.DMS_SOURCE_PROFILE_ID,
+                "host": legacy["host"], "port": legacy["port"], "user": legacy["user"], "password": legacy["password"],
+            }),
+            step(self.data_agent, "create_dms_migration_job", ["create_dms_connection_profile", "apply_cloud_sql_schema"], {
+                "project_id": project, "region": region, "job_id": Config.DMS_MIGRATION_JOB_ID,
+                "source_profile_id": Config.DMS_SOURCE_PROFILE_ID, "dest_instance_id": instance,
+            }),
+            step(self.data_agent, "start_dms_migration_job", ["create_dms_migration_job"], {
+                "project_id": project, "region": region, "job_id": Config.DMS_MIGRATION_JOB_ID,
+            }),
+            step(self.data_agent, "monitor_dms_job", ["start_dms_migration_job"], {
+                "project_id": project, "region": region, "job_id": Config.DMS_MIGRATION_JOB_ID,
+            }),
+            step(self.schema_agent, "build_deferred_indexes", ["apply_cloud_sql_schema", "monitor_dms_job"],
+                 lambda r: {"host": cloud_sql["host"], "port": cloud_sql["port"], "user": cloud_sql["user"],
+                            "password": cloud_sql["password"], "db_name": cloud_sql["db"],
+                            "post_load_file": r["apply_cloud_sql_schema"].get("post_load_file")}),
+            step(self.validation_agent, "compare_row_counts", ["monitor_dms_job"], validation),
+            step(self.validation_agent, "range_checksum_comparison", ["monitor_dms_job"], validation),
+            step(self.anomaly_agent, "monitor_cloud_sql_health", ["monitor_dms_job"], {"project_id": project, "instance_id": instance}),
+            step(self.anomaly_agent, "analyze_logs_for_errors", ["monitor_dms_job"], {"project_id": project, "instance_id": instance}),
+            step(self.perf_agent, "analyze_performance_metrics", ["build_deferred_indexes"], {"project_id": project, "instance_id": instance}),
+            step(self.perf_agent, "recommend_optimizations", ["analyze_performance_metrics"],
+                 lambda r: {"performance_report": r["analyze_performance_metrics"]["report"]}),
+        ]
+
+    def _advise_on_failure(self, step, outcome):
+        """Falls back to the step's LLM agent only when a deterministic step fails."""
+        if step.agent is None:
+            return None
+        prompt = (f"The migration step '{step.name}' failed with: {outcome.get('error') or outcome.get('result')}. "
+                  f"Suggest the most likely cause and how to fix it before the step is retried.")
+        try:
+            advice = step.agent.generate_reply(messages=[{"role": "user", "content": prompt}])
+        except Exception as e:
+            logger.warning(f"Could not get LLM advice for failed step {step.name}: {e}")
+            return None
+        logger.info(f"LLM advice for {step.name}: {advice}")
+        return advice
+
+    def run_pipeline(self, table_name="employees"):
+        """Runs the known migration steps directly as a DAG, bypassing GroupChat speaker selection."""
+        logger.info("Starting deterministic migration pipeline...")
+        executor = PipelineExecutor(
+            self._pipeline_steps(table_name), max_workers=Config.PIPELINE_MAX_WORKERS, on_failure=self._advise_on_failure
+        )
+        outcomes = executor.run()
+        logger.info(f"LLM response cache: {self.llm_cache.summary()}")
+        self._report_metrics()
+        failed = [name for name, outcome in outcomes.items() if outcome["status"] != "succeeded"]
+        if failed:
+            logger.warning(f"Migration pipeline finished with unsuccessful steps: {', '.join(failed)}")
+            self.journal.finish_run(status="failed")
+        else:
+            logger.info("Migration pipeline completed successfully.")
+            self.journal.finish_run()
+        return outcomes
+
+    def _table_tasks(self, databases):
+        """Discovers every table of the given legacy databases, each paired with its Cloud SQL target database."""
+        legacy, cloud_sql = self._db_configs()
+        tasks = []
+        for db_name in databases:
+            source = {**legacy, "db": db_name}
+            # A single database keeps the configured target name; several databases keep their own names.
+            target = {**cloud_sql, "db": cloud_sql["db"] if len(databases) == 1 else db_name}
+            with mysql_connection(**{**cloud_sql, "db": None}) as conn:
+                with conn.cursor() as cursor:
+                    cursor.execute(f"CREATE DATABASE IF NOT EXISTS `{target['db']}`")
+            with mysql_connection(**source) as conn:
+                tables = discover_tables(conn, db_name)
+            logger.info(f"Discovered {len(tables)} tables in {db_name} ({sum(t['bytes'] for t in tables)} bytes)")
+            tasks.extend(TableTask(db_name, t["table"], t["bytes"], t["rows"], source, target) for t in tables)
+        return tasks
+
+    def run_scheduled(self, databases=None):
+        """Migrates every table of every configured database: schema, copy and validation, largest tables first."""
+        databases = databases or Config.LEGACY_MYSQL_DBS
+        logger.info(f"Starting scheduled migration of {len(databases)} database(s)...")
+
+        def args(task):
+            return {"legacy_db_config": task.source_config, "cloud_sql_config": task.target_config}
+
+        defer = Config.DEFER_SECONDARY_INDEXES
+        stages = [
+            TableStage("schema", lambda task: self._function(self.schema_agent, "copy_table_schema")(**args(task), table_name=task.table, defer_indexes=defer)),
+            TableStage("copy", lambda task: self._function(self.data_agent, "bulk_copy_tables")(**args(task), tables=[task.table])),
+            TableStage("validate", lambda task: self._function(self.validation_agent, "range_checksum_comparison")(**args(task), table_name=task.table)),
+        ]
+        if defer:
+            # Each table's secondary indexes are built right after its copy, overlapping other tables' copies.
+            stages.insert(2, TableStage("indexes", lambda task: self._function(self.schema_agent, "build_table_indexes")(**args(task), table_name=task.table)))
+        scheduler = MigrationScheduler(
+            stages, max_workers=Config.SCHEDULER_MAX_WORKERS,
+            source_concurrency=Config.SCHEDULER_SOURCE_CONCURRENCY, target_concurrency=Config.SCHEDULER_TARGET_CONCURRENCY,
+        )
+        result = scheduler.run(self._table_tasks(databases))
+        logger.info(f"Scheduled migration finished in {result['elapsed_seconds']}s")
+        self._report_metrics()
+        self.journal.finish_run(status="completed" if result["status"] == "success" else "failed")
+        return result
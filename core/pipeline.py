@@ -0,0 +1,96 @@
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+# Result statuses returned by agent functions that mean the step did not achieve its goal.
+FAILED_STATUSES = {"error", "failure", "FAILED", "STOPPED"}
+
+class PipelineStep:
+    """One node of the migration DAG: an agent function, the steps it waits for, and how to build its arguments."""
+
+    def __init__(self, name, func, depends_on=(), kwargs=None, agent=None):
+        self.name = name
+        self.func = func
+        self.depends_on = tuple(depends_on)
+        # kwargs is either a dict or a callable taking the results of finished steps and returning a dict.
+        self.kwargs = kwargs or {}
+        self.agent = agent
+
+    def build_kwargs(self, results):
+        return self.kwargs(results) if callable(self.kwargs) else dict(self.kwargs)
+
+class PipelineExecutor:
+    """Runs PipelineSteps as a DAG without the LLM, starting every step as soon as its dependencies succeed."""
+
+    def __init__(self, steps, max_workers=4, on_failure=None):
+        self.steps = {step.name: step for step in steps}
+        self.max_workers = max_workers
+        self.on_failure = on_failure
+        self._check_graph()
+
+    def _check_graph(self):
+        for step in self.steps.values():
+            unknown = [dep for dep in step.depends_on if dep not in self.steps]
+            if unknown:
+                raise ValueError(f"Step {step.name} depends on unknown steps: {', '.join(unknown)}")
+        visiting, done = set(), set()
+
+        def visit(name):
+            if name in done:
+                return
+            if name in visiting:
+                raise ValueError(f"Pipeline has a dependency cycle through step {name}")
+            visiting.add(name)
+            for dep in self.steps[name].depends_on:
+                visit(dep)
+            visiting.discard(name)
+            done.add(name)
+
+        for name in self.steps:
+            visit(name)
+
+    def _run_step(self, step, results):
+        start = time.time()
+        # Arguments are built here so an error in a kwargs callable fails this step instead of the whole run.
+        result = step.func(**step.build_kwargs(results))
+        return result, time.time() - start
+
+    def run(self):
+        """Executes the DAG and returns {step_name: {"status", "result", "elapsed_seconds"}} for every step."""
+        outcomes, results = {}, {}
+        pending = dict(self.steps)
+        running = {}
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="pipeline") as executor:
+            while pending or running:
+                for name, step in list(pending.items()):
+                    dep_states = [outcomes[dep]["status"] if dep in outcomes else None for dep in step.depends_on]
+                    if any(state in ("failed", "skipped") for state in dep_states):
+                        logger.warning(f"Skipping step {name}: a dependency did not succeed.")
+                        outcomes[name] = {"status": "skipped", "result": None, "elapsed_seconds": 0}
+                        del pending[name]
+                    elif all(state == "succeeded" for state in dep_states):
+                        logger.info(f"Starting step {name}...")
+                        running[executor.submit(self._run_step, step, dict(results))] = step
+                        del pending[name]
+                if not running:
+                    continue
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    step = running.pop(future)
+                    try:
+                        result, elapsed = future.result()
+                    except Exception as e:
+                        logger.error(f"Step {step.name} raised: {e}")
+                        outcome = {"status": "failed", "result": None, "error": str(e), "elapsed_seconds": None}
+                    else:
+                        failed = isinstance(result, dict) and result.get("status") in FAILED_STATUSES
+                        outcome = {"status": "failed" if failed else "succeeded", "result": result,
+                                   "elapsed_seconds": round(elapsed, 3)}
+                        logger.info(f"Step {step.name} {outcome['status']} in {elapsed:.1f}s")
+                    if outcome["status"] == "failed" and self.on_failure:
+                        outcome["advice"] = self.on_failure(step, outcome)
+                    outcomes[step.name] = outcome
+                    results[step.name] = outcome["result"]
+        return outcomes
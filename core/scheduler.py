@@ -0,0 +1,138 @@
+from autogen_migration.core.pipeline import FAILED_STATUSES
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_WORKERS = 8
+DEFAULT_SOURCE_CONCURRENCY = 4
+DEFAULT_TARGET_CONCURRENCY = 4
+
+def discover_tables(conn, db_name):
+    """Lists the base tables of a database with their estimated row count and size in bytes, largest first."""
+    with conn.cursor() as cursor:
+        cursor.execute(
+            "SELECT TABLE_NAME, COALESCE(TABLE_ROWS, 0), COALESCE(DATA_LENGTH, 0) + COALESCE(INDEX_LENGTH, 0) "
+            "FROM information_schema.TABLES WHERE TABLE_SCHEMA = %s AND TABLE_TYPE = 'BASE TABLE'",
+            (db_name,),
+        )
+        tables = [{"table": name, "rows": int(rows), "bytes": int(size)} for name, rows, size in cursor.fetchall()]
+    return sorted(tables, key=lambda t: t["bytes"], reverse=True)
+
+def endpoint_key(db_config):
+    """Identifies the server a database lives on, so concurrency limits apply per server rather than per database."""
+    return f"{db_config['host']}:{db_config['port']}"
+
+class TableTask:
+    """One table to migrate, with the database configurations of its source and target."""
+
+    def __init__(self, database, table, size_bytes, rows, source_config, target_config):
+        self.database = database
+        self.table = table
+        self.size_bytes = size_bytes
+        self.rows = rows
+        self.source_config = source_config
+        self.target_config = target_config
+        self.source_key = endpoint_key(source_config)
+        self.target_key = endpoint_key(target_config)
+
+class TableStage:
+    """A per-table step such as schema, copy or validation; func(task) returns the step's result dict."""
+
+    def __init__(self, name, func, uses=("source", "target")):
+        self.name = name
+        self.func = func
+        self.uses = tuple(uses)
+
+class MigrationScheduler:
+    """Runs the stages of many tables on a bounded worker pool, largest tables first.
+
+    Stages of one table run in order, while stages of different tables overlap, so one table can be validated while
+    another is copied. Ready work is picked longest-processing-time first (by table size), which keeps total time
+    close to the time of the largest table, and at most source_concurrency / target_concurrency stages touch any one
+    source or target server at a time.
+    """
+
+    def __init__(self, stages, max_workers=DEFAULT_MAX_WORKERS, source_concurrency=DEFAULT_SOURCE_CONCURRENCY,
+                 target_concurrency=DEFAULT_TARGET_CONCURRENCY):
+        self.stages = list(stages)
+        self.max_workers = int(max_workers)
+        self.limits = {"source": int(source_concurrency), "target": int(target_concurrency)}
+
+    def _endpoints(self, task, stage):
+        keys = {"source": task.source_key, "target": task.target_key}
+        return [(side, keys[side]) for side in stage.uses]
+
+    def _run_stage(self, stage, task):
+        start = time.time()
+        result = stage.func(task)
+        return result, time.time() - start
+
+    def run(self, tasks):
+        """Migrates every task and returns per-table stage outcomes plus the overall status and wall-clock time."""
+        start_time = time.time()
+        outcomes = {id(task): {"database": task.database, "table": task.table, "bytes": task.size_bytes,
+                               "status": "pending", "stages": {}} for task in tasks}
+        next_stage = {id(task): 0 for task in tasks}
+        # Ready queue ordered largest table first; a table further along its stages wins ties so it finishes sooner.
+        ready = sorted(tasks, key=lambda t: -t.size_bytes)
+        in_use = {}
+        running = {}
+
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="scheduler") as executor:
+            while ready or running:
+                for task in list(ready):
+                    if len(running) >= self.max_workers:
+                        break
+                    stage = self.stages[next_stage[id(task)]]
+                    endpoints = self._endpoints(task, stage)
+                    if any(in_use.get(endpoint, 0) >= self.limits[endpoint[0]] for endpoint in endpoints):
+                        continue
+                    for endpoint in endpoints:
+                        in_use[endpoint] = in_use.get(endpoint, 0) + 1
+                    ready.remove(task)
+                    outcomes[id(task)]["status"] = "running"
+                    logger.info(f"Starting {stage.name} of {task.database}.{task.table} ({task.size_bytes} bytes)")
+                    running[executor.submit(self._run_stage, stage, task)] = (task, stage)
+                if not running:
+                    # Nothing can start and nothing is running: every ready task is blocked by a zero limit.
+                    raise ValueError("Scheduler concurrency limits must be at least 1.")
+
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    task, stage = running.pop(future)
+                    for endpoint in self._endpoints(task, stage):
+                        in_use[endpoint] -= 1
+                    outcome = outcomes[id(task)]
+                    try:
+                        result, elapsed = future.result()
+                    except Exception as e:
+                        logger.error(f"{stage.name} of {task.database}.{task.table} raised: {e}")
+                        outcome["stages"][stage.name] = {"status": "failed", "error": str(e)}
+                        outcome["status"] = "failed"
+                        continue
+                    failed = isinstance(result, dict) and result.get("status") in FAILED_STATUSES
+                    outcome["stages"][stage.name] = {"status": "failed" if failed else "succeeded", "result": result,
+                                                     "elapsed_seconds": round(elapsed, 3)}
+                    logger.info(f"{stage.name} of {task.database}.{task.table} {'failed' if failed else 'succeeded'} in {elapsed:.1f}s")
+                    if failed:
+                        outcome["status"] = "failed"
+                        continue
+                    next_stage[id(task)] += 1
+                    if next_stage[id(task)] == len(self.stages):
+                        outcome["status"] = "succeeded"
+                    else:
+                        ready.append(task)
+                        ready.sort(key=lambda t: (-t.size_bytes, -next_stage[id(t)]))
+
+        tables = list(outcomes.values())
+        failed = [f"{t['database']}.{t['table']}" for t in tables if t["status"] != "succeeded"]
+        if failed:
+            logger.warning(f"Scheduled migration finished with failed tables: {', '.join(failed)}")
+        return {
+            "status": "failure" if failed else "success",
+            "tables": tables,
+            "failed_tables": failed,
+            "elapsed_seconds": round(time.time() - start_time, 3),
+        }
@@ -0,0 +1,224 @@
+from autogen_migration.core.utils import get_shared_client
+import subprocess
+import threading
+import tempfile
+import logging
+import queue
+import time
+import zlib
+import os
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PART_SIZE = 16 * 1024 * 1024 # resumable upload part; GCS needs a multiple of 256 KiB
+DEFAULT_BLOCK_SIZE = 1024 * 1024
+DEFAULT_QUEUE_BLOCKS = 16 # blocks buffered between pipeline stages, so memory stays bounded whatever the dump size
+DEFAULT_DUMP_ARGS = ("--single-transaction", "--quick", "--set-gtid-purged=OFF", "--routines", "--triggers", "--events")
+COMPRESSION_SUFFIXES = {"gzip": ".gz", "zstd": ".zst", "none": ""}
+
+def compression_from_name(name):
+    for compression, suffix in COMPRESSION_SUFFIXES.items():
+        if suffix and name.endswith(suffix):
+            return compression
+    return "none"
+
+def _compressor(compression, level=None):
+    """Incremental compressor with compress(data) and flush() methods."""
+    if compression == "gzip":
+        return zlib.compressobj(level if level is not None else 6, zlib.DEFLATED, 31) # 31: gzip framing
+    if compression == "zstd":
+        import zstandard # optional; only needed for zstd dumps
+        return zstandard.ZstdCompressor(level=level if level is not None else 3, threads=-1).compressobj()
+    return None
+
+def _decompressor(compression):
+    if compression == "gzip":
+        return zlib.decompressobj(31)
+    if compression == "zstd":
+        import zstandard
+        return zstandard.ZstdDecompressor().decompressobj()
+    return None
+
+def mysql_command(tool, host, port, user, password, db_name, args=()):
+    """Command line and environment for mysqldump/mysql; the password goes in the environment, not the argument list."""
+    return [tool, "-h", str(host), "-P", str(port), "-u", user, *args, db_name], {**os.environ, "MYSQL_PWD": password or ""}
+
+class _Stage(threading.Thread):
+    """Consumes blocks from a bounded queue until None; after a failure it keeps draining so producers never block."""
+
+    def __init__(self, name, handle, finish, queue_blocks=DEFAULT_QUEUE_BLOCKS):
+        super().__init__(name=name, daemon=True)
+        self.queue = queue.Queue(maxsize=queue_blocks)
+        self.handle = handle
+        self.finish = finish
+        self.error = None
+
+    def run(self):
+        for block in iter(self.queue.get, None):
+            if self.error is None:
+                try:
+                    self.handle(block)
+                except Exception as e:
+                    self.error = e
+        if self.error is None:
+            try:
+                self.finish()
+            except Exception as e:
+                self.error = e
+
+def _stderr_tail(f):
+    f.seek(0)
+    return f.read()[-2000:].decode("utf-8", "replace").strip()
+
+def _open_import(target_config):
+    args, env = mysql_command("mysql", target_config["host"], target_config["port"], target_config["user"],
+                              target_config["password"], target_config["db"])
+    stderr = tempfile.TemporaryFile()
+    return subprocess.Popen(args, stdin=subprocess.PIPE, stderr=stderr, env=env), stderr
+
+def _finish_import(proc, stderr):
+    proc.stdin.close()
+    if proc.wait() != 0:
+        raise RuntimeError(f"mysql import failed: {_stderr_tail(stderr)}")
+
+def _abort_import(proc):
+    """Stops a mysql client whose input failed, so no orphaned or zombie client keeps a target connection open."""
+    try:
+        proc.stdin.close()
+    except OSError:
+        pass # the pipe is already broken
+    if proc.poll() is None:
+        proc.kill()
+    proc.wait()
+
+def stream_dump_to_gcs(source_config, bucket_name, blob_name, credentials, compression="gzip", part_size=DEFAULT_PART_SIZE,
+                       import_config=None, dump_args=DEFAULT_DUMP_ARGS, block_size=DEFAULT_BLOCK_SIZE):
+    """Pipes mysqldump through a compressor into a GCS resumable upload, without a local file.
+
+    The upload sends part_size parts as they fill, so dumping, compressing and uploading overlap. With import_config
+    the uncompressed stream is also fed to the mysql client of that database at the same time, so the target is
+    loaded in the same pass. A failed transfer deletes the partial object.
+    """
+    started = time.monotonic()
+    blob = get_shared_client("storage", credentials).bucket(bucket_name).blob(blob_name, chunk_size=part_size)
+    writer = blob.open("wb", chunk_size=part_size, content_type="application/octet-stream")
+    compressor = _compressor(compression)
+    counts = {"dumped": 0, "uploaded": 0}
+
+    def upload(block):
+        data = compressor.compress(block) if compressor else block
+        if data:
+            writer.write(data)
+            counts["uploaded"] += len(data)
+
+    def finish_upload():
+        if compressor:
+            tail = compressor.flush()
+            writer.write(tail)
+            counts["uploaded"] += len(tail)
+        writer.close()
+
+    stages = [_Stage("gcs-upload", upload, finish_upload)]
+    proc = None
+    if import_config is not None:
+        proc, import_stderr = _open_import(import_config)
+        stages.append(_Stage("mysql-import", proc.stdin.write, lambda: _finish_import(proc, import_stderr)))
+    for stage in stages:
+        stage.start()
+
+    args, env = mysql_command("mysqldump", source_config["host"], source_config["port"], source_config["user"],
+                              source_config["password"], source_config["db"], dump_args)
+    dump_stderr = tempfile.TemporaryFile()
+    dump = subprocess.Popen(args, stdout=subprocess.PIPE, stderr=dump_stderr, env=env)
+    try:
+        for block in iter(lambda: dump.stdout.read(block_size), b""):
+            counts["dumped"] += len(block)
+            if any(stage.error for stage in stages):
+                dump.kill()
+                break
+            for stage in stages:
+                stage.queue.put(block)
+    finally:
+        for stage in stages:
+            stage.queue.put(None)
+        for stage in stages:
+            stage.join()
+    dump_failed = dump.wait() != 0
+    errors = [f"{stage.name}: {stage.error}" for stage in stages if stage.error]
+    if dump_failed or errors:
+        if dump_failed and not errors:
+            errors.append(f"mysqldump: {_stderr_tail(dump_stderr)}")
+        if proc is not None:
+            _abort_import(proc)
+        try:
+            # Finalize whatever was sent now rather than when the writer is collected, then remove it.
+            if not writer.closed:
+                writer.close()
+            blob.delete()
+        except Exception:
+            pass # the upload may never have been started
+        raise RuntimeError(f"Streaming dump of {source_config['db']} failed: {'; '.join(errors)}")
+
+    elapsed = time.monotonic() - started
+    logger.info(f"Streamed {counts['dumped']} bytes of {source_config['db']} to gs://{bucket_name}/{blob_name} "
+                f"({counts['uploaded']} bytes {compression}) in {elapsed:.1f}s")
+    return {
+        "gcs_uri": f"gs://{bucket_name}/{blob_name}",
+        "compression": compression,
+        "bytes_dumped": counts["dumped"],
+        "bytes_uploaded": counts["uploaded"],
+        "imported": import_config is not None,
+        "elapsed_seconds": round(elapsed, 3),
+    }
+
+def stream_gcs_to_mysql(bucket_name, blob_name, target_config, credentials, compression=None, part_size=DEFAULT_PART_SIZE,
+                        block_size=DEFAULT_BLOCK_SIZE):
+    """Imports a dump object into MySQL by streaming it through a decompressor into the mysql client.
+
+    The object is fetched in part_size ranged reads on this thread while a second thread decompresses and imports
+    what was already fetched.
+    """
+    started = time.monotonic()
+    compression = compression or compression_from_name(blob_name)
+    blob = get_shared_client("storage", credentials).bucket(bucket_name).blob(blob_name)
+    reader = blob.open("rb", chunk_size=part_size)
+    proc, stderr = _open_import(target_config)
+    decompressor = _decompressor(compression)
+    counts = {"downloaded": 0, "imported": 0}
+
+    def load(block):
+        counts["downloaded"] += len(block)
+        data = decompressor.decompress(block) if decompressor else block
+        if data:
+            proc.stdin.write(data)
+            counts["imported"] += len(data)
+
+    def finish():
+        if decompressor and not decompressor.eof:
+            # A truncated object must fail loudly rather than end the import quietly part-way.
+            raise IOError(f"gs://{bucket_name}/{blob_name} ends before the end of its {compression} stream")
+        _finish_import(proc, stderr)
+
+    stage = _Stage("mysql-import", load, finish)
+    stage.start()
+    try:
+        for block in iter(lambda: reader.read(block_size), b""):
+            if stage.error:
+                break
+            stage.queue.put(block)
+    except Exception as e:
+        stage.error = stage.error or e # a failed read must not let the import finish as if the dump ended there
+        raise
+    finally:
+        stage.queue.put(None)
+        stage.join()
+        reader.close()
+        if stage.error:
+            _abort_import(proc)
+    if stage.error:
+        raise RuntimeError(f"Streaming import of gs://{bucket_name}/{blob_name} failed: {stage.error}")
+
+    elapsed = time.monotonic() - started
+    logger.info(f"Imported gs://{bucket_name}/{blob_name} into {target_config['db']} ({counts['imported']} bytes) in {elapsed:.1f}s")
+    return {"gcs_uri": f"gs://{bucket_name}/{blob_name}", "bytes_downloaded": counts["downloaded"],
+            "bytes_imported": counts["imported"], "elapsed_seconds": round(elapsed, 3)}
@@ -0,0 +1,284 @@
+from autogen_migration.core.instrumentation import record_chunk
+import pymysql
+import pymysql.cursors
+import datetime
+import decimal
+import logging
+import random
+import time
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CHUNK_SIZE = 10000
+
+def quote_identifier(name):
+    """Backtick-quotes a MySQL identifier."""
+    return "`" + str(name).replace("`", "``") + "`"
+
+def get_table_columns(conn, table_name):
+    """Returns the column names of a table in ordinal order."""
+    with conn.cursor() as cursor:
+        cursor.execute(f"SHOW COLUMNS FROM {quote_identifier(table_name)}")
+        return [row[0] for row in cursor.fetchall()]
+
+def get_primary_key_columns(conn, table_name):
+    """Returns the primary key columns of a table in index order."""
+    with conn.cursor() as cursor:
+        cursor.execute(f"SHOW KEYS FROM {quote_identifier(table_name)} WHERE Key_name = 'PRIMARY'")
+        rows = cursor.fetchall()
+    # SHOW KEYS columns: Table, Non_unique, Key_name, Seq_in_index, Column_name, ...
+    return [row[4] for row in sorted(rows, key=lambda row: row[3])]
+
+def keyset_predicate(pk_columns, key, op=">", last_op=None):
+    """Builds an index-friendly WHERE clause comparing (pk_columns) against key lexicographically."""
+    # (a, b) > (x, y) is expanded to (a > x) OR (a = x AND b > y) so older optimizers still use the PK index.
+    last_op = last_op or op
+    clauses, params = [], []
+    for i, column in enumerate(pk_columns):
+        parts = [f"{quote_identifier(c)} = %s" for c in pk_columns[:i]]
+        parts.append(f"{quote_identifier(column)} {last_op if i == len(pk_columns) - 1 else op} %s")
+        clauses.append("(" + " AND ".join(parts) + ")")
+        params.extend(key[:i + 1])
+    return "(" + " OR ".join(clauses) + ")", params
+
+def keyset_range_clause(pk_columns, lower_key=None, upper_key=None):
+    """Builds a WHERE clause for the half-open key range (lower_key, upper_key]; None means unbounded."""
+    where, params = [], []
+    if lower_key is not None:
+        clause, clause_params = keyset_predicate(pk_columns, lower_key, ">")
+        where.append(clause)
+        params.extend(clause_params)
+    if upper_key is not None:
+        clause, clause_params = keyset_predicate(pk_columns, upper_key, "<", "<=")
+        where.append(clause)
+        params.extend(clause_params)
+    return (" WHERE " + " AND ".join(where) if where else ""), params
+
+def key_at_offset(conn, table_name, pk_columns, lower_key, upper_key, offset):
+    """Returns the primary key found offset rows into the range (lower_key, upper_key], or None past its end."""
+    where, params = keyset_range_clause(pk_columns, lower_key, upper_key)
+    key_list = ", ".join(quote_identifier(c) for c in pk_columns)
+    with conn.cursor() as cursor:
+        cursor.execute(
+            f"SELECT {key_list} FROM {quote_identifier(table_name)}{where} ORDER BY {key_list} LIMIT 1 OFFSET {int(offset)}",
+            params,
+        )
+        row = cursor.fetchone()
+    return tuple(row) if row else None
+
+def split_key_ranges(conn, table_name, pk_columns, range_rows):
+    """Walks the PK index to cut a table into (lower_key, upper_key] ranges of about range_rows rows."""
+    ranges, lower_key = [], None
+    while True:
+        upper_key = key_at_offset(conn, table_name, pk_columns, lower_key, None, range_rows - 1)
+        if upper_key is None:
+            break
+        ranges.append((lower_key, upper_key))
+        lower_key = upper_key
+    ranges.append((lower_key, None))
+    return ranges
+
+def stream_rows(conn, sql, params=None):
+    """Yields rows of a query through an unbuffered server-side cursor."""
+    cursor = conn.cursor(pymysql.cursors.SSCursor)
+    try:
+        cursor.execute(sql, params)
+        for row in cursor:
+            yield row
+    finally:
+        cursor.close()
+
+def merge_join(source_rows, target_rows, key_len):
+    """Joins two row lists of the same key range on their leading key columns and returns (missing, extra, changed) keys.
+
+    Keys are only matched for equality, never ordered in Python: string keys under a non-binary collation sort
+    differently in MySQL, so the keys are reported in the order the rows were fetched (the server's key order).
+    """
+    target_by_key = {row[:key_len]: row for row in target_rows}
+    source_keys = set()
+    missing, changed = [], []
+    for row in source_rows:
+        key = row[:key_len]
+        source_keys.add(key)
+        if key not in target_by_key:
+            missing.append(key)
+        elif target_by_key[key] != row:
+            changed.append(key)
+    extra = [row[:key_len] for row in target_rows if row[:key_len] not in source_keys]
+    return missing, extra, changed
+
+class KeysetDiffValidator:
+    """Streams a table from two databases in primary-key order and diffs it one keyset chunk at a time."""
+
+    def __init__(self, source_conn, target_conn, table_name, chunk_size=DEFAULT_CHUNK_SIZE):
+        self.source_conn = source_conn
+        self.target_conn = target_conn
+        self.table_name = table_name
+        self.chunk_size = int(chunk_size)
+        self.pk_columns = get_primary_key_columns(source_conn, table_name)
+        if not self.pk_columns:
+            raise ValueError(f"Table {table_name} has no primary key; keyset validation needs one.")
+        # PK columns come first in every select so a row's key is simply row[:len(pk_columns)].
+        columns = self.pk_columns + [c for c in get_table_columns(source_conn, table_name) if c not in self.pk_columns]
+        self.select_list = ", ".join(quote_identifier(c) for c in columns)
+        self.order_by = ", ".join(quote_identifier(c) for c in self.pk_columns)
+
+    def _fetch(self, conn, lower_key=None, upper_key=None, limit=None):
+        where, params = keyset_range_clause(self.pk_columns, lower_key, upper_key)
+        sql = f"SELECT {self.select_list} FROM {quote_identifier(self.table_name)}{where} ORDER BY {self.order_by}"
+        if limit is not None:
+            sql += f" LIMIT {int(limit)}"
+        return list(stream_rows(conn, sql, params))
+
+    def iter_chunk_diffs(self):
+        """Yields a diff report for each consecutive primary-key range of at most chunk_size source rows."""
+        key_len = len(self.pk_columns)
+        last_key = None
+        chunk_index = 0
+        while True:
+            started = time.monotonic()
+            source_rows = self._fetch(self.source_conn, lower_key=last_key, limit=self.chunk_size)
+            if source_rows:
+                upper_key = source_rows[-1][:key_len]
+                target_rows = self._fetch(self.target_conn, lower_key=last_key, upper_key=upper_key, limit=self.chunk_size)
+                if len(target_rows) == self.chunk_size and target_rows[-1][:key_len] != upper_key:
+                    # The target has extra rows in this range; end the chunk at its last fetched key so memory stays
+                    # bounded, and diff the rest of the source rows in the next chunk. The cut follows the server's
+                    # key order (by position, or by asking the server), since Python orders collated strings differently.
+                    upper_key = target_rows[-1][:key_len]
+                    positions = {row[:key_len]: i for i, row in enumerate(source_rows)}
+                    if upper_key in positions:
+                        source_rows = source_rows[:positions[upper_key] + 1]
+                    else:
+                        source_rows = self._fetch(self.source_conn, lower_key=last_key, upper_key=upper_key, limit=self.chunk_size)
+            else:
+                # Source is exhausted; whatever is left on the target is extra.
+                target_rows = self._fetch(self.target_conn, lower_key=last_key, limit=self.chunk_size)
+                if not target_rows:
+                    return
+                upper_key = target_rows[-1][:key_len]
+            missing, extra, changed = merge_join(source_rows, target_rows, key_len)
+            record_chunk("keyset_diff", time.monotonic() - started, len(source_rows))
+            yield {
+                "chunk": chunk_index,
+                "lower_key": list(last_key) if last_key is not None else None,
+                "upper_key": list(upper_key),
+                "source_rows": len(source_rows),
+                "target_rows": len(target_rows),
+                "missing": missing,
+                "extra": extra,
+                "changed": changed,
+            }
+            last_key = upper_key
+            chunk_index += 1
+
+    def run(self, max_samples=10):
+        """Diffs the whole table and returns aggregate counts with a bounded sample of differing keys."""
+        result = {
+            "table": self.table_name,
+            "chunks": 0,
+            "source_rows": 0,
+            "target_rows": 0,
+            "missing_count": 0,
+            "extra_count": 0,
+            "changed_count": 0,
+            "mismatched_chunk_count": 0,
+            "missing_sample": [],
+            "extra_sample": [],
+            "changed_sample": [],
+            "mismatched_chunks": [],
+        }
+        for chunk in self.iter_chunk_diffs():
+            result["chunks"] += 1
+            result["source_rows"] += chunk["source_rows"]
+            result["target_rows"] += chunk["target_rows"]
+            for kind in ("missing", "extra", "changed"):
+                result[f"{kind}_count"] += len(chunk[kind])
+                room = max_samples - len(result[f"{kind}_sample"])
+                result[f"{kind}_sample"].extend(list(key) for key in chunk[kind][:max(room, 0)])
+            if chunk["missing"] or chunk["extra"] or chunk["changed"]:
+                result["mismatched_chunk_count"] += 1
+                logger.warning(
+                    f"Chunk {chunk['chunk']} of {self.table_name} ({chunk['lower_key']}, {chunk['upper_key']}]: "
+                    f"{len(chunk['missing'])} missing, {len(chunk['extra'])} extra, {len(chunk['changed'])} changed"
+                )
+                if len(result["mismatched_chunks"]) < max_samples:
+                    result["mismatched_chunks"].append({
+                        "chunk": chunk["chunk"],
+                        "lower_key": chunk["lower_key"],
+                        "upper_key": chunk["upper_key"],
+                        "missing": len(chunk["missing"]),
+                        "extra": len(chunk["extra"]),
+                        "changed": len(chunk["changed"]),
+                    })
+        result["match"] = result["mismatched_chunk_count"] == 0
+        return result
+
+def _random_between(low, high, rng):
+    """A random value between two primary key values of the same type; low when the type cannot be interpolated."""
+    if isinstance(low, bool) or type(low) is not type(high) or low == high:
+        return low
+    if isinstance(low, int):
+        return rng.randint(low, high)
+    if isinstance(low, float):
+        return rng.uniform(low, high)
+    if isinstance(low, decimal.Decimal):
+        return low + (high - low) * decimal.Decimal(repr(rng.random()))
+    if isinstance(low, datetime.datetime):
+        return low + (high - low) * rng.random()
+    if isinstance(low, datetime.date):
+        return low + datetime.timedelta(days=rng.randint(0, (high - low).days))
+    if isinstance(low, (str, bytes)):
+        # Interpolate on the leading bytes; the seek below only needs a value inside the range, not an exact key.
+        encode = (lambda v: v.encode("utf-8")) if isinstance(low, str) else (lambda v: v)
+        lower, upper = (int.from_bytes(encode(v)[:8].ljust(8, b"\0"), "big") for v in (low, high))
+        value = rng.randint(min(lower, upper), max(lower, upper)).to_bytes(8, "big").rstrip(b"\0")
+        return value.decode("utf-8", "ignore") if isinstance(low, str) else value
+    return low
+
+def compare_sample(source_conn, target_conn, table_name, sample_size=100, seed=None):
+    """Compares a random sample of source rows against the target by primary key lookup.
+
+    Random values are drawn between the smallest and largest leading key column and each picks the first row at or
+    after it through the primary key index, so the cost is sample_size index seeks whatever the table size. Rows
+    after large key gaps are picked more often than others.
+    """
+    if int(sample_size) <= 0:
+        return []
+    pk_columns = get_primary_key_columns(source_conn, table_name)
+    if not pk_columns:
+        raise ValueError(f"Table {table_name} has no primary key; sample comparison needs one.")
+    columns = pk_columns + [c for c in get_table_columns(source_conn, table_name) if c not in pk_columns]
+    select_list = ", ".join(quote_identifier(c) for c in columns)
+    key_len = len(pk_columns)
+    leading = quote_identifier(pk_columns[0])
+    table = quote_identifier(table_name)
+    order_by = ", ".join(quote_identifier(c) for c in pk_columns)
+
+    with source_conn.cursor() as cursor:
+        cursor.execute(f"SELECT MIN({leading}), MAX({leading}) FROM {table}")
+        low, high = cursor.fetchone()
+    if low is None:
+        return []
+    rng = random.Random(seed)
+    seeds = sorted({_random_between(low, high, rng) for _ in range(int(sample_size))})
+    # One statement of index seeks; the parentheses let each branch keep its own ORDER BY ... LIMIT 1.
+    seek = f"(SELECT {select_list} FROM {table} WHERE {leading} >= %s ORDER BY {order_by} LIMIT 1)"
+    picked = {}
+    for row in stream_rows(source_conn, " UNION ALL ".join([seek] * len(seeds)), seeds):
+        picked.setdefault(row[:key_len], row)
+    source_rows = list(picked.values())
+    if not source_rows:
+        return []
+
+    key_list = "(" + ", ".join(quote_identifier(c) for c in pk_columns) + ")"
+    placeholder = "(" + ", ".join(["%s"] * key_len) + ")"
+    params = [value for row in source_rows for value in row[:key_len]]
+    target_rows = stream_rows(
+        target_conn,
+        f"SELECT {select_list} FROM {quote_identifier(table_name)} "
+        f"WHERE {key_list} IN ({', '.join([placeholder] * len(source_rows))})",
+        params,
+    )
+    target_by_key = {row[:key_len]: row for row in target_rows}
+    return [dict(zip(columns, row)) for row in source_rows if target_by_key.get(row[:key_len]) != row]
@@ -1,13 +1,26 @@
 from autogen_migration.core.orchestrator import MigrationOrchestrator
 from autogen_migration.config.settings import Config
+import argparse
 import os
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Automated MySQL to Cloud SQL migration")
+    parser.add_argument("--resume", action="store_true", help="Continue the last unfinished run recorded in the migration journal")
+    parser.add_argument("--pipeline", action="store_true", help="Run the standard migration steps as a DAG without LLM speaker selection")
+    parser.add_argument("--all-tables", action="store_true", help="Migrate every table of LEGACY_MYSQL_DBS with the size-aware table scheduler")
+    args = parser.parse_args()
+
     # Ensure GCP_PROJECT_ID and GCP_SERVICE_ACCOUNT_KEY_PATH are set as environment variables
     # For local testing, you might hardcode them in settings.py or load from.env
-    os.environ = Config.PROJECT_ID
-    os.environ = Config.GCP_SERVICE_ACCOUNT_KEY_PATH
-    # Ensure secrets are set in GCP Secret Manager or mocked for local dev
+    os.environ["GCP_PROJECT_ID"] = Config.PROJECT_ID
+    os.environ["GOOGLE_APPLICATION_CREDENTIALS"] = Config.GCP_SERVICE_ACCOUNT_KEY_PATH
+    # Ensure secrets are set in GCP Secret Manager, or set SECRETS_BACKEND=env/file for local dev
+    Config.prefetch_secrets()
 
-    orchestrator = MigrationOrchestrator()
-    orchestrator.run_migration()
+    orchestrator = MigrationOrchestrator(resume=args.resume)
+    if args.all_tables:
+        orchestrator.run_scheduled()
+    elif args.pipeline:
+        orchestrator.run_pipeline()
+    else:
+        orchestrator.run_migration()
@@ -0,0 +1,5 @@
+import sys
+import os
+
+# Tests import the canonical package, autogen_migration, from the repository root.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,108 @@
+import pytest
+import json
+
+bulk_copy = pytest.importorskip("autogen_migration.core.bulk_copy", exc_type=ImportError)
+standins = pytest.importorskip("autogen_migration.core.standins", exc_type=ImportError)
+from autogen_migration.core.journal import MigrationJournal
+from autogen_migration.core.utils import mysql_connection
+
+def _config(host, db):
+    return {"host": host, "port": 3306, "user": "test", "password": "", "db": db}
+
+def _create(config, rows):
+    with mysql_connection(**config) as conn:
+        with conn.cursor() as cursor:
+            cursor.execute("CREATE TABLE `employees` (id INT NOT NULL, name VARCHAR(32), PRIMARY KEY (id))")
+            if rows:
+                cursor.executemany("INSERT INTO `employees` (id, name) VALUES (%s, %s)", rows)
+        conn.commit()
+
+def _rows(config):
+    with mysql_connection(**config) as conn:
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT id, name FROM `employees` ORDER BY id")
+            return [tuple(row) for row in cursor.fetchall()]
+
+def test_same_table_name_in_two_databases_copies_each_own_rows(tmp_path):
+    host = f"standin-{tmp_path.name}"
+    journal = MigrationJournal(str(tmp_path / "journal.sqlite"))
+    journal.start_run()
+    sources = {"hr": [(i, f"hr-{i}") for i in range(1, 26)], "sales": [(i, f"sales-{i}") for i in range(1, 41)]}
+    with standins.MySQLStandIn(str(tmp_path)):
+        for db, rows in sources.items():
+            _create(_config(host, db), rows)
+            _create(_config(host, f"{db}_target"), [])
+        for db in sources:
+            engine = bulk_copy.BulkCopyEngine(_config(host, db), _config(host, f"{db}_target"), readers=2, writers=2,
+                                              chunk_rows=10, journal=journal)
+            result = engine.copy_table("employees")
+            assert result["rows_copied"] == len(sources[db])
+            assert result["chunks_skipped"] == 0
+        for db, rows in sources.items():
+            assert _rows(_config(host, f"{db}_target")) == rows
+    assert journal.high_water_mark("hr.employees")[0] == 3
+    assert journal.high_water_mark("sales.employees")[0] == 5
+    journal.close()
+
+def test_rerun_skips_chunks_already_copied(tmp_path):
+    host = f"standin-{tmp_path.name}"
+    journal = MigrationJournal(str(tmp_path / "journal.sqlite"))
+    journal.start_run()
+    rows = [(i, f"row-{i}") for i in range(1, 31)]
+    with standins.MySQLStandIn(str(tmp_path)):
+        _create(_config(host, "src"), rows)
+        _create(_config(host, "dst"), [])
+        engine = bulk_copy.BulkCopyEngine(_config(host, "src"), _config(host, "dst"), chunk_rows=10, journal=journal)
+        assert engine.copy_table("employees")["rows_copied"] == 30
+        again = engine.copy_table("employees")
+        assert again["rows_copied"] == 0
+        assert again["chunks_skipped"] == again["chunks"]
+        assert _rows(_config(host, "dst")) == rows
+    journal.close()
+
+def _fail_chunk(engine, failing_lower_key):
+    """Makes every write of the chunk starting after failing_lower_key fail."""
+    write_chunk = engine._write_chunk
+
+    def flaky(attempt, table_name, insert_sql, pk_columns, lower_key, upper_key, rows):
+        if lower_key == failing_lower_key:
+            raise RuntimeError("connection lost")
+        return write_chunk(attempt, table_name, insert_sql, pk_columns, lower_key, upper_key, rows)
+    engine._write_chunk = flaky
+
+def test_failed_chunk_is_redone_from_failed_chunks_and_journaled(tmp_path):
+    host = f"standin-{tmp_path.name}"
+    journal = MigrationJournal(str(tmp_path / "journal.sqlite"))
+    journal.start_run()
+    rows = [(i, f"row-{i}") for i in range(1, 31)]
+    with standins.MySQLStandIn(str(tmp_path)):
+        _create(_config(host, "src"), rows)
+        _create(_config(host, "dst"), [])
+        engine = bulk_copy.BulkCopyEngine(_config(host, "src"), _config(host, "dst"), chunk_rows=10, max_retries=0, journal=journal)
+        _fail_chunk(engine, (10,))
+        first = engine.copy_table("employees")
+        assert len(first["failed_chunks"]) == 1
+        assert first["failed_chunks"][0]["index"] == 1
+        assert journal.high_water_mark("src.employees")[0] == 1
+        # Results often come back through JSON (e.g. from an agent), which turns key tuples into lists.
+        failed = json.loads(json.dumps(first["failed_chunks"]))
+        engine = bulk_copy.BulkCopyEngine(_config(host, "src"), _config(host, "dst"), chunk_rows=10, journal=journal)
+        retried = engine.copy_table("employees", ranges=failed)
+        assert retried["failed_chunks"] == []
+        assert retried["rows_copied"] == 10
+        assert _rows(_config(host, "dst")) == rows
+        chunks = len(journal.chunk_plan("src.employees"))
+        assert journal.high_water_mark("src.employees")[0] == chunks
+        assert engine.copy_table("employees")["chunks_skipped"] == chunks
+    journal.close()
+
+def test_ranges_given_as_key_pairs_without_a_journal(tmp_path):
+    host = f"standin-{tmp_path.name}"
+    rows = [(i, f"row-{i}") for i in range(1, 31)]
+    with standins.MySQLStandIn(str(tmp_path)):
+        _create(_config(host, "src"), rows)
+        _create(_config(host, "dst"), [])
+        engine = bulk_copy.BulkCopyEngine(_config(host, "src"), _config(host, "dst"), chunk_rows=10)
+        result = engine.copy_table("employees", ranges=[(None, (5,)), ([20], None)])
+        assert result["rows_copied"] == 15
+        assert _rows(_config(host, "dst")) == rows[:5] + rows[20:]
@@ -0,0 +1,128 @@
+import pytest
+
+cdc = pytest.importorskip("autogen_migration.core.cdc", exc_type=ImportError)
+standins = pytest.importorskip("autogen_migration.core.standins", exc_type=ImportError)
+from pymysqlreplication.event import XidEvent, QueryEvent
+from autogen_migration.core.instrumentation import REGISTRY
+from autogen_migration.core.utils import mysql_connection
+
+class WriteRowsEvent:
+    def __init__(self, table, *rows):
+        self.table, self.timestamp = table, 0
+        self.rows = [{"values": row} for row in rows]
+
+class UpdateRowsEvent:
+    def __init__(self, table, *changes):
+        self.table, self.timestamp = table, 0
+        self.rows = [{"before_values": before, "after_values": after} for before, after in changes]
+
+class DeleteRowsEvent(WriteRowsEvent):
+    pass
+
+def _xid():
+    return XidEvent.__new__(XidEvent)
+
+def _query(text, schema="app"):
+    event = QueryEvent.__new__(QueryEvent)
+    event.query, event.schema = text, schema
+    return event
+
+class _Stream:
+    """Replays events like BinLogStreamReader, advancing the position by 10 per event."""
+
+    def __init__(self, events):
+        self.events = events
+        self.log_file, self.log_pos = "binlog.000001", 0
+
+    def __iter__(self):
+        for event in self.events:
+            self.log_pos += 10
+            yield event
+
+    def close(self):
+        pass
+
+def _config(host, db):
+    return {"host": host, "port": 3306, "user": "test", "password": "", "db": db}
+
+def _replicate(tmp_path, events, rows, **run_options):
+    host = f"standin-{tmp_path.name}"
+    target = _config(host, "app_target")
+    with standins.MySQLStandIn(str(tmp_path)):
+        with mysql_connection(**target) as conn:
+            with conn.cursor() as cursor:
+                cursor.execute("CREATE TABLE `accounts` (id INT NOT NULL, name VARCHAR(32), PRIMARY KEY (id))")
+                cursor.executemany("INSERT INTO `accounts` (id, name) VALUES (%s, %s)", rows)
+            conn.commit()
+        replicator = cdc.BinlogReplicator(_config(host, "app"), target, batch_window=0.05)
+        replicator._open_stream = lambda start_position: _Stream(events)
+        try:
+            metrics = replicator.run({"log_file": "binlog.000001", "log_pos": 4}, **run_options)
+        finally:
+            with mysql_connection(**target) as conn:
+                with conn.cursor() as cursor:
+                    cursor.execute("SELECT id, name FROM `accounts` ORDER BY id")
+                    applied = [tuple(row) for row in cursor.fetchall()]
+    return replicator, metrics, applied
+
+def test_committed_changes_are_coalesced_and_the_open_transaction_is_not_applied(tmp_path):
+    events = [
+        WriteRowsEvent("accounts", {"id": 3, "name": "c"}),
+        UpdateRowsEvent("accounts", ({"id": 1, "name": "a"}, {"id": 1, "name": "A"})),
+        DeleteRowsEvent("accounts", {"id": 2, "name": "b"}),
+        UpdateRowsEvent("accounts", ({"id": 3, "name": "c"}, {"id": 4, "name": "c"})),
+        _xid(),
+        WriteRowsEvent("accounts", {"id": 5, "name": "uncommitted"}),
+    ]
+    _, metrics, applied = _replicate(tmp_path, events, [(1, "a"), (2, "b")], duration_seconds=0.5)
+    assert applied == [(1, "A"), (4, "c")]
+    # The checkpoint is the commit, so a resume reads the open transaction again.
+    assert metrics["position"] == {"log_file": "binlog.000001", "log_pos": 50}
+    assert metrics["rows_applied"] == 4 # keys 1, 2 (deleted), 3 (moved away) and 4
+    assert metrics["replication_lag_seconds"] is not None
+    lag = REGISTRY.snapshot()["migration_replication_lag_seconds"]
+    assert lag["kind"] == "gauge" and ({"database": "app"}, metrics["replication_lag_seconds"]) in lag["values"]
+
+def test_replication_stops_at_ddl_after_applying_what_committed_before_it(tmp_path):
+    events = [
+        WriteRowsEvent("accounts", {"id": 2, "name": "b"}),
+        _xid(),
+        _query("ALTER TABLE `accounts` ADD COLUMN email VARCHAR(64)"),
+        WriteRowsEvent("accounts", {"id": 3, "name": "c"}),
+        _xid(),
+    ]
+    with pytest.raises(cdc.SchemaChangeError) as raised:
+        _replicate(tmp_path, events, [(1, "a")], duration_seconds=5)
+    assert raised.value.position == {"log_file": "binlog.000001", "log_pos": 30}
+    assert "ALTER TABLE" in raised.value.query
+
+def test_ddl_on_other_tables_is_ignored():
+    replicator = cdc.BinlogReplicator(_config("source", "app"), _config("target", "app_target"), tables=["accounts"])
+    assert not replicator._is_replicated_ddl(_query("CREATE TABLE `audit` (id INT)"))
+    assert not replicator._is_replicated_ddl(_query("ALTER TABLE accounts DROP COLUMN name", schema="other"))
+    assert replicator._is_replicated_ddl(_query("ALTER TABLE accounts DROP COLUMN name"))
+
+class _VariablesConnection:
+    def __init__(self, *values):
+        self.values = values
+
+    def cursor(self):
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def execute(self, sql, params=None):
+        pass
+
+    def fetchone(self):
+        return self.values
+
+@pytest.mark.parametrize("binlog_format, row_image", [("ROW", "MINIMAL"), ("ROW", "NOBLOB"), ("MIXED", "FULL")])
+def test_only_full_row_images_are_accepted(binlog_format, row_image):
+    with pytest.raises(RuntimeError, match="binlog_row_image=FULL"):
+        cdc.check_binlog_format(_VariablesConnection(binlog_format, row_image))
+    cdc.check_binlog_format(_VariablesConnection("ROW", "FULL"))
@@ -0,0 +1,43 @@
+from autogen_migration.core.ddl import StatementSplitter, iter_statements, split_create_table
+
+def test_iter_statements_honours_quotes_comments_and_delimiters():
+    dump = [
+        "-- a comment; not a statement\n",
+        "INSERT INTO t VALUES ('a;b', \"c;d\");\n",
+        "/* block; comment */ SELECT 1;\n",
+        "DELIMITER ;;\n",
+        "CREATE TRIGGER tr BEFORE INSERT ON t FOR EACH ROW BEGIN SET @x = 1; END;;\n",
+        "DELIMITER ;\n",
+        "SELECT 2",
+    ]
+    statements = list(iter_statements(dump))
+    assert statements == [
+        ("INSERT INTO t VALUES ('a;b', \"c;d\")", ";"),
+        ("SELECT 1", ";"),
+        ("CREATE TRIGGER tr BEFORE INSERT ON t FOR EACH ROW BEGIN SET @x = 1; END", ";;"),
+        ("SELECT 2", ";"),
+    ]
+
+def test_statement_splitter_keeps_conditional_comments_and_multiline_strings():
+    splitter = StatementSplitter()
+    assert splitter.feed("/*!50013 DEFINER=`root`@`%` */ SELECT 'multi\n") == []
+    assert splitter.feed("line';\n") == [("/*!50013 DEFINER=`root`@`%` */ SELECT 'multi\nline'", ";")]
+
+def test_split_create_table_defers_secondary_indexes_and_foreign_keys():
+    text = ("CREATE TABLE `orders` (\n"
+            "  `id` int NOT NULL,\n"
+            "  `seq` int NOT NULL AUTO_INCREMENT,\n"
+            "  `customer_id` int,\n"
+            "  PRIMARY KEY (`id`),\n"
+            "  KEY `seq` (`seq`),\n"
+            "  UNIQUE KEY `uq_customer` (`customer_id`, `id`),\n"
+            "  CONSTRAINT `fk_customer` FOREIGN KEY (`customer_id`) REFERENCES `customers` (`id`)\n"
+            ") ENGINE=InnoDB")
+    bare, indexes, foreign_keys = split_create_table(text)
+    assert indexes == ["UNIQUE KEY `uq_customer` (`customer_id`, `id`)"]
+    assert foreign_keys == ["CONSTRAINT `fk_customer` FOREIGN KEY (`customer_id`) REFERENCES `customers` (`id`)"]
+    # The AUTO_INCREMENT column outside the primary key keeps its index, or InnoDB refuses the table.
+    assert "KEY `seq` (`seq`)" in bare
+    assert "PRIMARY KEY (`id`)" in bare
+    assert "uq_customer" not in bare and "FOREIGN KEY" not in bare
+    assert bare.endswith(") ENGINE=InnoDB")
@@ -0,0 +1,38 @@
+import os
+import pytest
+
+google_crc32c = pytest.importorskip("google_crc32c")
+from autogen_migration.core.gcs_transfer import crc32c_combine, combine_part_crcs, crc32c_to_gcs, crc32c_from_gcs, upload_file
+from autogen_migration.core.standins import StorageStandIn, StandInBlob
+
+def test_crc32c_combine_matches_crc_of_concatenation():
+    for a, b in [(b"", b"abc"), (b"abc", b""), (b"hello ", b"world"), (os.urandom(1000), os.urandom(4097))]:
+        combined = crc32c_combine(google_crc32c.value(a), google_crc32c.value(b), len(b))
+        assert combined == google_crc32c.value(a + b)
+
+def test_combine_part_crcs_of_many_parts():
+    data = os.urandom(10000)
+    bounds = [(0, 1), (1, 1000), (1000, 1000), (1000, 7777), (7777, 10000)]
+    parts = [(google_crc32c.value(data[start:end]), end - start) for start, end in bounds]
+    assert combine_part_crcs(parts) == google_crc32c.value(data)
+
+def test_gcs_crc_encoding_round_trip():
+    crc = google_crc32c.value(b"object")
+    assert crc32c_from_gcs(crc32c_to_gcs(crc)) == crc
+
+def test_upload_deletes_a_composed_object_that_fails_its_checksum(tmp_path, monkeypatch):
+    source = tmp_path / "dump.sql"
+    source.write_bytes(os.urandom(5000))
+    client = StorageStandIn(str(tmp_path / "gcs"))
+    compose = StandInBlob.compose
+
+    def corrupting_compose(self, sources, **kwargs):
+        compose(self, sources, **kwargs)
+        with open(self._path, "ab") as f:
+            f.write(b"!")
+        self._finish()
+    monkeypatch.setattr(StandInBlob, "compose", corrupting_compose)
+    with pytest.raises(IOError, match="CRC32C mismatch"):
+        upload_file(client, "bucket", str(source), "dumps/dump.sql", part_size=1000)
+    assert client.bucket("bucket").get_blob("dumps/dump.sql") is None
+    assert not os.path.exists(str(source) + ".gcsupload.json")
@@ -0,0 +1,27 @@
+from autogen_migration.core.journal import _encode_key, _decode_key
+import datetime
+import decimal
+import uuid
+import pytest
+
+def test_encode_key_round_trips_column_types():
+    key = (
+        42, 1.5, "text", None, True, b"\x00\xffbytes",
+        decimal.Decimal("12345678901234567890.000001"),
+        datetime.datetime(2024, 2, 29, 23, 59, 59, 123456), datetime.date(2024, 1, 1), datetime.time(12, 30, 1),
+        datetime.timedelta(days=-1, seconds=5, microseconds=7), uuid.UUID("12345678-1234-5678-1234-567812345678"),
+    )
+    decoded = _decode_key(_encode_key(key))
+    assert decoded == key
+    assert [type(v) for v in decoded] == [type(v) for v in key]
+
+def test_encode_key_of_no_key():
+    assert _encode_key(None) is None
+    assert _decode_key(None) is None
+
+def test_decode_key_reads_plain_legacy_values():
+    assert _decode_key('[1, "a"]') == (1, "a")
+
+def test_encode_key_rejects_unknown_types():
+    with pytest.raises(TypeError):
+        _encode_key((object(),))
@@ -0,0 +1,39 @@
+from autogen_migration.core.pipeline import PipelineExecutor, PipelineStep
+import pytest
+
+def _step(name, depends_on=()):
+    return PipelineStep(name, lambda: {"status": "success"}, depends_on)
+
+def test_pipeline_rejects_a_dependency_cycle():
+    steps = [_step("schema"), _step("copy", ["schema", "validate"]), _step("validate", ["copy"])]
+    with pytest.raises(ValueError, match="cycle"):
+        PipelineExecutor(steps)
+
+def test_pipeline_rejects_a_self_dependency():
+    with pytest.raises(ValueError, match="cycle"):
+        PipelineExecutor([_step("copy", ["copy"])])
+
+def test_pipeline_rejects_unknown_dependencies():
+    with pytest.raises(ValueError, match="unknown"):
+        PipelineExecutor([_step("copy", ["schema"])])
+
+def test_pipeline_runs_a_diamond():
+    steps = [_step("schema"), _step("copy", ["schema"]), _step("indexes", ["schema"]), _step("validate", ["copy", "indexes"])]
+    results = PipelineExecutor(steps).run()
+    assert {name: r["status"] for name, r in results.items()} == dict.fromkeys(["schema", "copy", "indexes", "validate"], "succeeded")
+
+def test_a_failing_kwargs_callable_fails_only_its_step():
+    advised = []
+    steps = [
+        PipelineStep("sizing", lambda: {"status": "error", "message": "no metrics"}),
+        PipelineStep("audit", lambda: {"status": "success"}),
+        PipelineStep("provision", lambda tier: {"status": "success"}, ["audit"],
+                     kwargs=lambda results: {"tier": results["sizing"]["recommendation"]}),
+        _step("copy", ["provision"]),
+    ]
+    results = PipelineExecutor(steps, on_failure=lambda step, outcome: advised.append(step.name)).run()
+    assert results["provision"]["status"] == "failed"
+    assert "recommendation" in results["provision"]["error"]
+    assert results["copy"]["status"] == "skipped"
+    assert results["audit"]["status"] == "succeeded"
+    assert sorted(advised) == ["provision", "sizing"]
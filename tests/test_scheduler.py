@@ -0,0 +1,65 @@
+from autogen_migration.core.scheduler import MigrationScheduler, TableStage, TableTask
+import threading
+import time
+import pytest
+
+def _task(table, size, source_host="source", target_host="target"):
+    return TableTask("db", table, size, 0, {"host": source_host, "port": 3306}, {"host": target_host, "port": 3306})
+
+class _Tracker:
+    """Counts how many stages touch each server at once."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.current = {}
+        self.peak = {}
+        self.order = []
+
+    def stage(self, name, uses):
+        def run(task):
+            keys = [getattr(task, f"{side}_key") for side in uses]
+            with self.lock:
+                self.order.append((name, task.table))
+                for key in keys:
+                    self.current[key] = self.current.get(key, 0) + 1
+                    self.peak[key] = max(self.peak.get(key, 0), self.current[key])
+            time.sleep(0.02)
+            with self.lock:
+                for key in keys:
+                    self.current[key] -= 1
+            return {"status": "success"}
+        return TableStage(name, run, uses)
+
+def test_scheduler_respects_per_server_limits():
+    tracker = _Tracker()
+    stages = [tracker.stage("copy", ("source", "target")), tracker.stage("validate", ("target",))]
+    tasks = [_task(f"t{i}", i) for i in range(6)]
+    result = MigrationScheduler(stages, max_workers=8, source_concurrency=2, target_concurrency=3).run(tasks)
+    assert result["status"] == "success"
+    assert all(t["status"] == "succeeded" for t in result["tables"])
+    assert tracker.peak["source:3306"] <= 2
+    assert tracker.peak["target:3306"] <= 3
+    # Every table is copied before it is validated.
+    for i in range(6):
+        assert tracker.order.index(("copy", f"t{i}")) < tracker.order.index(("validate", f"t{i}"))
+
+def test_scheduler_starts_largest_tables_first():
+    tracker = _Tracker()
+    tasks = [_task("small", 1), _task("large", 100), _task("medium", 10)]
+    MigrationScheduler([tracker.stage("copy", ("source",))], max_workers=1).run(tasks)
+    assert [table for _, table in tracker.order] == ["large", "medium", "small"]
+
+def test_scheduler_stops_a_table_after_a_failed_stage():
+    def fail(task):
+        return {"status": "failure"}
+    validated = []
+    stages = [TableStage("copy", fail), TableStage("validate", lambda task: validated.append(task.table))]
+    result = MigrationScheduler(stages).run([_task("t", 1)])
+    assert result["status"] == "failure"
+    assert result["failed_tables"] == ["db.t"]
+    assert validated == []
+
+def test_scheduler_rejects_a_zero_limit():
+    tracker = _Tracker()
+    with pytest.raises(ValueError):
+        MigrationScheduler([tracker.stage("copy", ("source",))], source_concurrency=0).run([_task("t", 1)])
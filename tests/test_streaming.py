@@ -0,0 +1,94 @@
+import subprocess
+import tempfile
+import zlib
+import sys
+import io
+import pytest
+
+streaming = pytest.importorskip("autogen_migration.core.streaming", exc_type=ImportError)
+
+class _Writer(io.BytesIO):
+    def __init__(self, objects, name):
+        super().__init__()
+        self.objects, self.name = objects, name
+
+    def close(self):
+        if not self.closed:
+            self.objects[self.name] = self.getvalue()
+        super().close()
+
+class _Blob:
+    def __init__(self, objects, name):
+        self.objects, self.name = objects, name
+
+    def open(self, mode, **kwargs):
+        return io.BytesIO(self.objects[self.name]) if mode == "rb" else _Writer(self.objects, self.name)
+
+    def delete(self):
+        self.objects.pop(self.name, None)
+
+class _Storage:
+    """Just enough of a Storage client for blob.open streaming."""
+
+    def __init__(self, objects=None):
+        self.objects = objects if objects is not None else {}
+
+    def bucket(self, name):
+        return self
+
+    def blob(self, name, **kwargs):
+        return _Blob(self.objects, name)
+
+def _python(code, *args):
+    return [sys.executable, "-c", code, *args]
+
+@pytest.fixture
+def clients(monkeypatch, tmp_path):
+    """Storage stand-in plus mysql/mysqldump stand-ins; the started mysql clients are kept to check they were reaped."""
+    storage = _Storage()
+    started = []
+    state = {"import": _python("import sys, shutil; shutil.copyfileobj(sys.stdin.buffer, open(sys.argv[1], 'wb'))",
+                               str(tmp_path / "imported.sql"))}
+
+    def open_import(target_config):
+        stderr = tempfile.TemporaryFile()
+        proc = subprocess.Popen(state["import"], stdin=subprocess.PIPE, stderr=stderr)
+        started.append(proc)
+        return proc, stderr
+    monkeypatch.setattr(streaming, "get_shared_client", lambda kind, credentials: storage)
+    monkeypatch.setattr(streaming, "_open_import", open_import)
+    return storage, started, state
+
+def _gzip(data):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    return compressor.compress(data) + compressor.flush()
+
+def _target():
+    return {"host": "target", "port": 3306, "user": "u", "password": "", "db": "app"}
+
+def test_gcs_import_streams_the_whole_dump(clients, tmp_path):
+    storage, started, _ = clients
+    dump = b"INSERT INTO t VALUES (1);\n" * 50000
+    storage.objects["dump.sql.gz"] = _gzip(dump)
+    result = streaming.stream_gcs_to_mysql("bucket", "dump.sql.gz", _target(), None, block_size=4096)
+    assert result["bytes_imported"] == len(dump)
+    assert (tmp_path / "imported.sql").read_bytes() == dump
+    assert started[0].returncode == 0
+
+def test_gcs_import_of_a_truncated_object_fails_and_reaps_the_client(clients):
+    storage, started, _ = clients
+    storage.objects["dump.sql.gz"] = _gzip(b"INSERT INTO t VALUES (1);\n" * 50000)[:-100]
+    with pytest.raises(RuntimeError, match="ends before the end of its gzip stream"):
+        streaming.stream_gcs_to_mysql("bucket", "dump.sql.gz", _target(), None, block_size=4096)
+    assert started[0].returncode is not None
+
+def test_dump_with_a_failing_import_deletes_the_object_and_reaps_the_client(clients, monkeypatch):
+    storage, started, state = clients
+    state["import"] = _python("import sys; sys.exit(1)") # exits without reading: writes hit a broken pipe
+    monkeypatch.setattr(streaming, "mysql_command",
+                        lambda tool, *args, **kwargs: (_python("import sys; sys.stdout.buffer.write(b'x' * 4000000)"), None))
+    source = {"host": "source", "port": 3306, "user": "u", "password": "", "db": "app"}
+    with pytest.raises(RuntimeError, match="mysql-import"):
+        streaming.stream_dump_to_gcs(source, "bucket", "dump.sql.gz", None, import_config=_target(), block_size=65536)
+    assert started[0].returncode == 1
+    assert "dump.sql.gz" not in storage.objects
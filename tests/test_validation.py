@@ -0,0 +1,56 @@
+from autogen_migration.core.validation import KeysetDiffValidator, merge_join, keyset_range_clause, compare_sample
+import pytest
+
+def test_merge_join_reports_missing_extra_and_changed_keys():
+    source = [(3, "c"), (1, "a"), (2, "b"), (5, "e")]
+    target = [(1, "a"), (2, "B"), (4, "d"), (5, "e")]
+    missing, extra, changed = merge_join(source, target, 1)
+    assert missing == [(3,)]
+    assert extra == [(4,)]
+    assert changed == [(2,)]
+
+def test_merge_join_compares_composite_keys():
+    source = [(1, 1, "x"), (1, 2, "y"), (2, 1, "z")]
+    target = [(1, 2, "y"), (2, 1, "z"), (2, 2, "w")]
+    assert merge_join(source, target, 2) == ([(1, 1)], [(2, 2)], [])
+
+def test_merge_join_of_empty_sides():
+    assert merge_join([], [(1, "a")], 1) == ([], [(1,)], [])
+    assert merge_join([(1, "a")], [], 1) == ([(1,)], [], [])
+
+def test_keyset_range_clause_unbounded():
+    assert keyset_range_clause(["id"]) == ("", [])
+
+def test_keyset_range_clause_is_half_open():
+    where, params = keyset_range_clause(["id"], (10,), (20,))
+    assert where == " WHERE ((`id` > %s)) AND ((`id` <= %s))"
+    assert params == [10, 20]
+
+def test_keyset_range_clause_composite_key_bounds():
+    where, params = keyset_range_clause(["a", "b"], lower_key=(1, 2))
+    assert where == " WHERE ((`a` > %s) OR (`a` = %s AND `b` > %s))"
+    assert params == [1, 1, 2]
+
+def _standin_table(standin, database, keys):
+    conn = standin.connect(database=database)
+    with conn.cursor() as cursor:
+        # NOCASE orders keys like a MySQL case-insensitive collation: 'a' < 'aa' < 'B', unlike Python's 'B' < 'a'.
+        cursor.execute("CREATE TABLE `codes` (code VARCHAR(8) COLLATE NOCASE NOT NULL, label VARCHAR(8), PRIMARY KEY (code))")
+        cursor.executemany("INSERT INTO `codes` (code, label) VALUES (%s, %s)", [(key, key.lower()) for key in keys])
+    conn.commit()
+    return conn
+
+def test_keyset_diff_follows_the_server_key_order(tmp_path):
+    standins = pytest.importorskip("autogen_migration.core.standins", exc_type=ImportError)
+    standin = standins.MySQLStandIn(str(tmp_path))
+    source = _standin_table(standin, "source", ["a", "B", "c", "D"])
+    target = _standin_table(standin, "target", ["a", "aa", "ab", "B", "c", "D"])
+    validator = KeysetDiffValidator(source, target, "codes", chunk_size=2)
+    chunks = list(validator.iter_chunk_diffs())
+    result = validator.run()
+    assert [key for chunk in chunks for key in chunk["extra"]] == [("aa",), ("ab",)]
+    assert result["missing_count"] == 0 and result["changed_count"] == 0
+    assert result["source_rows"] == 4 and result["target_rows"] == 6
+
+def test_compare_sample_of_no_rows():
+    assert compare_sample(None, None, "codes", sample_size=0) == []